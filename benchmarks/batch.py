@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+"""Throughput benchmark of the batch modes and the webhook
+
+Runs against the local stand-in of the GitHub API from ``fakegithub.py``
+and reports processed issues per second, p50/p99 latency of processing
+an issue (of handling a webhook for the web mode) and peak memory.
+Every mode runs in a fresh process so that its peak memory is its own::
+
+    $ python benchmarks/batch.py --repos 10 --issues 10000 --latency 5 -o batch.jsonl
+"""
+
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import click
+import fakegithub
+
+
+RULES = '''
+[patterns]
+alice=
+    title:network
+    text:protocol
+    text:http[s]{0,1}://localhost:[0-9]{2,5}
+    label:^(network|networking)$
+bob=any:[Pp]ython
+carol=
+    title:^Database
+    label:bug
+dave=text:(crash|build) is broken
+
+[fallback]
+label=Need assignment
+'''
+
+
+def load_config(strategy, dry_run):
+    """Build the configuration of the benchmarked runs"""
+    import configparser
+    from ghia.helpers import load_config_auth, load_config_rules
+
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    parser.read_string(f"[github]\ntoken=bench\n{RULES}")
+    config = {**load_config_auth(parser), **load_config_rules(parser)}
+    config['strategy'] = strategy
+    config['dry_run'] = dry_run
+    return config
+
+
+def percentile(values, q):
+    """Get the q-th percentile of values, interpolating between the closest ones"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def timed(latencies, fn):
+    """Wrap a function to record its duration"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_async(latencies, fn):
+    """Wrap a coroutine function to record its duration"""
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def run_sync(config, reposlugs, options):
+    import ghia.cli
+
+    latencies = []
+    original = ghia.cli.process_issue
+    ghia.cli.process_issue = timed(latencies, original)
+    try:
+        ghia.cli.batch_process(config, reposlugs)
+    finally:
+        ghia.cli.process_issue = original
+    return latencies
+
+
+def run_async(config, reposlugs, options):
+    import asyncio
+    import ghia.cli
+
+    latencies = []
+    original = ghia.cli.process_issue_async
+    ghia.cli.process_issue_async = timed_async(latencies, original)
+    try:
+        asyncio.run(ghia.cli.batch_process_async(config, reposlugs, options['concurrency']))
+    finally:
+        ghia.cli.process_issue_async = original
+    return latencies
+
+
+def run_web(config, reposlugs, options):
+    from ghia.web import create_app
+
+    with tempfile.NamedTemporaryFile('w', suffix='.cfg', delete=False) as f:
+        f.write(f"[github]\ntoken=bench\n{RULES}")
+    os.environ.update({
+        'GHIA_CONFIG': f.name,
+        'GHIA_WORKERS': str(options['workers']),
+        'GHIA_QUEUE_SIZE': '0',
+        'GHIA_DEBOUNCE': '0',
+        'GHIA_RELOAD': '0',
+    })
+    if config['dry_run']:
+        os.environ['GHIA_DRYRUN'] = '1'
+    try:
+        app = create_app()
+    finally:
+        os.unlink(f.name)
+    client = app.test_client()
+    base = os.environ['GHIA_API_URL']
+
+    latencies = []
+    for reposlug in reposlugs:
+        repo = reposlug.split('/')[1]
+        for number in range(1, options['issues'] + 1):
+            payload = {'action': 'opened', 'issue': fakegithub.make_issue(base, repo, number)}
+            start = time.perf_counter()
+            response = client.post('/', json=payload, headers={
+                'X-GitHub-Event': 'issues',
+                'X-GitHub-Delivery': f"{reposlug}#{number}",
+            })
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 202, response.status_code
+    app.extensions['ghia_queue'].join()
+    return latencies
+
+
+MODES = {'sync': run_sync, 'async': run_async, 'web': run_web}
+
+
+def measure(mode, config, reposlugs, options):
+    """Run a benchmarked mode
+
+    The peak RSS is that of the whole process, run every mode in its own one.
+
+    :return: measured values
+    :rtype:  dict
+    """
+    if options['memory']:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        latencies = MODES[mode](config, reposlugs, options)
+    elapsed = time.perf_counter() - start
+    result = {
+        'issues': len(latencies),
+        'seconds': elapsed,
+        'issues_per_sec': len(latencies) / elapsed if elapsed else None,
+    }
+    if len(latencies) > 1:
+        result['p50_ms'] = percentile(latencies, 50) * 1000
+        result['p99_ms'] = percentile(latencies, 99) * 1000
+    if options['memory']:
+        result['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+@click.command()
+@click.option('-m', '--mode', 'modes', help='Benchmarked mode, may be repeated (default all).',
+              type=click.Choice(list(MODES)), multiple=True)
+@click.option('--repos', help='Number of repositories.', type=click.IntRange(min=1),
+              default=10, show_default=True)
+@click.option('--issues', help='Issues per repository.', type=click.IntRange(min=1),
+              default=1000, show_default=True)
+@click.option('--latency', help='Response delay of the fake API in milliseconds.',
+              type=float, default=0, show_default=True)
+@click.option('--concurrency', help='Maximum of concurrent requests (async).',
+              type=click.IntRange(min=1), default=10, show_default=True)
+@click.option('--workers', help='Background workers (web).',
+              type=click.IntRange(min=1), default=4, show_default=True)
+@click.option('-s', '--strategy', type=click.Choice(['append', 'set', 'change']),
+              default='append', show_default=True)
+@click.option('-d', '--dry-run', help='Do not send issue updates.', is_flag=True)
+@click.option('--memory', help='Trace peak memory of Python objects (slows the run).', is_flag=True)
+@click.option('-o', '--output', help='File the results are appended to as JSON lines.',
+              type=click.File('a'))
+def main(modes, repos, issues, latency, concurrency, workers, strategy, dry_run, memory, output):
+    """Measure issue throughput of ghia against a fake GitHub API"""
+    server, url = fakegithub.start(repos, issues, latency / 1000)
+    # must be set before ghia is imported
+    os.environ['GHIA_API_URL'] = url
+
+    config = load_config(strategy, dry_run)
+    reposlugs = [f"{fakegithub.OWNER}/r{i}" for i in range(repos)]
+    options = {'issues': issues, 'concurrency': concurrency, 'workers': workers, 'memory': memory}
+    try:
+        for mode in modes or list(MODES):
+            # ghia is imported by the fresh process, after GHIA_API_URL is set
+            with concurrent.futures.ProcessPoolExecutor(
+                    1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(measure, mode, config, reposlugs, options).result()
+            click.echo(f"{mode:6} {result['issues']:9} issues {result['seconds']:8.2f} s "
+                       f"{result['issues_per_sec']:10.1f} issues/s "
+                       f"p50 {result.get('p50_ms', 0):7.2f} ms p99 {result.get('p99_ms', 0):7.2f} ms "
+                       f"rss {result['max_rss_mb']:7.1f} MB")
+            if output is not None:
+                output.write(json.dumps({
+                    'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    'mode': mode, 'repos': repos, 'issues_per_repo': issues,
+                    'latency_ms': latency, 'dry_run': dry_run, 'python': sys.version.split()[0],
+                    **result,
+                }) + '\n')
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
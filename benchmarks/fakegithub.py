@@ -0,0 +1,212 @@
+#! /usr/bin/env python
+"""Local stand-in of the GitHub REST API for benchmarks
+
+Serves synthetic repositories ``bench/r0``, ``bench/r1``, ... whose issues
+are generated on the fly, so even millions of issues take no memory.
+Issue listings are paginated with ``Link`` headers, issue updates are
+accepted and counted, every response carries rate limit headers and
+may be delayed to emulate network latency::
+
+    $ python benchmarks/fakegithub.py --repos 10 --issues 100000 --latency 20
+"""
+
+import asyncio
+import json
+import multiprocessing
+import time
+import urllib.parse
+import click
+from aiohttp import web
+
+
+OWNER = 'bench'
+LOGIN = 'ghia-bench'
+WORDS = ['network', 'python', 'database', 'protocol', 'ui', 'docs', 'crash', 'build']
+LABELS = ['bug', 'networking', 'enhancement', 'question']
+
+
+def make_issue(base, repo, number):
+    """Generate an issue of a synthetic repo
+
+    :param base: base URL of the server
+    :type  base: str
+    :param repo: repository name
+    :type  repo: str
+    :param number: issue number
+    :type  number: int
+
+    :return: the issue as served by GitHub
+    :rtype:  dict
+    """
+    word = WORDS[number % len(WORDS)]
+    repo_url = f"{base}/repos/{OWNER}/{repo}"
+    return {
+        'url': f"{repo_url}/issues/{number}",
+        'repository_url': repo_url,
+        'html_url': f"https://github.com/{OWNER}/{repo}/issues/{number}",
+        'number': number,
+        'state': 'open',
+        'title': f"{word.capitalize()} problem #{number}",
+        'body': f"Something about {WORDS[number * 7 % len(WORDS)]} is broken.\nSee http://localhost:{number % 65536}",
+        'labels': [{'name': LABELS[number % len(LABELS)]}] if number % 3 else [],
+        'assignees': [{'login': 'someone'}] if number % 5 == 0 else [],
+        'updated_at': '2020-01-01T00:00:00Z',
+    }
+
+
+class FakeGitHub:
+    """Request handlers and counters of the stand-in
+
+    :param repos: number of repositories
+    :type  repos: int
+    :param issues: number of issues per repository
+    :type  issues: int
+    :param latency: delay of every response in seconds
+    :type  latency: float
+    :param rate_limit: requests allowed per hour
+    :type  rate_limit: int
+    """
+
+    def __init__(self, repos, issues, latency=0.0, rate_limit=10 ** 9):
+        self.repos = repos
+        self.issues = issues
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.patches = 0
+        self.reset = int(time.time()) + 3600
+
+    def app(self):
+        """Create the aiohttp application"""
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get('/user', self.user)
+        app.router.add_get('/orgs/{org}/repos', self.org_repos)
+        app.router.add_get('/repos/{owner}/{repo}/issues', self.list_issues)
+        app.router.add_patch('/repos/{owner}/{repo}/issues/{number}', self.update_issue)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = await handler(request)
+        response.headers['X-RateLimit-Limit'] = str(self.rate_limit)
+        response.headers['X-RateLimit-Remaining'] = str(max(self.rate_limit - self.requests, 0))
+        response.headers['X-RateLimit-Reset'] = str(self.reset)
+        return response
+
+    def base(self, request):
+        return f"{request.scheme}://{request.host}"
+
+    async def user(self, request):
+        return web.json_response({'login': LOGIN})
+
+    async def stats(self, request):
+        return web.json_response({'requests': self.requests, 'patches': self.patches})
+
+    def paginate(self, request, count):
+        """Get the requested page and its Link header
+
+        :return: first and last index of the page and the header
+        :rtype:  tuple
+        """
+        per_page = int(request.query.get('per_page', 30))
+        page = int(request.query.get('page', 1))
+        last = max((count + per_page - 1) // per_page, 1)
+        links = []
+
+        def link(number, rel):
+            query = dict(request.query, page=str(number))
+            url = f"{self.base(request)}{request.path}?{urllib.parse.urlencode(query)}"
+            links.append(f'<{url}>; rel="{rel}"')
+
+        if page < last:
+            link(page + 1, 'next')
+            link(last, 'last')
+        if page > 1:
+            link(1, 'first')
+            link(page - 1, 'prev')
+        start = (page - 1) * per_page
+        return start, min(start + per_page, count), ', '.join(links)
+
+    async def org_repos(self, request):
+        start, end, links = self.paginate(request, self.repos)
+        repos = [{'full_name': f"{OWNER}/r{i}", 'archived': False, 'has_issues': True,
+                  'open_issues_count': self.issues} for i in range(start, end)]
+        return web.json_response(repos, headers={'Link': links} if links else None)
+
+    async def list_issues(self, request):
+        repo = request.match_info['repo']
+        if request.match_info['owner'] != OWNER or not repo.startswith('r') \
+                or not repo[1:].isdigit() or int(repo[1:]) >= self.repos:
+            return web.json_response({'message': 'Not Found'}, status=404)
+        start, end, links = self.paginate(request, self.issues)
+        base = self.base(request)
+        body = json.dumps([make_issue(base, repo, number) for number in range(start + 1, end + 1)])
+        return web.Response(text=body, content_type='application/json',
+                            headers={'Link': links} if links else None)
+
+    async def update_issue(self, request):
+        await request.read()
+        self.patches += 1
+        return web.json_response({})
+
+
+def serve(fake, host, port, ready=None):
+    """Run the stand-in until the process is terminated
+
+    :param fake: the stand-in
+    :type  fake: class:`FakeGitHub`
+    :param host: address to listen on
+    :type  host: str
+    :param port: port to listen on, 0 for any free one
+    :type  port: int
+    :param ready: queue receiving the base URL once the server listens
+    :type  ready: class:`multiprocessing.Queue`, optional
+    """
+    async def run():
+        runner = web.AppRunner(fake.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound = runner.addresses[0][1]
+        url = f"http://{host}:{bound}"
+        if ready is not None:
+            ready.put(url)
+        else:
+            click.echo(f"Serving fake GitHub API at {url}")
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def start(repos, issues, latency=0.0, rate_limit=10 ** 9):
+    """Start the stand-in in a separate process
+
+    :return: the server process and its base URL
+    :rtype:  tuple
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=serve, args=(FakeGitHub(repos, issues, latency, rate_limit), '127.0.0.1', 0, ready),
+        daemon=True)
+    process.start()
+    return process, ready.get(timeout=30)
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=8000, show_default=True)
+@click.option('--repos', help='Number of repositories.', type=int, default=10, show_default=True)
+@click.option('--issues', help='Issues per repository.', type=int, default=1000, show_default=True)
+@click.option('--latency', help='Response delay in milliseconds.', type=float, default=0,
+              show_default=True)
+def main(host, port, repos, issues, latency):
+    """Serve a fake GitHub API"""
+    serve(FakeGitHub(repos, issues, latency / 1000), host, port)
+
+
+if __name__ == '__main__':
+    main()
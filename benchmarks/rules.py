@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+"""Rule matching benchmark against the original per-user loop
+
+Generates users with one rule each and issues with long bodies, then
+compares the time of matching an issue with :func:`ghia.rules.match_users`
+to calling :func:`ghia.github.check_match` for every user::
+
+    $ python benchmarks/rules.py --users 200 --words 1000 -o rules.jsonl
+
+The results of both are compared so a benchmark run also checks
+that the rule engine finds the same users.
+"""
+
+import datetime
+import json
+import random
+import re
+import statistics
+import sys
+import time
+import click
+
+
+def word(rnd, length):
+    """Generate a random lowercase word"""
+    return ''.join(rnd.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(length))
+
+
+# rule sources by kind, each gets a random number generator
+KINDS = {
+    # plain words take the literal fast path
+    'word': lambda rnd: f"any:{word(rnd, 7)}",
+    # needs a regex, the literal parts are prefiltered
+    'dotted': lambda rnd: f"text:{word(rnd, 3)}.{word(rnd, 3)}",
+    # needs a regex without a required literal
+    'class': lambda rnd: f"text:[{word(rnd, 2)}]{word(rnd, 1)}[0-9]{{3}}",
+}
+
+
+def make_patterns(kind, users, seed):
+    """Generate one rule per user
+
+    :return: user patterns
+    :rtype:  dict
+    """
+    rnd = random.Random(seed)
+    patterns = {}
+    for i in range(users):
+        item, source = KINDS[kind](rnd).split(':', 1)
+        patterns[f"user{i}"] = [(item, re.compile(source, re.IGNORECASE))]
+    return patterns
+
+
+def make_issue(patterns, words, matches, seed):
+    """Generate an issue with a random body matching some of the users
+
+    :return: the issue
+    :rtype:  dict
+    """
+    rnd = random.Random(seed)
+    body = [word(rnd, rnd.randint(2, 9)) for _ in range(words)]
+    users = list(patterns)
+    for user in rnd.sample(users, matches):
+        # turn the rule into a matching text
+        source = patterns[user][0][1].pattern
+        text = re.sub(r'\[(\w)\w*\]', r'\1', source).replace('.', '-')
+        text = re.sub(r'\[0-9\]\{3\}', '123', text)
+        body.insert(rnd.randrange(len(body)), text)
+    return {'title': word(rnd, 8), 'body': ' '.join(body), 'labels': [{'name': 'bug'}]}
+
+
+def timings(fn, runs):
+    """Call a function repeatedly
+
+    :return: result of the last call and the durations in milliseconds
+    :rtype:  tuple
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, times
+
+
+@click.command()
+@click.option('-k', '--kind', 'kinds', help='Kind of rules, may be repeated (default all).',
+              type=click.Choice(list(KINDS)), multiple=True)
+@click.option('--users', help='Number of users with one rule each.', type=click.IntRange(min=1),
+              default=200, show_default=True)
+@click.option('--words', help='Words of the issue body.', type=click.IntRange(min=1),
+              default=1000, show_default=True)
+@click.option('--matches', help='Users matching the issue, may be repeated (default 0 and 3).',
+              type=click.IntRange(min=0), multiple=True)
+@click.option('-n', '--runs', help='Number of runs per measurement.',
+              type=click.IntRange(min=1), default=20, show_default=True)
+@click.option('-o', '--output', help='File the results are appended to as JSON lines.',
+              type=click.File('a'))
+def main(kinds, users, words, matches, runs, output):
+    """Measure rule matching against the per-user check_match loop"""
+    from ghia.github import check_match
+    from ghia.rules import compile_rules, match_users
+
+    for kind in kinds or list(KINDS):
+        patterns = make_patterns(kind, users, seed=1)
+        ruleset = compile_rules(patterns)
+        for count in matches or (0, 3):
+            issue = make_issue(patterns, words, min(count, users), seed=2)
+            expected, baseline = timings(
+                lambda: {user for user in patterns if check_match(issue, patterns[user])}, runs)
+            found, engine = timings(lambda: match_users(ruleset, issue), runs)
+            if found != expected:
+                raise click.ClickException(f"{kind}: rule engine found {sorted(found)}, "
+                                           f"check_match found {sorted(expected)}")
+            result = {
+                'baseline_ms': statistics.median(baseline),
+                'engine_ms': statistics.median(engine),
+                'matched': len(found),
+            }
+            click.echo(f"{kind:7} {len(found):3} matched  check_match {result['baseline_ms']:8.2f} ms"
+                       f"  match_users {result['engine_ms']:8.2f} ms")
+            if output is not None:
+                output.write(json.dumps({
+                    'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    'kind': kind, 'users': users, 'words': words,
+                    'python': sys.version.split()[0], **result,
+                }) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+"""Startup benchmark of the CLI and the web app
+
+Measures the wall time of ``python -m ghia --help`` and of importing
+``create_app``, plus the import time of the ghia modules reported by
+``python -X importtime``. Results can be appended as JSON lines to a file
+to track the startup cost over time::
+
+    $ python benchmarks/startup.py -n 20 -o startup.jsonl
+"""
+
+import datetime
+import json
+import statistics
+import subprocess
+import sys
+import time
+import click
+
+
+COMMANDS = {
+    'cli_help': ['-m', 'ghia', '--help'],
+    'web_import': ['-c', 'from ghia.web import create_app'],
+}
+MODULES = ['ghia', 'ghia.cli', 'ghia.web']
+
+
+def wall_times(args, runs):
+    """Run the interpreter with the given arguments repeatedly
+
+    :param args: interpreter arguments
+    :type  args: list
+    :param runs: number of runs
+    :type  runs: int
+
+    :return: wall times in milliseconds
+    :rtype:  list
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def import_time(module):
+    """Get the cumulative import time of a module
+
+    :param module: module name
+    :type  module: str
+
+    :return: import time in milliseconds
+    :rtype:  float
+    """
+    cp = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                        universal_newlines=True)
+    for line in cp.stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    return None
+
+
+def revision():
+    """Get the current git revision, if any"""
+    cp = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                        universal_newlines=True)
+    return cp.stdout.strip() or None
+
+
+@click.command()
+@click.option('-n', '--runs', help='Number of runs per command.',
+              type=click.IntRange(min=1), default=10, show_default=True)
+@click.option('-o', '--output', help='File the results are appended to as a JSON line.',
+              type=click.File('a'))
+def main(runs, output):
+    """Measure startup cost of ghia"""
+    result = {
+        'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'revision': revision(),
+        'python': sys.version.split()[0],
+    }
+    for name, args in COMMANDS.items():
+        times = wall_times(args, runs)
+        result[name] = {'median_ms': statistics.median(times), 'min_ms': min(times)}
+        click.echo(f"{name:12} median {result[name]['median_ms']:8.1f} ms"
+                   f"  min {result[name]['min_ms']:8.1f} ms")
+    result['import_ms'] = {}
+    for module in MODULES:
+        result['import_ms'][module] = import_time(module)
+        click.echo(f"import {module:12} {result['import_ms'][module]:8.1f} ms")
+    if output is not None:
+        output.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,13 @@
-from .cli import main
-from .web import create_app
-
 __all__ = ['main', 'create_app']
+
+
+def __getattr__(name):
+    # entry points are imported on first use, so the CLI does not load
+    # Flask and the web app does not load the asynchronous stack
+    if name == 'main':
+        from .cli import main
+        return main
+    if name == 'create_app':
+        from .web import create_app
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,297 @@
+"""Asynchronous aiohttp server as a GitHub webhook receiver
+
+Run it with the aiohttp CLI, the configuration is read from the same
+environment variables as the Flask app::
+
+    $ GHIA_CONFIG=<path_a>:<path_b> python -m aiohttp.web -H 0.0.0.0 -P 8080 ghia.aioweb:create_app
+"""
+
+import asyncio
+import json
+import aiohttp
+import click
+import jinja2
+from aiohttp import web
+from .helpers import env_deliveries, env_int, env_matches
+from .github import process_issue_async
+from .ratelimit import RateLimitedSession
+from .rules import get_ruleset
+from .session import make_session
+from .reload import ConfigManager
+from .webhook import issue_event, verify_signature
+
+
+class IssueTasks:
+    """Asynchronous processing of issues, one task per issue at a time
+
+    An event of an issue which is being processed waits for the task to
+    finish, events arriving meanwhile only replace the waiting issue.
+    Updates of one issue thus never race.
+
+    :param process: coroutine function taking the issue and config,
+                    returning False on failure
+    :type  process: callable
+    :param limit: maximum number of issues being processed, 0 for unbounded
+    :type  limit: int, optional
+    """
+
+    def __init__(self, process, limit=1000):
+        self.process = process
+        self.limit = limit
+        self.waiting = {}
+        self.tasks = set()
+        self.processed = 0
+        self.failed = 0
+        self.coalesced = 0
+
+    def submit(self, key, issue, config):
+        """Schedule processing of an issue
+
+        :param key: issue identifier, e.g. its URL
+        :type  key: str
+        :param issue: the latest issue
+        :type  issue: dict
+        :param config: app configuration
+        :type  config: dict
+
+        :return: False if too many issues are being processed, True otherwise
+        :rtype:  bool
+        """
+        if key in self.waiting:
+            waiting = self.waiting[key]
+            if waiting is not None:
+                self.coalesced += 1
+            self.waiting[key] = (issue, config)
+            return True
+        if self.limit and len(self.waiting) >= self.limit:
+            return False
+        # None marks an issue being processed with nothing waiting
+        self.waiting[key] = None
+        task = asyncio.ensure_future(self._run(key, issue, config))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return True
+
+    async def _run(self, key, issue, config):
+        """Process an issue and then its waiting successors"""
+        while True:
+            try:
+                ok = await self.process(issue, config)
+            except Exception as e:
+                click.echo(f"Processing of issue {issue.get('url')} failed: {e}", err=True)
+                ok = False
+            self.processed += 1
+            self.failed += not ok
+            waiting = self.waiting[key]
+            if waiting is None:
+                del self.waiting[key]
+                return
+            self.waiting[key] = None
+            issue, config = waiting
+
+    async def join(self):
+        """Wait until all scheduled issues are processed"""
+        while self.tasks:
+            await asyncio.gather(*self.tasks)
+
+    def stats(self):
+        """Get processing statistics
+
+        :return: issues in flight, processed, failed and coalesced events
+        :rtype:  dict
+        """
+        return {
+            'in_flight': len(self.waiting),
+            'processed': self.processed,
+            'failed': self.failed,
+            'coalesced': self.coalesced,
+        }
+
+
+class WebhookReceiver:
+    """State and request handlers of the asynchronous webhook receiver
+
+    :param manager: holder of the current configuration
+    :type  manager: class:`ghia.reload.ConfigManager`
+    :param session: session used for issue updates, created on startup if None
+    :type  session: class:`ghia.ratelimit.RateLimitedSession`, optional
+    """
+
+    def __init__(self, manager, session=None):
+        self.manager = manager
+        self.session = session
+        self.client = None
+        self.templates = jinja2.Environment(loader=jinja2.PackageLoader('ghia', 'templates'),
+                                            autoescape=True)
+        # remember deliveries to skip redeliveries, GHIA_DELIVERY_CACHE=0 disables it
+        self.deliveries = env_deliveries()
+        # remember rule results of issues and their content, or profile the rules
+        self.matches = env_matches()
+        self.profiler = self.matches.profiler
+        self.tasks = IssueTasks(self.process, env_int('GHIA_QUEUE_SIZE', 1000))
+
+    async def process(self, issue, config):
+        """Evaluate and update an issue
+
+        Rules are evaluated in the default executor, keeping the event loop responsive.
+
+        :param issue: the issue to process
+        :type  issue: dict
+        :param config: app configuration
+        :type  config: dict
+
+        :return: False on failure, True otherwise
+        :rtype:  bool
+        """
+        loop = asyncio.get_running_loop()
+        matched = await loop.run_in_executor(
+            None, lambda: self.matches.match(get_ruleset(config), issue))
+        return await process_issue_async(self.session, issue, config, matched=matched)
+
+    async def index(self, request):
+        """The default web entry point (GET+POST / route)
+        """
+        config = self.manager.config
+
+        if request.method == 'GET':
+            html = self.templates.get_template('index.html').render(config=config)
+            return web.Response(text=html, content_type='text/html')
+
+        # Validate request
+        data = await request.read()
+        if not verify_signature(config, data, request.headers.get('X-Hub-Signature')):
+            raise web.HTTPForbidden()
+
+        # Respond to ping and issue events
+        event = request.headers.get('X-GitHub-Event')
+        if event == 'ping':
+            return web.Response()
+
+        if event == 'issues':
+            return self.delivery(request, lambda: self.issue_handler(data, config))
+
+        raise web.HTTPNotFound()
+
+    def delivery(self, request, handler):
+        """Run a webhook handler unless the delivery was already handled
+
+        A delivery which fails is forgotten so that its redelivery is handled.
+
+        :param request: the webhook request
+        :type  request: class:`aiohttp.web.Request`
+        :param handler: webhook handler
+        :type  handler: callable
+
+        :return: response of the handler
+        :rtype:  class:`aiohttp.web.Response`
+        """
+        delivery = request.headers.get('X-GitHub-Delivery')
+        if self.deliveries is None or not delivery:
+            return handler()
+
+        if not self.deliveries.claim(delivery):
+            return web.Response()
+        try:
+            return handler()
+        except Exception:
+            self.deliveries.release(delivery)
+            raise
+
+    def issue_handler(self, data, config):
+        """Handler for incoming issue webhooks
+
+        The issue is scheduled for processing and 202 is returned at once.
+
+        :param data: raw request body
+        :type  data: bytes
+        :param config: app configuration
+        :type  config: dict
+
+        :return: the response
+        :rtype:  class:`aiohttp.web.Response`
+        """
+        try:
+            payload = json.loads(data.decode('utf-8'))
+        except ValueError:
+            raise web.HTTPBadRequest()
+        issue = issue_event(payload, config)
+        if issue is None:
+            return web.Response()
+
+        if not self.tasks.submit(issue.get('url'), issue, config):
+            raise web.HTTPServiceUnavailable(text='Too many issues waiting for processing')
+        return web.Response(status=202)
+
+    async def task_stats(self, request):
+        """Statistics of the issue processing (GET /tasks route)
+        """
+        stats = self.tasks.stats()
+        stats['matches'] = self.matches.stats()
+        return web.json_response(stats)
+
+    async def rules_profile(self, request):
+        """Profile of the rule patterns (GET /profile route)
+
+        JSON by default, ``?format=table`` renders a plain text table.
+        """
+        if self.profiler is None:
+            raise web.HTTPNotFound()
+        report = self.profiler.report()
+        if request.query.get('format') == 'table':
+            from .profiling import format_report
+            return web.Response(text=format_report(report))
+        return web.json_response(report)
+
+    async def startup(self, app):
+        """Create the shared rate limited session"""
+        if self.session is None:
+            self.client = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=env_int('GHIA_TIMEOUT', 10)))
+            self.session = RateLimitedSession(self.client, env_int('GHIA_MAX_CONCURRENCY', 100))
+
+    async def cleanup(self, app):
+        """Finish scheduled issues and release resources"""
+        await self.tasks.join()
+        if self.client is not None:
+            await self.client.close()
+        if self.matches.content is not None:
+            self.matches.content.close()
+        self.manager.stop()
+
+
+def create_app(argv=None, session=None, login_session=None):
+    """Create a configured aiohttp application
+
+    Issues are processed by tasks of the event loop sharing one
+    rate limited client session.
+
+    :param argv: command line arguments of the aiohttp CLI, UNUSED
+    :type  argv: list, optional
+    :param session: session used for issue updates instead of a new rate limited one
+    :type  session: class:`ghia.ratelimit.RateLimitedSession`, optional
+    :param login_session: session used to resolve the GitHub login
+    :type  login_session: class:`requests.sessions.Session`, optional
+
+    :return: aiohttp application
+    :rtype:  class:`aiohttp.web.Application`
+    """
+    # parse and compile the configuration, swapped in whole on every reload
+    if login_session is None:
+        login_session = make_session(1, env_int('GHIA_TIMEOUT', 10))
+    manager = ConfigManager.from_env(login_session)
+    if not manager.load():
+        exit(10)
+    # watch the config files, GHIA_RELOAD=0 disables it
+    reload_interval = env_int('GHIA_RELOAD', 5)
+    if reload_interval > 0:
+        manager.watch(reload_interval)
+
+    receiver = WebhookReceiver(manager, session)
+    app = web.Application()
+    app.router.add_get('/', receiver.index)
+    app.router.add_post('/', receiver.index)
+    app.router.add_get('/tasks', receiver.task_stats)
+    app.router.add_get('/profile', receiver.rules_profile)
+    app.on_startup.append(receiver.startup)
+    app.on_cleanup.append(receiver.cleanup)
+    return app
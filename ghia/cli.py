@@ -1,14 +1,15 @@
-
 """Logic of the CLI batch interface
 """
 
-import requests
-import asyncio
-import aiohttp
 import click
 import re
 from .helpers import load_config, load_config_auth, load_config_rules
-from .github import gather_issues, gather_issues_async, process_issue
+from .github import (iter_issue_pages, iter_issue_pages_async, iter_org_repos,
+                     iter_org_repos_async, process_issue, process_issue_async)
+from .state import StateStore, merge_since
+from .httpcache import HTTPCache
+from .rules import ContentCache
+from .graphql import batches, iter_issue_pages_graphql, iter_issue_pages_graphql_async
 
 
 def click_validate_config_auth(ctx, param, value):
@@ -45,6 +46,9 @@ def click_validate_config_rules(ctx, param, value):
     """
     try:
         return load_config_rules(load_config(value))
+    except ValueError as e:
+        # invalid [matching] options or a rejected pattern
+        raise click.BadParameter(f'incorrect configuration format: {e}')
     except (Exception):
         raise click.BadParameter('incorrect configuration format')
 
@@ -62,6 +66,9 @@ def click_validate_reposlug(ctx, param, value):
     :return: validated reposlugs
     :rtype:  str
     """
+    # reposlugs may only be left out when repos of organizations are listed
+    if not value and not ctx.params.get('orgs'):
+        raise click.MissingParameter(ctx=ctx, param=param)
     rgx = re.compile('^[^/ ]+/[^/ ]+$')  # name/repo
     for val in value:
         if not rgx.fullmatch(val):
@@ -69,63 +76,283 @@ def click_validate_reposlug(ctx, param, value):
     return value
 
 
-def batch_process(config, reposlugs):
+def discover_repos(config, reposlugs, orgs, cache=None):
+    """Add repos of organizations which may have open issues to reposlugs
+
+    All pages of the listings are fetched before any repo is processed,
+    the asynchronous mode instead processes repos as they are found
+    (see :func:`batch_process_async`).
+
+    :param config: full configuration
+    :type  config: dict
+    :param reposlugs: owner/repository GitHub reposlugs
+    :type  reposlugs: tuple
+    :param orgs: GitHub organizations
+    :type  orgs: tuple
+    :param cache: cache of repository listings for conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: the reposlugs followed by the found ones, without duplicates
+    :rtype:  tuple
+    """
+    import requests
+
+    session = requests.Session()
+    found = list(reposlugs)
+    for org in orgs:
+        for page in iter_org_repos(session, org, config['github']['token'], cache):
+            found.extend(page)
+    return tuple(dict.fromkeys(found))
+
+
+def repo_since(config, reposlug, state):
+    """Get the time issues of a repo should be listed from
+
+    :param config: full configuration
+    :type  config: dict
+    :param reposlug: owner/repository GitHub reposlug
+    :type  reposlug: str
+    :param state: state of previous runs
+    :type  state: class:`ghia.state.StateStore`
+
+    :return: ISO 8601 timestamp or None to list all issues
+    :rtype:  str
+    """
+    if state is None:
+        return config.get('since')
+    return merge_since(config.get('since'), state.since(reposlug))
+
+
+def listing_cache(config, since, cache):
+    """Get the cache of an issue listing if it is worth revalidating
+
+    A listing since the previous run of a state file is requested with
+    a new URL on every run, so it is neither revalidated nor stored.
+
+    :param config: full configuration
+    :type  config: dict
+    :param since: time the issues are listed from
+    :type  since: str
+    :param cache: cache of issue listings for conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`
+
+    :return: the cache or None
+    :rtype:  class:`ghia.httpcache.HTTPCache`
+    """
+    return cache if since == config.get('since') else None
+
+
+def page_sources(session, config, reposlugs, state=None, cache=None):
+    """Prepare sources of issue pages for the configured API
+
+    The REST API lists every repo on its own, the GraphQL API lists
+    batches of repos at once.
+
+    :param session: the current session
+    :type  session: class:`requests.session.Session`
+    :param config: full configuration
+    :type  config: dict
+    :param reposlugs: owner/repository GitHub reposlugs
+    :type  reposlugs: tuple
+    :param state: state of previous runs
+    :type  state: class:`ghia.state.StateStore`, optional
+    :param cache: cache of issue listings for conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: pairs of listed reposlugs and generators of reposlug and issue page pairs
+    :rtype:  list
+    """
+    token = config['github']['token']
+    since = {reposlug: repo_since(config, reposlug, state) for reposlug in reposlugs}
+
+    if config.get('api') == 'graphql':
+        return [(batch, iter_issue_pages_graphql(session, batch, token, since))
+                for batch in batches(reposlugs)]
+
+    def rest_pages(reposlug):
+        for issues in iter_issue_pages(session, reposlug, token, since[reposlug],
+                                       listing_cache(config, since[reposlug], cache)):
+            yield reposlug, issues
+
+    return [([reposlug], rest_pages(reposlug)) for reposlug in reposlugs]
+
+
+def page_sources_async(session, config, reposlugs, state=None, cache=None):
+    """Prepare asynchronous sources of issue pages for the configured API
+
+    See :func:`page_sources` for details.
+
+    :param session: the current session
+    :type  session: class:`ghia.ratelimit.RateLimitedSession`
+    :param config: full configuration
+    :type  config: dict
+    :param reposlugs: owner/repository GitHub reposlugs
+    :type  reposlugs: tuple
+    :param state: state of previous runs
+    :type  state: class:`ghia.state.StateStore`, optional
+    :param cache: cache of issue listings for conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: pairs of listed reposlugs and asynchronous generators
+             of reposlug and issue page pairs
+    :rtype:  list
+    """
+    token = config['github']['token']
+    since = {reposlug: repo_since(config, reposlug, state) for reposlug in reposlugs}
+
+    if config.get('api') == 'graphql':
+        return [(batch, iter_issue_pages_graphql_async(session, batch, token, since))
+                for batch in batches(reposlugs)]
+
+    async def rest_pages(reposlug):
+        # next pages are prefetched while the current one is processed
+        pages = iter_issue_pages_async(session, reposlug, token, since[reposlug],
+                                       cache=listing_cache(config, since[reposlug], cache))
+        async for issues in pages:
+            yield reposlug, issues
+
+    return [([reposlug], rest_pages(reposlug)) for reposlug in reposlugs]
+
+
+def process_page(session, config, reposlug, issues, state=None):
+    """Process a page of issues of a repo synchronously
+
+    :param session: the current session
+    :type  session: class:`requests.session.Session`
+    :param config: full configuration
+    :type  config: dict
+    :param reposlug: owner/repository GitHub reposlug
+    :type  reposlug: str
+    :param issues: page of issues
+    :type  issues: list
+    :param state: state of previous runs, unchanged issues are skipped
+    :type  state: class:`ghia.state.StateStore`, optional
+
+    :return: True if all issues were processed successfully
+    :rtype:  bool
+    """
+    ok = True
+    for issue in issues:
+        if issue['state'] == 'closed':
+            continue
+        if state is not None and state.unchanged(reposlug, issue):
+            continue
+        click.echo("-> {} ({})".format(
+            click.style(f"{reposlug}#{issue['number']}", bold=True),
+            issue['html_url']
+        ))
+        if not process_issue(session, issue, config, verbose=True):
+            ok = False
+        elif state is not None:
+            state.record(reposlug, issue)
+    return ok
+
+
+def finish_repos(state, reposlugs, failed):
+    """Save the state after processing repos
+
+    Repos with failed issues are not marked as complete, so the next run
+    lists their issues since the same time as this one and retries them.
+
+    :param state: state of previous runs
+    :type  state: class:`ghia.state.StateStore`
+    :param reposlugs: processed reposlugs
+    :type  reposlugs: list
+    :param failed: reposlugs with issues which failed
+    :type  failed: set
+    """
+    for reposlug in reposlugs:
+        if reposlug not in failed:
+            state.finish(reposlug)
+    state.save()
+
+
+def batch_process(config, reposlugs, state=None, cache=None):
     """Process all issues in given repos synchronously
 
     :param config: full configuration
     :type  config: class:`configparser.ConfigParser`
     :param reposlugs: owner/repository GitHub reposlugs
     :type  reposlugs: tuple
+    :param state: state of previous runs, unchanged issues are skipped
+    :type  state: class:`ghia.state.StateStore`, optional
+    :param cache: cache of issue listings for conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
     """
+    import requests
 
-    token = config['github']['token']
     session = requests.Session()
 
-    # issue gathering
-    for reposlug in reposlugs:
-        issues = gather_issues(session, reposlug, token)
+    # issue gathering, each page is processed as soon as it arrives
+    for listed, pages in page_sources(session, config, reposlugs, state, cache):
+        failed = set()
+        for reposlug, issues in pages:
+            if not process_page(session, config, reposlug, issues, state):
+                failed.add(reposlug)
 
-        # issue processing
-        for issue in issues:
-            if issue['state'] == 'closed':
-                continue
-            click.echo("-> {} ({})".format(
-                click.style(f"{reposlug}#{issue['number']}", bold=True),
-                issue['html_url']
-            ))
-            process_issue(session, issue, config, verbose=True)
+        if state is not None:
+            finish_repos(state, listed, failed)
 
 
-async def batch_process_async(config, reposlugs):
+async def batch_process_async(config, reposlugs, max_concurrency=10, state=None, cache=None,
+                              orgs=()):
     """Process all issues in given repos asynchronously
 
+    Repos of organizations are processed as soon as their page
+    of the repository listing arrives.
+
     :param config: full configuration
     :type  config: class:`configparser.ConfigParser`
     :param reposlugs: owner/repository GitHub reposlugs
     :type  reposlugs: tuple
+    :param max_concurrency: maximum number of GitHub requests in flight
+    :type  max_concurrency: int, optional
+    :param state: state of previous runs, unchanged issues are skipped
+    :type  state: class:`ghia.state.StateStore`, optional
+    :param cache: cache of issue and repository listings for conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+    :param orgs: GitHub organizations whose repos are processed too
+    :type  orgs: tuple, optional
     """
+    import asyncio
+    import aiohttp
+    from .ratelimit import RateLimitedSession
 
-    token = config['github']['token']
+    async with aiohttp.ClientSession() as client:
+        session = RateLimitedSession(client, max_concurrency)
 
-    async with aiohttp.ClientSession() as session:
-        async def proc_issue(issue, reposlug):
+        async def proc_issue(issue, reposlug, failed):
+            if state is not None and state.unchanged(reposlug, issue):
+                return
             issue['ghia_output'] = "-> {} ({})\n".format(
                 click.style(f"{reposlug}#{issue['number']}", bold=True),
                 issue['html_url']
             )
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None, process_issue, session, issue, config, True
-            )
-            # process_issue(session, issue, config, True)
-
-        cors = [gather_issues_async(session, reposlug, token) for reposlug in reposlugs]
-        icors = []
-        issues_all = await asyncio.gather(*cors)
-        for issues, reposlug in zip(issues_all, reposlugs):
-            for issue in issues:
-                icors.append(proc_issue(issue, reposlug))
-        await asyncio.gather(*icors)
+            if not await process_issue_async(session, issue, config, True):
+                failed.add(reposlug)
+            elif state is not None:
+                state.record(reposlug, issue)
+
+        async def proc_source(listed, pages):
+            failed = set()
+            async for reposlug, issues in pages:
+                await asyncio.gather(*[proc_issue(issue, reposlug, failed) for issue in issues])
+            if state is not None:
+                finish_repos(state, listed, failed)
+
+        def start(reposlugs):
+            sources = page_sources_async(session, config, reposlugs, state, cache)
+            return [asyncio.ensure_future(proc_source(listed, pages)) for listed, pages in sources]
+
+        reposlugs = tuple(dict.fromkeys(reposlugs))
+        tasks = start(reposlugs)
+        seen = set(reposlugs)
+        for org in orgs:
+            async for page in iter_org_repos_async(session, org, config['github']['token'], cache):
+                found = [reposlug for reposlug in page if reposlug not in seen]
+                seen.update(found)
+                tasks += start(found)
+        await asyncio.gather(*tasks)
 
 
 @click.command()
@@ -134,22 +361,83 @@ async def batch_process_async(config, reposlugs):
               default='append', show_default=True)
 @click.option('-d', '--dry-run', help='Run without making any changes.', is_flag=True)
 @click.option('-x', '--async', 'is_async', help='Process repos and issues asynchronously.', is_flag=True)
+@click.option('-m', '--max-concurrency', help='Maximum of concurrent GitHub requests (async).',
+              type=click.IntRange(min=1), default=10, show_default=True)
+@click.option('-w', '--workers', help='Number of processes sharing the work (sync REST only).',
+              type=click.IntRange(min=1), default=1, show_default=True)
+@click.option('--since', help='Only process issues updated since this time (UTC).',
+              type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%SZ']))
+@click.option('--state', 'state_path', help='State file enabling incremental runs.',
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--cache', 'cache_path', help='Cache file enabling conditional requests.',
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--content-cache', 'content_cache_path',
+              help='File remembering rule results by issue content across runs.',
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--profile-rules', 'profile_output',
+              help='Profile every rule pattern and write the report to this file (- for stdout).',
+              type=click.File('w'))
+@click.option('--profile-format', help='Format of the rule profiling report.',
+              type=click.Choice(['table', 'json']), default='table', show_default=True)
+@click.option('--api', help='GitHub API used to list issues.',
+              type=click.Choice(['rest', 'graphql']), default='rest', show_default=True)
 @click.option('-a', '--config-auth', help='File with authorization configuration.',
               required=True, type=click.File('r'), callback=click_validate_config_auth)
 @click.option('-r', '--config-rules', help='File with assignment rules configuration.',
               required=True, type=click.File('r'), callback=click_validate_config_rules)
-@click.argument('reposlug', callback=click_validate_reposlug, nargs=-1, required=True)
-def main_cmd(strategy, dry_run, is_async, config_auth, config_rules, reposlug):
+@click.option('--org', 'orgs', help='Process all repos of the organization with open issues.',
+              multiple=True)
+@click.argument('reposlug', callback=click_validate_reposlug, nargs=-1, metavar='REPOSLUG...')
+def main_cmd(strategy, dry_run, is_async, max_concurrency, workers, since, state_path, cache_path,
+             content_cache_path, profile_output, profile_format, api, config_auth, config_rules,
+             orgs, reposlug):
     """CLI tool for automatic issue assigning of GitHub issues"""
+    if workers > 1 and (is_async or api != 'rest'):
+        raise click.UsageError('--workers can only be used with the synchronous REST mode.')
 
     config = {**config_auth, **config_rules}
     config['strategy'] = strategy
     config['dry_run'] = dry_run
+    config['api'] = api
+    if since is not None:
+        config['since'] = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    # dry runs change nothing so they must not be remembered
+    state = None
+    if state_path is not None and not dry_run:
+        state = StateStore(state_path, config)
+
+    cache = HTTPCache(cache_path) if cache_path is not None else None
+    if content_cache_path is not None:
+        config['content_cache'] = ContentCache(path=content_cache_path)
+    if profile_output is not None:
+        from .profiling import RuleProfiler
+        config['profiler'] = RuleProfiler()
 
-    if is_async:
-        asyncio.run(batch_process_async(config, reposlug))
-    else:
-        batch_process(config, reposlug)
+    try:
+        if orgs and not is_async:
+            # the asynchronous mode discovers repos while processing them
+            reposlug = discover_repos(config, reposlug, orgs, cache)
+        if is_async:
+            # the asynchronous stack is only imported when used, keeping startup fast
+            import asyncio
+            asyncio.run(batch_process_async(config, reposlug, max_concurrency, state, cache, orgs))
+        elif workers > 1:
+            from .parallel import batch_process_sharded
+            batch_process_sharded(config, reposlug, workers, state,
+                                  state_path if state is not None else None, cache_path)
+        else:
+            batch_process(config, reposlug, state, cache)
+    finally:
+        if state is not None:
+            state.close()
+        if cache is not None:
+            cache.close()
+        if 'content_cache' in config:
+            config['content_cache'].close()
+        if profile_output is not None:
+            from .profiling import format_report
+            profile_output.write(format_report(config['profiler'].report(), profile_format))
 
 
 def main():
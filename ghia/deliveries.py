@@ -0,0 +1,110 @@
+"""Idempotency cache of received webhook deliveries
+"""
+
+import collections
+import sqlite3
+import threading
+import time
+
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS deliveries (
+    id TEXT PRIMARY KEY,
+    received REAL NOT NULL
+);
+'''
+# persisted deliveries are pruned every this many claims
+_prune_every = 100
+
+
+class DeliveryCache:
+    """Bounded TTL set of ``X-GitHub-Delivery`` IDs, the oldest are forgotten first
+
+    A delivery is claimed when it is accepted, claiming a known delivery
+    fails so redeliveries can be answered without processing.
+    Optionally the IDs are kept in a SQLite file to survive restarts.
+
+    :param maxsize: maximum number of remembered deliveries
+    :type  maxsize: int, optional
+    :param ttl: seconds a delivery is remembered for
+    :type  ttl: float, optional
+    :param path: path to the SQLite database, created if missing
+    :type  path: str, optional
+    """
+
+    def __init__(self, maxsize=10000, ttl=86400, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.ids = collections.OrderedDict()
+        self.duplicates = 0
+        self.db = None
+        self.claims = 0
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.executescript(_schema)
+            rows = self.db.execute(
+                'SELECT id, received FROM deliveries WHERE received >= ? '
+                'ORDER BY received DESC LIMIT ?', (time.time() - ttl, maxsize)
+            ).fetchall()
+            for delivery, received in reversed(rows):
+                self.ids[delivery] = received
+
+    def _expire(self, now):
+        """Forget expired and excess deliveries, lock must be held
+
+        :param now: current UNIX time
+        :type  now: float
+        """
+        while self.ids:
+            delivery, received = next(iter(self.ids.items()))
+            if received >= now - self.ttl and len(self.ids) <= self.maxsize:
+                break
+            self.ids.popitem(last=False)
+
+    def claim(self, delivery):
+        """Claim a delivery for processing
+
+        :param delivery: ``X-GitHub-Delivery`` ID
+        :type  delivery: str
+
+        :return: False if the delivery was already claimed, True otherwise
+        :rtype:  bool
+        """
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            if delivery in self.ids:
+                # not reordered, expiry relies on the order of receipt
+                self.duplicates += 1
+                return False
+            self.ids[delivery] = now
+            self._expire(now)
+            if self.db is not None:
+                self.db.execute('INSERT OR REPLACE INTO deliveries VALUES (?, ?)', (delivery, now))
+                self.claims += 1
+                if self.claims % _prune_every == 0:
+                    self.db.execute('DELETE FROM deliveries WHERE received < ?', (now - self.ttl,))
+                self.db.commit()
+        return True
+
+    def release(self, delivery):
+        """Forget a claimed delivery so its redelivery gets processed
+
+        :param delivery: ``X-GitHub-Delivery`` ID
+        :type  delivery: str
+        """
+        with self.lock:
+            self.ids.pop(delivery, None)
+            if self.db is not None:
+                self.db.execute('DELETE FROM deliveries WHERE id = ?', (delivery,))
+                self.db.commit()
+
+    def stats(self):
+        """Get cache statistics
+
+        :return: remembered deliveries and short-circuited duplicates
+        :rtype:  dict
+        """
+        with self.lock:
+            return {'size': len(self.ids), 'duplicates': self.duplicates}
@@ -2,9 +2,17 @@
 """
 
 import click
-import requests
-import asyncio
-import aiohttp
+import collections
+import itertools
+import os
+import urllib.parse
+from .rules import BudgetExceeded, get_ruleset, match_users
+
+
+#: base URL of the GitHub REST API, e.g. of a GitHub Enterprise server or a stand-in
+API_URL = os.environ.get('GHIA_API_URL', 'https://api.github.com').rstrip('/')
+#: issues requested per page, the maximum GitHub allows
+PER_PAGE = 100
 
 
 def get_gh_login(session, token):
@@ -18,7 +26,7 @@ def get_gh_login(session, token):
     :return GitHub login (name)
     :rtype  str
     """
-    url = 'https://api.github.com/user'
+    url = f"{API_URL}/user"
     r = session.get(url, headers={'Authorization': f"token {token}"})
 
     if r.status_code != 200:
@@ -91,11 +99,9 @@ def print_issue_update_error(issue):
     ), err=True)
 
 
-def add_fallback_label(session, issue, config, verbose):
-    """Add a fallback label to an issue
+def _fallback_labels(issue, config, verbose):
+    """Prepare fallback labeling of an issue
 
-    :param session: the current session
-    :type  session: class:`requests.session.Session`
     :param issue: processed issue
     :type  issue: dict
     :param config: app configuration
@@ -103,8 +109,8 @@ def add_fallback_label(session, issue, config, verbose):
     :param verbose: print status and errors
     :type  verbose: bool
 
-    :return: False on failure, True otherwise
-    :rtype:  bool
+    :return: new labels to publish or None if there is nothing to publish
+    :rtype:  list
     """
     label = config['fallback']['label']
     # check if fallback label already exists
@@ -119,35 +125,119 @@ def add_fallback_label(session, issue, config, verbose):
         )
 
     if has_label or config['dry_run']:
-        return True
-
-    # publish changes to GitHub
+        return None
     labels.append(label)
-    token = config['github']['token']
-    r = session.patch(issue['url'],
-                      json={'labels': labels},
-                      headers={'Authorization': f"token {token}"})
+    return labels
 
-    if r.status_code != 200:
+
+def _update_done(status, issue, verbose):
+    """Check the result of an issue update
+
+    :param status: HTTP status of the update
+    :type  status: int
+    :param issue: processed issue
+    :type  issue: dict
+    :param verbose: print status and errors
+    :type  verbose: bool
+
+    :return: False on failure, True otherwise
+    :rtype:  bool
+    """
+    if status != 200:
         if verbose:
             print_issue_update_error(issue)
         return False
     return True
 
 
-def reassign(session, token, old, new, issue, verbose):
-    """Assign given users to issue
+def _take_updated_at(issue, update, data):
+    """Take the ``updated_at`` of an updated issue from the update response
+
+    The update itself changes the timestamp. Remembering the new one keeps
+    incremental runs from processing the issue again only because ghia
+    changed it. If the issue was edited by someone else meanwhile,
+    its content differs from the processed one and the old timestamp is kept.
+
+    :param issue: processed issue, updated in place
+    :type  issue: dict
+    :param update: published fields
+    :type  update: dict
+    :param data: decoded response of the update
+    :type  data: dict
+    """
+    if not isinstance(data, dict) or not data.get('updated_at'):
+        return
+    labels = update.get('labels', [label['name'] for label in issue['labels']])
+    if data.get('title') == issue['title'] and (data.get('body') or '') == (issue['body'] or '') \
+            and sorted(label['name'] for label in data.get('labels', [])) == sorted(labels):
+        issue['updated_at'] = data['updated_at']
+
+
+def issue_update(issue, config, old, new, verbose):
+    """Compute the final changes of an issue
+
+    Labels and assignees are merged so the issue is updated
+    with a single request.
+
+    :param issue: processed issue
+    :type  issue: dict
+    :param config: app configuration
+    :type  config: dict
+    :param old: original assignees
+    :type  old: set
+    :param new: new assignees
+    :type  new: set
+    :param verbose: print status and errors
+    :type  verbose: bool
+
+    :return: fields to update, empty if there is nothing to publish
+    :rtype:  dict
+    """
+    update = {}
+    # use fallback label if it's set and the issue is empty
+    if 'fallback' in config and len(new) == 0:
+        labels = _fallback_labels(issue, config, verbose)
+        if labels is not None:
+            update['labels'] = labels
+
+    # only change assignees if necessary
+    if not config['dry_run'] and new != old:
+        update['assignees'] = list(new)
+    return update
+
+
+def _update_report(ok, update, old, new, issue, verbose):
+    """Print the assignee diff after an issue update
+
+    :param ok: whether the update succeeded
+    :type  ok: bool
+    :param update: published fields
+    :type  update: dict
+    :param old: original assignees
+    :type  old: set
+    :param new: new assignees
+    :type  new: set
+    :param issue: processed issue
+    :type  issue: dict
+    :param verbose: print status and errors
+    :type  verbose: bool
+    """
+    if verbose:
+        # failed reassignment leaves the original assignees
+        print_assign_diff(old, new if ok or 'assignees' not in update else old, issue)
+
+
+def update_issue(session, token, issue, update, verbose):
+    """Publish changes of an issue to GitHub
 
     :param session: the current session
     :type  session: class:`requests.session.Session`
     :param token: GitHub access token
     :type  token: str
-    :param old: original assignees
-    :type  old: list
-    :param new: new assignees
-    :type  new: list
-    :param issue: issue to assign users to
+    :param issue: processed issue
     :type  issue: dict
+    :param update: fields to update
+    :type  update: dict
     :param verbose: print status and errors
     :type  verbose: bool
 
@@ -155,73 +245,216 @@ def reassign(session, token, old, new, issue, verbose):
     :rtype:  bool
     """
     r = session.patch(issue['url'],
-                      json={'assignees': list(new)},
+                      json=update,
                       headers={'Authorization': f"token {token}"})
-
-    if r.status_code != 200:
-        if verbose:
-            print_issue_update_error(issue)
-            print_assign_diff(old, old, issue)
+    if not _update_done(r.status_code, issue, verbose):
         return False
-    if verbose:
-        print_assign_diff(old, new, issue)
+    try:
+        _take_updated_at(issue, update, r.json())
+    except ValueError:
+        pass
     return True
 
 
-def process_issue(session, issue, config, verbose=False):
-    """Process a single issue
+async def update_issue_async(session, token, issue, update, verbose):
+    """Publish changes of an issue to GitHub asynchronously
 
     :param session: the current session
-    :type  session: class:`requests.session.Session`
+    :type  session: class:`aiohttp.ClientSession`
+    :param token: GitHub access token
+    :type  token: str
+    :param issue: processed issue
+    :type  issue: dict
+    :param update: fields to update
+    :type  update: dict
+    :param verbose: print status and errors
+    :type  verbose: bool
+
+    :return: False on failure, True otherwise
+    :rtype:  bool
+    """
+    async with session.patch(issue['url'],
+                             json=update,
+                             headers={'Authorization': f"token {token}"}) as r:
+        if not _update_done(r.status, issue, verbose):
+            return False
+        try:
+            _take_updated_at(issue, update, await r.json(content_type=None))
+        except ValueError:
+            pass
+        return True
+
+
+def _assignees(issue, config, verbose, matched=None):
+    """Compute old and new assignees of an issue
+
     :param issue: the issue to process
     :type  issue: dict
     :param config: app configuration
     :type  config: dict
     :param verbose: print status and errors
-    :type  verbose: bool, optional
+    :type  verbose: bool
+    :param matched: users matching the issue, evaluated if None
+    :type  matched: set, optional
 
-    :return: False on failure, True otherwise
-    :rtype:  bool
+    :return: old and new assignees or None if the issue is left alone
+    :rtype:  tuple
     """
     if issue['state'] == 'closed':
-        return True
+        return None
 
     if 'ghia_output' not in issue:
         issue['ghia_output'] = ''
-    token = config['github']['token']
     old_assignees = set([usr['login'] for usr in issue['assignees']])
 
     # set strategy only assigns people to non-assigned issues
     if config['strategy'] == 'set' and len(old_assignees) > 0:
         if verbose:
             print_assign_diff(old_assignees, old_assignees, issue)
-            click.echo(issue['ghia_output'], nl=False)
-            del issue['ghia_output']
-        return True
+        _flush_output(issue, verbose)
+        return None
 
     # append strategy keeps old assignees, others do not
     new_assignees = old_assignees.copy() if config['strategy'] == 'append' else set()
+    if matched is None:
+        if config.get('profiler') is not None:
+            matched = config['profiler'].match(get_ruleset(config), issue)
+        elif config.get('content_cache') is not None:
+            matched = config['content_cache'].match(get_ruleset(config), issue)
+        else:
+            matched = match_users(get_ruleset(config), issue)
+    new_assignees |= matched
+    return old_assignees, new_assignees
 
-    for user in config['patterns']:
-        patterns = config['patterns'][user]
-        if check_match(issue, patterns):
-            new_assignees.add(user)
 
-    ret = True
-    # use fallback label if it's set and the issue is empty
-    if 'fallback' in config:
-        if len(new_assignees) == 0:
-            ret &= add_fallback_label(session, issue, config, verbose)
+def _count_update(config, update, ok):
+    """Record the outcome of processing an issue if metrics are collected
+
+    :param config: app configuration
+    :type  config: dict
+    :param update: fields sent to GitHub, empty if nothing was sent
+    :type  update: dict
+    :param ok: whether the update succeeded
+    :type  ok: bool
+    """
+    metrics = config.get('metrics')
+    if metrics is not None:
+        metrics.count_update('failed' if not ok else 'sent' if update else 'skipped')
+
+
+def _budget_exceeded(config, issue, verbose, error):
+    """Leave alone an issue whose matching ran out of its time budget
+
+    Partial results could drop assignees or add the fallback label,
+    so the issue is reported as failed and retried later.
+
+    :param config: app configuration
+    :type  config: dict
+    :param issue: the issue
+    :type  issue: dict
+    :param verbose: print status and errors
+    :type  verbose: bool
+    :param error: the raised error
+    :type  error: class:`ghia.rules.BudgetExceeded`
+
+    :return: False
+    :rtype:  bool
+    """
+    _flush_output(issue, verbose)
+    click.echo(f"WARNING: {error}, the issue is left alone", err=True)
+    _count_update(config, None, False)
+    return False
 
-    # only send patch requests if necessary
-    if not config['dry_run'] and new_assignees != old_assignees:
-        ret &= reassign(session, token, old_assignees, new_assignees, issue, verbose)
-    elif verbose:
-        print_assign_diff(old_assignees, new_assignees, issue)
 
+def _flush_output(issue, verbose):
+    """Print the collected output of a processed issue
+
+    :param issue: the processed issue
+    :type  issue: dict
+    :param verbose: print status and errors
+    :type  verbose: bool
+    """
     if verbose:
         click.echo(issue['ghia_output'], nl=False)
         del issue['ghia_output']
+
+
+def process_issue(session, issue, config, verbose=False, matched=None):
+    """Process a single issue
+
+    At most one update request is sent per issue.
+
+    :param session: the current session
+    :type  session: class:`requests.session.Session`
+    :param issue: the issue to process
+    :type  issue: dict
+    :param config: app configuration
+    :type  config: dict
+    :param verbose: print status and errors
+    :type  verbose: bool, optional
+    :param matched: users matching the issue if already known
+    :type  matched: set, optional
+
+    :return: False on failure, True otherwise
+    :rtype:  bool
+    """
+    try:
+        assignees = _assignees(issue, config, verbose, matched)
+    except BudgetExceeded as e:
+        return _budget_exceeded(config, issue, verbose, e)
+    if assignees is None:
+        _count_update(config, None, True)
+        return True
+    old_assignees, new_assignees = assignees
+
+    ret = True
+    update = issue_update(issue, config, old_assignees, new_assignees, verbose)
+    if update:
+        ret = update_issue(session, config['github']['token'], issue, update, verbose)
+    _update_report(ret, update, old_assignees, new_assignees, issue, verbose)
+    _count_update(config, update, ret)
+
+    _flush_output(issue, verbose)
+    return ret
+
+
+async def process_issue_async(session, issue, config, verbose=False, matched=None):
+    """Process a single issue asynchronously
+
+    At most one update request is sent per issue.
+
+    :param session: the current session
+    :type  session: class:`aiohttp.ClientSession`
+    :param issue: the issue to process
+    :type  issue: dict
+    :param config: app configuration
+    :type  config: dict
+    :param verbose: print status and errors
+    :type  verbose: bool, optional
+    :param matched: users matching the issue if already known
+    :type  matched: set, optional
+
+    :return: False on failure, True otherwise
+    :rtype:  bool
+    """
+    try:
+        assignees = _assignees(issue, config, verbose, matched)
+    except BudgetExceeded as e:
+        return _budget_exceeded(config, issue, verbose, e)
+    if assignees is None:
+        _count_update(config, None, True)
+        return True
+    old_assignees, new_assignees = assignees
+
+    ret = True
+    update = issue_update(issue, config, old_assignees, new_assignees, verbose)
+    if update:
+        ret = await update_issue_async(session, config['github']['token'], issue, update,
+                                       verbose)
+    _update_report(ret, update, old_assignees, new_assignees, issue, verbose)
+    _count_update(config, update, ret)
+
+    _flush_output(issue, verbose)
     return ret
 
 
@@ -238,8 +471,59 @@ def gather_issues_error(reposlug):
     exit(10)
 
 
-def gather_issues(session, reposlug, token):
-    """Fetch all issues from the provided repo synchronously
+def issues_url(reposlug, since=None):
+    """Build the URL listing open issues of a repo
+
+    Only open issues are requested, in pages as large as GitHub allows.
+
+    :param reposlug: GitHub reposlug "owner/repository"
+    :type  reposlug: str
+    :param since: only list issues updated at or after this ISO 8601 timestamp
+    :type  since: str, optional
+
+    :return: URL of the first page
+    :rtype:  str
+    """
+    user, repo = reposlug.split('/')
+    params = {'state': 'open', 'per_page': PER_PAGE}
+    if since is not None:
+        params['since'] = since
+    return f"{API_URL}/repos/{user}/{repo}/issues?{urllib.parse.urlencode(params)}"
+
+
+def skip_pull_requests(issues):
+    """Drop pull requests from a page of the issue listing
+
+    :param issues: page of issues
+    :type  issues: list
+
+    :return: issues which are not pull requests
+    :rtype:  list
+    """
+    return [issue for issue in issues if 'pull_request' not in issue]
+
+
+def request_headers(token, url, cache=None):
+    """Build headers of a GitHub GET request
+
+    :param token: GitHub access token
+    :type  token: str
+    :param url: request URL
+    :type  url: str
+    :param cache: cache of previous responses
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: request headers
+    :rtype:  dict
+    """
+    headers = {'Authorization': f"token {token}"}
+    if cache is not None:
+        headers.update(cache.conditions(url))
+    return headers
+
+
+def fetch_issue_page(session, reposlug, token, url, cache=None):
+    """Fetch a single page of issues synchronously
 
     :param session: the current session
     :type  session: class:`requests.session.Session`
@@ -247,58 +531,299 @@ def gather_issues(session, reposlug, token):
     :type  reposlug: str
     :param token: GitHub access token
     :type  token: str
+    :param url: URL of the page
+    :type  url: str
+    :param cache: cache of previous responses, enables conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
 
-    :return: gathered issues
-    :rtype:  list
+    :return: issues of the page and pagination links
+    :rtype:  tuple
     """
+    r = session.get(url, headers=request_headers(token, url, cache))
 
-    user, repo = reposlug.split('/')
-    url = f"https://api.github.com/repos/{user}/{repo}/issues"
-    issues = []
+    if cache is not None and r.status_code == 304:
+        issues, links = cache.load(url)
+    elif r.status_code != 200:
+        gather_issues_error(reposlug)
+    else:
+        issues, links = r.json(), r.links
+        if cache is not None:
+            cache.store(url, r.headers, r.text, links)
+    return skip_pull_requests(issues), links
 
-    while True:
-        # request issues
-        r = session.get(url, headers={'Authorization': f"token {token}"})
 
-        if r.status_code != 200:
-            gather_issues_error(reposlug)
-        issues += r.json()
+def iter_issue_pages(session, reposlug, token, since=None, cache=None):
+    """Fetch issues from the provided repo synchronously, page by page
+
+    :param session: the current session
+    :type  session: class:`requests.session.Session`
+    :param reposlug: GitHub reposlug "owner/repository"
+    :type  reposlug: str
+    :param token: GitHub access token
+    :type  token: str
+    :param since: only list issues updated at or after this ISO 8601 timestamp
+    :type  since: str, optional
+    :param cache: cache of previous responses, enables conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: generator of issue pages
+    :rtype:  generator
+    """
+
+    url = issues_url(reposlug, since)
+
+    while True:
+        issues, links = fetch_issue_page(session, reposlug, token, url, cache)
+        yield issues
         # stop paginating once we reach the end
-        if 'next' not in r.links:
-            return issues
+        if 'next' not in links:
+            return
 
-        url = r.links['next']['url']
+        url = links['next']['url']
 
 
-async def gather_issues_async(session, reposlug, token):
-    """Fetch all issues from the provided repo
+def gather_issues(session, reposlug, token, since=None):
+    """Fetch all issues from the provided repo synchronously
 
-    :param session: the current session asynchronously
-    :type  session: class:`aiohttp.ClientSession`
+    :param session: the current session
+    :type  session: class:`requests.session.Session`
     :param reposlug: GitHub reposlug "owner/repository"
     :type  reposlug: str
     :param token: GitHub access token
     :type  token: str
+    :param since: only list issues updated at or after this ISO 8601 timestamp
+    :type  since: str, optional
 
     :return: gathered issues
     :rtype:  list
     """
+    pages = iter_issue_pages(session, reposlug, token, since)
+    return [issue for page in pages for issue in page]
 
-    async def get_url(url, getlinks=False):
-        async with session.get(url, headers={'Authorization': f"token {token}"}) as r:
-            if r.status != 200:
-                gather_issues_error(reposlug)
-            return (await r.json(), r.links) if getlinks else (await r.json())
 
-    user, repo = reposlug.split('/')
-    issues, links = await get_url(f"https://api.github.com/repos/{user}/{repo}/issues", True)
+def gather_repos_error(org):
+    """Print error regarding repository listing and exit
+
+    :param org: GitHub organization
+    :type  org: str
+    """
+    click.echo("{}: Could not list repositories of organization {}".format(
+        click.style('ERROR', bold=True, fg='red'),
+        org
+    ), err=True)
+    exit(10)
+
+
+def org_repos_url(org):
+    """Build the URL listing repositories of an organization
+
+    :param org: GitHub organization
+    :type  org: str
+
+    :return: URL of the first page
+    :rtype:  str
+    """
+    params = {'type': 'all', 'per_page': PER_PAGE}
+    return f"{API_URL}/orgs/{org}/repos?{urllib.parse.urlencode(params)}"
+
+
+def active_repos(repos):
+    """Pick repositories which may have open issues from a page of the listing
+
+    Archived repositories, repositories with issues disabled
+    and repositories without open issues are skipped.
+
+    :param repos: page of repositories
+    :type  repos: list
+
+    :return: reposlugs of the picked repositories
+    :rtype:  list
+    """
+    return [repo['full_name'] for repo in repos
+            if not repo.get('archived') and repo.get('has_issues', True)
+            and repo.get('open_issues_count', 0) > 0]
+
+
+def iter_org_repos(session, org, token, cache=None):
+    """Fetch repositories of an organization which may have open issues, page by page
+
+    :param session: the current session
+    :type  session: class:`requests.session.Session`
+    :param org: GitHub organization
+    :type  org: str
+    :param token: GitHub access token
+    :type  token: str
+    :param cache: cache of previous responses, enables conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: generator of pages of reposlugs
+    :rtype:  generator
+    """
+    url = org_repos_url(org)
+
+    while True:
+        r = session.get(url, headers=request_headers(token, url, cache))
+
+        if cache is not None and r.status_code == 304:
+            repos, links = cache.load(url)
+        elif r.status_code != 200:
+            gather_repos_error(org)
+        else:
+            repos, links = r.json(), r.links
+            if cache is not None:
+                cache.store(url, r.headers, r.text, links)
+        yield active_repos(repos)
+        if 'next' not in links:
+            return
+
+        url = links['next']['url']
+
+
+async def iter_org_repos_async(session, org, token, cache=None):
+    """Fetch repositories of an organization which may have open issues asynchronously
+
+    See :func:`iter_org_repos` for details.
+
+    :param session: the current session
+    :type  session: class:`aiohttp.ClientSession` or
+                    class:`ghia.ratelimit.RateLimitedSession`
+    :param org: GitHub organization
+    :type  org: str
+    :param token: GitHub access token
+    :type  token: str
+    :param cache: cache of previous responses, enables conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: asynchronous generator of pages of reposlugs
+    :rtype:  async_generator
+    """
+    url = org_repos_url(org)
+
+    while True:
+        async with session.get(url, headers=request_headers(token, url, cache)) as r:
+            if cache is not None and r.status == 304:
+                repos, links = cache.load(url)
+            elif r.status != 200:
+                gather_repos_error(org)
+            else:
+                repos, links = await r.json(), r.links
+                if cache is not None:
+                    cache.store(url, r.headers, await r.text(), links)
+        yield active_repos(repos)
+        if 'next' not in links:
+            return
+
+        url = links['next']['url']
+
+
+def page_url(url, page):
+    """Point a paginated URL to another page
+
+    :param url: URL of any page
+    :type  url: str
+    :param page: page number
+    :type  page: int
+
+    :return: URL of the given page
+    :rtype:  str
+    """
+    parts = urllib.parse.urlsplit(str(url))
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query) if k != 'page']
+    query.append(('page', str(page)))
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def page_number(url):
+    """Get the page number of a paginated URL
+
+    :param url: page URL
+    :type  url: str
+
+    :return: the page number
+    :rtype:  int
+    """
+    return int(dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(str(url)).query))['page'])
+
+
+async def iter_issue_pages_async(session, reposlug, token, since=None, prefetch=4, cache=None):
+    """Fetch issues from the provided repo asynchronously, page by page
+
+    Up to ``prefetch`` pages are requested ahead while the caller
+    processes the current one. Pages are yielded in order.
+
+    :param session: the current session
+    :type  session: class:`aiohttp.ClientSession` or
+                    class:`ghia.ratelimit.RateLimitedSession`
+    :param reposlug: GitHub reposlug "owner/repository"
+    :type  reposlug: str
+    :param token: GitHub access token
+    :type  token: str
+    :param since: only list issues updated at or after this ISO 8601 timestamp
+    :type  since: str, optional
+    :param prefetch: number of pages requested ahead
+    :type  prefetch: int, optional
+    :param cache: cache of previous responses, enables conditional requests
+    :type  cache: class:`ghia.httpcache.HTTPCache`, optional
+
+    :return: asynchronous generator of issue pages
+    :rtype:  async_generator
+    """
+    import asyncio
 
-    baseurl, lastp = str(links['last']['url']).split('page=')
-    cors = []
+    async def get_url(url, getlinks=False):
+        async with session.get(url, headers=request_headers(token, url, cache)) as r:
+            if cache is not None and r.status == 304:
+                issues, links = cache.load(url)
+            elif r.status != 200:
+                gather_issues_error(reposlug)
+            else:
+                issues, links = await r.json(), r.links
+                if cache is not None:
+                    cache.store(url, r.headers, await r.text(), links)
+            issues = skip_pull_requests(issues)
+            return (issues, links) if getlinks else issues
+
+    issues, links = await get_url(issues_url(reposlug, since), True)
+    yield issues
+    if 'last' not in links:
+        return
+
+    lasturl = links['last']['url']
+    lastp = page_number(lasturl)
+    pages = iter(range(2, lastp + 1))
+    pending = collections.deque(
+        asyncio.ensure_future(get_url(page_url(lasturl, page)))
+        for page in itertools.islice(pages, prefetch)
+    )
+    try:
+        while pending:
+            issues = await pending.popleft()
+            page = next(pages, None)
+            if page is not None:
+                pending.append(asyncio.ensure_future(get_url(page_url(lasturl, page))))
+            yield issues
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def gather_issues_async(session, reposlug, token, since=None):
+    """Fetch all issues from the provided repo
 
-    for page in range(2, int(lastp) + 1):
-        cors.append(get_url(f"{baseurl}page={page}"))
-    for i in await asyncio.gather(*cors):
-        issues += i
+    :param session: the current session asynchronously
+    :type  session: class:`aiohttp.ClientSession` or
+                    class:`ghia.ratelimit.RateLimitedSession`
+    :param reposlug: GitHub reposlug "owner/repository"
+    :type  reposlug: str
+    :param token: GitHub access token
+    :type  token: str
+    :param since: only list issues updated at or after this ISO 8601 timestamp
+    :type  since: str, optional
 
+    :return: gathered issues
+    :rtype:  list
+    """
+    issues = []
+    async for page in iter_issue_pages_async(session, reposlug, token, since):
+        issues += page
     return issues
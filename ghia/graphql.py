@@ -0,0 +1,273 @@
+"""GraphQL issue gathering, several repositories per request
+"""
+
+import json
+import os
+from .github import API_URL, gather_issues_error
+
+
+def graphql_url(api_url):
+    """Derive the GraphQL endpoint from the base URL of the REST API
+
+    GitHub Enterprise serves REST at ``/api/v3`` and GraphQL at ``/api/graphql``.
+
+    :param api_url: base URL of the REST API without a trailing slash
+    :type  api_url: str
+
+    :return: URL of the GraphQL endpoint
+    :rtype:  str
+    """
+    if api_url.endswith('/v3'):
+        api_url = api_url[:-len('/v3')]
+    return f"{api_url}/graphql"
+
+
+#: URL of the GitHub GraphQL API, derived from the REST one unless set on its own
+GRAPHQL_URL = os.environ.get('GHIA_GRAPHQL_URL') or graphql_url(API_URL)
+#: repositories fetched by a single query
+BATCH_SIZE = 10
+#: issues per repository and page, the maximum GitHub allows
+PAGE_SIZE = 100
+
+_issue_fields = '''
+    number
+    title
+    body
+    state
+    url
+    updatedAt
+    labels(first: 100) { pageInfo { hasNextPage endCursor } nodes { name } }
+    assignees(first: 100) { nodes { login } }
+'''
+
+
+def build_query(cursors, since=None):
+    """Build a query fetching the next page of issues of several repos
+
+    :param cursors: reposlugs mapped to their page cursors (None for the first page)
+    :type  cursors: dict
+    :param since: reposlugs mapped to ISO 8601 timestamps to list issues from
+    :type  since: dict, optional
+
+    :return: GraphQL query
+    :rtype:  str
+    """
+    since = since or {}
+    parts = []
+    for i, (reposlug, cursor) in enumerate(cursors.items()):
+        owner, name = reposlug.split('/')
+        args = [f"first: {PAGE_SIZE}", 'states: OPEN']
+        if cursor is not None:
+            args.append(f"after: {json.dumps(cursor)}")
+        if since.get(reposlug) is not None:
+            args.append(f"filterBy: {{since: {json.dumps(since[reposlug])}}}")
+        parts.append(
+            f"r{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{\n"
+            f"  issues({', '.join(args)}) {{\n"
+            f"    pageInfo {{ hasNextPage endCursor }}\n"
+            f"    nodes {{ {_issue_fields} }}\n"
+            f"  }}\n"
+            f"}}"
+        )
+    return 'query {\n' + '\n'.join(parts) + '\n}'
+
+
+def build_labels_query(truncated):
+    """Build a query fetching the next page of labels of several issues
+
+    :param truncated: triples of reposlug, issue and its labels cursor
+    :type  truncated: list
+
+    :return: GraphQL query
+    :rtype:  str
+    """
+    parts = []
+    for i, (reposlug, issue, cursor) in enumerate(truncated):
+        owner, name = reposlug.split('/')
+        parts.append(
+            f"l{i}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{\n"
+            f"  issue(number: {issue['number']}) {{\n"
+            f"    labels(first: {PAGE_SIZE}, after: {json.dumps(cursor)}) {{\n"
+            f"      pageInfo {{ hasNextPage endCursor }}\n"
+            f"      nodes {{ name }}\n"
+            f"    }}\n"
+            f"  }}\n"
+            f"}}"
+        )
+    return 'query {\n' + '\n'.join(parts) + '\n}'
+
+
+def convert_issue(reposlug, node):
+    """Convert a GraphQL issue node into a REST-like issue
+
+    Only the fields used by issue processing are present.
+
+    :param reposlug: GitHub reposlug "owner/repository"
+    :type  reposlug: str
+    :param node: GraphQL issue node
+    :type  node: dict
+
+    :return: issue in the REST API shape
+    :rtype:  dict
+    """
+    repo_url = f"{API_URL}/repos/{reposlug}"
+    return {
+        'number': node['number'],
+        'title': node['title'],
+        'body': node['body'],
+        'state': node['state'].lower(),
+        'html_url': node['url'],
+        'url': f"{repo_url}/issues/{node['number']}",
+        'repository_url': repo_url,
+        'updated_at': node['updatedAt'],
+        'labels': node['labels']['nodes'],
+        'assignees': node['assignees']['nodes'],
+    }
+
+
+def parse_response(status, payload, cursors, truncated=None):
+    """Parse a response, advancing the cursors
+
+    Exits with an error when any of the repositories cannot be listed.
+
+    :param status: HTTP status of the response
+    :type  status: int
+    :param payload: decoded response body
+    :type  payload: dict
+    :param cursors: reposlugs mapped to their page cursors, updated in place
+    :type  cursors: dict
+    :param truncated: list extended with issues having more labels
+                      (see :func:`build_labels_query`)
+    :type  truncated: list, optional
+
+    :return: pairs of reposlug and its page of issues
+    :rtype:  list
+    """
+    data = payload.get('data') if status == 200 and isinstance(payload, dict) else None
+    pages = []
+    for i, reposlug in enumerate(list(cursors)):
+        repo = data.get(f"r{i}") if data else None
+        if repo is None:
+            gather_issues_error(reposlug)
+        issues = repo['issues']
+        page = [convert_issue(reposlug, node) for node in issues['nodes']]
+        if truncated is not None:
+            truncated.extend((reposlug, issue, node['labels']['pageInfo']['endCursor'])
+                             for issue, node in zip(page, issues['nodes'])
+                             if node['labels']['pageInfo']['hasNextPage'])
+        pages.append((reposlug, page))
+        if issues['pageInfo']['hasNextPage']:
+            cursors[reposlug] = issues['pageInfo']['endCursor']
+        else:
+            del cursors[reposlug]
+    return pages
+
+
+def parse_labels(status, payload, truncated):
+    """Parse a response of a labels query, adding the labels to the issues
+
+    Exits with an error when labels of any of the issues cannot be listed.
+
+    :param status: HTTP status of the response
+    :type  status: int
+    :param payload: decoded response body
+    :type  payload: dict
+    :param truncated: triples of reposlug, issue and its labels cursor
+    :type  truncated: list
+
+    :return: triples of the issues still having more labels
+    :rtype:  list
+    """
+    data = payload.get('data') if status == 200 and isinstance(payload, dict) else None
+    remaining = []
+    for i, (reposlug, issue, cursor) in enumerate(truncated):
+        repo = data.get(f"l{i}") if data else None
+        if repo is None or repo.get('issue') is None:
+            gather_issues_error(reposlug)
+        labels = repo['issue']['labels']
+        issue['labels'].extend(labels['nodes'])
+        if labels['pageInfo']['hasNextPage']:
+            remaining.append((reposlug, issue, labels['pageInfo']['endCursor']))
+    return remaining
+
+
+def iter_issue_pages_graphql(session, reposlugs, token, since=None):
+    """Fetch issues of several repos synchronously, one query per round
+
+    Every round requests the next page of all repositories not exhausted yet.
+    Issues with more than :data:`PAGE_SIZE` labels get the rest of them
+    by further queries before the page is yielded, as rules match all labels
+    and the fallback label is written along with all present labels.
+
+    :param session: the current session
+    :type  session: class:`requests.session.Session`
+    :param reposlugs: GitHub reposlugs "owner/repository", at most :data:`BATCH_SIZE`
+    :type  reposlugs: list
+    :param token: GitHub access token
+    :type  token: str
+    :param since: reposlugs mapped to ISO 8601 timestamps to list issues from
+    :type  since: dict, optional
+
+    :return: generator of reposlug and issue page pairs
+    :rtype:  generator
+    """
+    def post(query):
+        r = session.post(GRAPHQL_URL, json={'query': query},
+                         headers={'Authorization': f"bearer {token}"})
+        return r.status_code, r.json() if r.status_code == 200 else None
+
+    cursors = dict.fromkeys(reposlugs)
+    while cursors:
+        truncated = []
+        pages = parse_response(*post(build_query(cursors, since)), cursors, truncated)
+        while truncated:
+            truncated = parse_labels(*post(build_labels_query(truncated)), truncated)
+        yield from pages
+
+
+async def iter_issue_pages_graphql_async(session, reposlugs, token, since=None):
+    """Fetch issues of several repos asynchronously, one query per round
+
+    See :func:`iter_issue_pages_graphql` for details.
+
+    :param session: the current session
+    :type  session: class:`aiohttp.ClientSession` or
+                    class:`ghia.ratelimit.RateLimitedSession`
+    :param reposlugs: GitHub reposlugs "owner/repository", at most :data:`BATCH_SIZE`
+    :type  reposlugs: list
+    :param token: GitHub access token
+    :type  token: str
+    :param since: reposlugs mapped to ISO 8601 timestamps to list issues from
+    :type  since: dict, optional
+
+    :return: asynchronous generator of reposlug and issue page pairs
+    :rtype:  async_generator
+    """
+    async def post(query):
+        async with session.post(GRAPHQL_URL, json={'query': query},
+                                headers={'Authorization': f"bearer {token}"}) as r:
+            return r.status, await r.json() if r.status == 200 else None
+
+    cursors = dict.fromkeys(reposlugs)
+    while cursors:
+        truncated = []
+        pages = parse_response(*await post(build_query(cursors, since)), cursors, truncated)
+        while truncated:
+            truncated = parse_labels(*await post(build_labels_query(truncated)), truncated)
+        for page in pages:
+            yield page
+
+
+def batches(reposlugs, size=BATCH_SIZE):
+    """Split reposlugs into batches fetched by a single query
+
+    :param reposlugs: GitHub reposlugs "owner/repository"
+    :type  reposlugs: tuple
+    :param size: batch size
+    :type  size: int, optional
+
+    :return: list of reposlug batches
+    :rtype:  list
+    """
+    reposlugs = list(reposlugs)
+    return [reposlugs[i:i + size] for i in range(0, len(reposlugs), size)]
@@ -2,7 +2,12 @@
 """
 
 import configparser
+import os
 import re
+import click
+from .deliveries import DeliveryCache
+from .matching import UNSAFE_MODES, analyze_pattern, linear, resolve_engine
+from .rules import ContentCache, MatchCache, get_ruleset
 
 
 def load_config_multiple(paths):
@@ -62,7 +67,7 @@ def load_config_rules(config_parser):
     :return: configuration as a dictionary
     :rtype: dict
     """
-    config = {'patterns': {}}
+    config = {'patterns': {}, 'matching': load_config_matching(config_parser)}
     for user in config_parser['patterns']:
         config['patterns'][user] = []
         for line in config_parser['patterns'][user].splitlines():
@@ -70,7 +75,113 @@ def load_config_rules(config_parser):
             if len(toks) != 2:
                 continue
             config['patterns'][user].append((toks[0], re.compile(toks[1], re.IGNORECASE)))
+    check_patterns(config['patterns'], config['matching'])
+    get_ruleset(config)
 
     if config_parser.has_option('fallback', 'label'):
         config['fallback'] = {'label': config_parser['fallback']['label']}
     return config
+
+
+def load_config_matching(config_parser):
+    """Read the optional ``[matching]`` section of the rules
+
+    :param config_parser: configparser configuration
+    :type  config_parser: class:`configparser.ConfigParser`
+
+    :raises ValueError: invalid option
+
+    :return: regex engine, handling of unsafe patterns and time budget per issue
+    :rtype:  dict
+    """
+    section = config_parser['matching'] if config_parser.has_section('matching') else {}
+    budget = float(section.get('budget', 0))
+    matching = {
+        'engine': resolve_engine(section.get('engine', 're')),
+        # a budget cannot interrupt a search, so it only holds without unsafe patterns
+        'unsafe': section.get('unsafe', 'reject' if budget > 0 else 'warn'),
+        'budget': budget,
+    }
+    if matching['unsafe'] not in UNSAFE_MODES:
+        raise ValueError(f"unknown handling of unsafe patterns {matching['unsafe']!r}")
+    if matching['budget'] < 0:
+        raise ValueError('the time budget must not be negative')
+    return matching
+
+
+def check_patterns(patterns, matching):
+    """Check patterns for catastrophic backtracking
+
+    Patterns the RE2 engine runs in linear time are not checked.
+
+    :param patterns: user patterns
+    :type  patterns: dict
+    :param matching: matching configuration
+    :type  matching: dict
+
+    :raises ValueError: an unsafe pattern is found and unsafe patterns are rejected
+    """
+    if matching['unsafe'] == 'allow':
+        return
+    for user, rules in patterns.items():
+        for item, rgx in rules:
+            reason = analyze_pattern(rgx.pattern, rgx.flags)
+            if reason is None or (matching['engine'] == 're2' and linear(rgx.pattern, rgx.flags)):
+                continue
+            message = f"pattern {item}:{rgx.pattern} of {user} may backtrack catastrophically ({reason})"
+            if matching['unsafe'] == 'reject':
+                raise ValueError(message)
+            click.echo(f"WARNING: {message}", err=True)
+
+
+def env_int(name, default):
+    """Read a non-negative integer from the environment
+
+    :param name: environment variable
+    :type  name: str
+    :param default: value used when the variable is unset or invalid
+    :type  default: int
+
+    :return: the value
+    :rtype:  int
+    """
+    value = os.environ.get(name, '')
+    return int(value) if value.isdigit() else default
+
+
+def env_deliveries():
+    """Create the cache of webhook deliveries configured by the environment
+
+    GHIA_DELIVERY_CACHE=0 disables it.
+
+    :return: the cache or None
+    :rtype:  class:`ghia.deliveries.DeliveryCache`
+    """
+    delivery_cache = env_int('GHIA_DELIVERY_CACHE', 10000)
+    if delivery_cache == 0:
+        return None
+    return DeliveryCache(delivery_cache, env_int('GHIA_DELIVERY_TTL', 86400),
+                         os.environ.get('GHIA_DELIVERY_DB'))
+
+
+def env_matches(timing=None):
+    """Create the cache of rule results configured by the environment
+
+    Results are also remembered by issue content unless GHIA_CONTENT_CACHE=0.
+    With GHIA_PROFILE_RULES=1 every rule pattern is profiled instead.
+
+    :param timing: histogram observing the seconds of every match
+    :type  timing: class:`ghia.metrics.Histogram`, optional
+
+    :return: the cache, with a profiler if profiling
+    :rtype:  class:`ghia.rules.MatchCache`
+    """
+    content = None
+    content_cache = env_int('GHIA_CONTENT_CACHE', 10000)
+    if content_cache > 0:
+        content = ContentCache(content_cache, os.environ.get('GHIA_CONTENT_DB'))
+    profiler = None
+    if env_int('GHIA_PROFILE_RULES', 0) > 0:
+        from .profiling import RuleProfiler
+        profiler = RuleProfiler()
+    return MatchCache(env_int('GHIA_MATCH_CACHE', 10000), content, profiler, timing)
@@ -0,0 +1,119 @@
+"""On-disk cache of GitHub responses for conditional requests
+"""
+
+import json
+import sqlite3
+import time
+
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    links TEXT NOT NULL,
+    body TEXT NOT NULL,
+    used REAL NOT NULL
+);
+'''
+
+
+def normalize_links(links):
+    """Convert parsed ``Link`` headers into a plain dictionary
+
+    Works with both :mod:`requests` and :mod:`aiohttp` responses.
+
+    :param links: parsed links of a response
+    :type  links: dict
+
+    :return: links as ``{rel: {'url': url}}``
+    :rtype:  dict
+    """
+    return {str(rel): {'url': str(link['url'])} for rel, link in links.items()}
+
+
+class HTTPCache:
+    """SQLite cache of responses keyed by URL
+
+    Responses carrying an ``ETag`` or ``Last-Modified`` header are stored
+    with their body and links. Later requests of the same URL are sent
+    as conditional requests and a ``304 Not Modified`` answer is served
+    from the cache. GitHub does not count such answers against the rate limit.
+    Only the most recently used responses are kept when the cache is closed.
+
+    :param path: path to the SQLite database, created if missing
+    :type  path: str
+    :param maxsize: maximum number of kept responses
+    :type  maxsize: int, optional
+    """
+
+    def __init__(self, path, maxsize=10000):
+        self.maxsize = maxsize
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_schema)
+        self.hits = 0
+        self.misses = 0
+
+    def conditions(self, url):
+        """Get conditional request headers for an URL
+
+        :param url: request URL
+        :type  url: str
+
+        :return: headers to add to the request, empty if nothing is cached
+        :rtype:  dict
+        """
+        row = self.db.execute('SELECT etag, last_modified FROM responses WHERE url = ?',
+                              (str(url),)).fetchone()
+        if row is None:
+            return {}
+        etag, last_modified = row
+        if etag:
+            return {'If-None-Match': etag}
+        return {'If-Modified-Since': last_modified}
+
+    def load(self, url):
+        """Load a cached response after a ``304 Not Modified`` answer
+
+        :param url: request URL
+        :type  url: str
+
+        :return: decoded JSON body and links
+        :rtype:  tuple
+        """
+        links, body = self.db.execute('SELECT links, body FROM responses WHERE url = ?',
+                                      (str(url),)).fetchone()
+        with self.db:
+            self.db.execute('UPDATE responses SET used = ? WHERE url = ?', (time.time(), str(url)))
+        self.hits += 1
+        return json.loads(body), json.loads(links)
+
+    def store(self, url, headers, body, links):
+        """Store a fresh response if it can be validated later
+
+        :param url: request URL
+        :type  url: str
+        :param headers: response headers
+        :type  headers: dict
+        :param body: raw JSON body
+        :type  body: str
+        :param links: parsed links of the response
+        :type  links: dict
+        """
+        self.misses += 1
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag is None and last_modified is None:
+            return
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                            (str(url), etag, last_modified,
+                             json.dumps(normalize_links(links)), body, time.time()))
+
+    def close(self):
+        """Drop the least recently used responses and close the database"""
+        with self.db:
+            self.db.execute('DELETE FROM responses WHERE url NOT IN '
+                            '(SELECT url FROM responses ORDER BY used DESC LIMIT ?)',
+                            (self.maxsize,))
+        self.db.close()
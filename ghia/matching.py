@@ -0,0 +1,270 @@
+"""Regex engines running the rules and a static analyzer of risky patterns
+"""
+
+import re
+
+try:
+    from re import _compiler as sre_compile
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_compile
+    import sre_constants
+    import sre_parse
+
+
+#: engines selectable in the ``[matching]`` section of the rules
+ENGINES = ('re', 're2', 'auto')
+#: handling of patterns prone to catastrophic backtracking
+UNSAFE_MODES = ('warn', 'reject', 'allow')
+
+_repeats = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+# operators matching a class of characters rather than a single one
+_classes = (sre_constants.ANY, sre_constants.IN, sre_constants.NOT_LITERAL,
+            getattr(sre_constants, 'CATEGORY', None))
+
+
+def re2_available():
+    """Check if the linear-time RE2 engine is installed
+
+    :return: True if the ``re2`` module (``google-re2``) can be imported
+    :rtype:  bool
+    """
+    try:
+        import re2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_engine(name):
+    """Resolve an engine name to the engine used
+
+    :param name: one of :data:`ENGINES`
+    :type  name: str
+
+    :raises ValueError: unknown engine or RE2 requested but not installed
+
+    :return: ``re`` or ``re2``
+    :rtype:  str
+    """
+    if name not in ENGINES:
+        raise ValueError(f"unknown regex engine {name!r}")
+    if name == 'auto':
+        return 're2' if re2_available() else 're'
+    if name == 're2' and not re2_available():
+        raise ValueError('the re2 engine requires the google-re2 package')
+    return name
+
+
+def _compile_re2(source, flags):
+    """Compile a pattern with RE2
+
+    :return: compiled pattern or None if RE2 does not support it
+    :rtype:  class:`re2._Regexp`
+    """
+    import re2
+
+    # other flags have no RE2 counterpart
+    if flags & ~(re.IGNORECASE | re.UNICODE):
+        return None
+    options = re2.Options()
+    options.case_sensitive = not flags & re.IGNORECASE
+    options.log_errors = False
+    try:
+        return re2.compile(source, options)
+    except re2.error:
+        # backreferences, lookarounds and other backtracking features
+        return None
+
+
+def compile_pattern(source, flags, engine='re'):
+    """Compile a pattern with the given engine
+
+    Patterns the RE2 engine does not support are compiled by ``re``.
+    The compiled pattern provides ``search`` returning matches
+    with ``lastgroup`` in both cases.
+
+    :param source: pattern source
+    :type  source: str
+    :param flags: ``re`` flags
+    :type  flags: int
+    :param engine: ``re`` or ``re2``
+    :type  engine: str, optional
+
+    :raises re.error: invalid pattern
+
+    :return: compiled pattern
+    :rtype:  object
+    """
+    if engine == 're2' and isinstance(source, str):
+        compiled = _compile_re2(source, flags)
+        if compiled is not None:
+            return compiled
+    return re.compile(source, flags)
+
+
+def linear(source, flags):
+    """Check if a pattern runs in linear time under the RE2 engine
+
+    :param source: pattern source
+    :type  source: str
+    :param flags: ``re`` flags
+    :type  flags: int
+
+    :return: True if RE2 is installed and supports the pattern
+    :rtype:  bool
+    """
+    return re2_available() and _compile_re2(source, flags) is not None
+
+
+def _literal_runs(parsed):
+    """Get the runs of literal characters every match of a parsed pattern contains
+
+    :param parsed: parsed pattern
+    :type  parsed: class:`sre_parse.SubPattern`
+
+    :return: literal texts
+    :rtype:  list
+    """
+    runs, run = [], ''
+    for op, av in parsed:
+        if op == sre_constants.LITERAL:
+            run += chr(av)
+            continue
+        # a group matches exactly once unless it changes the flags
+        if op == sre_constants.SUBPATTERN and not av[1] and not av[2]:
+            inner = av[-1]
+            if all(item == sre_constants.LITERAL for item, value in inner):
+                run += ''.join(chr(value) for item, value in inner)
+                continue
+            runs += _literal_runs(inner)
+        runs.append(run)
+        run = ''
+    runs.append(run)
+    return [run for run in runs if run]
+
+
+def required_literal(source, flags=0):
+    """Find a text contained in every match of a pattern
+
+    Searching for the text is much cheaper than running the pattern,
+    texts without it cannot match. The longest run of literal characters
+    outside of alternatives, repetitions and assertions is taken.
+
+    :param source: pattern source
+    :type  source: str
+    :param flags: ``re`` flags
+    :type  flags: int, optional
+
+    :return: the text or None if the pattern has no literal part
+    :rtype:  str
+    """
+    if not isinstance(source, str):
+        return None
+    try:
+        parsed = sre_parse.parse(source, flags)
+    except re.error:
+        return None
+    return max(_literal_runs(parsed), key=len, default=None)
+
+
+def _first(parsed):
+    """Get the first item of a parsed pattern matching a single character
+
+    :return: ``LITERAL`` or character class item, None if unknown
+    :rtype:  tuple
+    """
+    for op, av in parsed:
+        if op == sre_constants.LITERAL or op in _classes:
+            return op, av
+        if op == sre_constants.SUBPATTERN:
+            return _first(av[-1])
+        if op in _repeats and av[0] > 0:
+            return _first(av[2])
+        return None
+    return None
+
+
+def _overlapping(branches, state):
+    """Check if alternatives may start matching the same character
+
+    Classes of characters are assumed to overlap each other.
+
+    :param branches: parsed alternatives
+    :type  branches: list
+    :param state: parser state of the pattern
+    :type  state: class:`sre_parse.State`
+
+    :return: True if two alternatives overlap
+    :rtype:  bool
+    """
+    firsts = [first for first in map(_first, branches) if first is not None]
+    literals = [chr(av) for op, av in firsts if op == sre_constants.LITERAL]
+    if state.flags & re.IGNORECASE:
+        literals = [char.lower() for char in literals]
+    classes = [(op, av) for op, av in firsts if op != sre_constants.LITERAL]
+    if len(classes) > 1 or len(literals) != len(set(literals)):
+        return True
+    if classes and literals:
+        # flags such as IGNORECASE apply through the state
+        rgx = sre_compile.compile(sre_parse.SubPattern(state, classes))
+        return any(rgx.match(char) for char in literals)
+    return False
+
+
+def _analyze(parsed, repeated=False):
+    """Walk a parsed pattern looking for exponential backtracking
+
+    :param parsed: parsed pattern
+    :type  parsed: class:`sre_parse.SubPattern`
+    :param repeated: whether the pattern is under an unbounded quantifier
+    :type  repeated: bool, optional
+
+    :return: reason the pattern is risky or None
+    :rtype:  str
+    """
+    for op, av in parsed:
+        reason = None
+        if op in _repeats:
+            lo, hi, item = av
+            unbounded = hi == sre_constants.MAXREPEAT
+            if unbounded and repeated:
+                return 'nested quantifiers'
+            reason = _analyze(item, repeated or unbounded)
+        elif op == sre_constants.SUBPATTERN:
+            reason = _analyze(av[-1], repeated)
+        elif op == sre_constants.BRANCH:
+            if repeated and _overlapping(av[1], parsed.state):
+                return 'overlapping alternatives under a quantifier'
+            for branch in av[1]:
+                reason = reason or _analyze(branch, repeated)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            reason = _analyze(av[1], repeated)
+        # atomic groups and possessive quantifiers never backtrack
+        if reason:
+            return reason
+    return None
+
+
+def analyze_pattern(source, flags=0):
+    """Look for constructs prone to catastrophic backtracking in ``re``
+
+    The analysis is a heuristic. It flags nested unbounded quantifiers
+    such as ``(a+)+`` and repeated alternatives which may match the same
+    text such as ``(.|\\s)*``, which take exponential time on texts
+    that almost match.
+
+    :param source: pattern source
+    :type  source: str
+    :param flags: ``re`` flags
+    :type  flags: int, optional
+
+    :return: reason the pattern is risky or None if it looks safe
+    :rtype:  str
+    """
+    try:
+        parsed = sre_parse.parse(source, flags)
+    except re.error:
+        return None
+    return _analyze(parsed)
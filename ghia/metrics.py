@@ -0,0 +1,246 @@
+"""Prometheus metrics of the webhook server
+
+A minimal implementation of counters, gauges and histograms rendered
+in the Prometheus text exposition format, cheap enough to stay enabled
+under full load: recording a value takes a dict lookup, a lock and
+an addition.
+"""
+
+import abc
+import bisect
+import threading
+
+
+#: content type of the rendered metrics
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+#: default histogram buckets in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    """Render a label set"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    """Render a sample value"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric(abc.ABC):
+    """Metric with children per label values
+
+    :param name: metric name
+    :type  name: str
+    :param documentation: help text
+    :type  documentation: str
+    :param labelnames: names of the labels
+    :type  labelnames: tuple, optional
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Create the value of a new label set"""
+
+    def labels(self, *values):
+        """Get the child of the given label values, created on first use"""
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _samples(self, values, child):
+        """Render the sample lines of a label set"""
+
+    def render(self):
+        """Render the metric in the text exposition format
+
+        :return: lines of the metric
+        :rtype:  list
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            children = sorted(self.children.items(), key=lambda item: tuple(map(str, item[0])))
+        for values, child in children:
+            lines += self._samples(values, child)
+        return lines
+
+
+class _Value:
+    """Single value of a counter or gauge"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        """Increase the counter without labels"""
+        self.labels().inc(amount)
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class Gauge(Metric):
+    """Value which may go up and down"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        """Set the gauge without labels"""
+        self.labels().set(value)
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class _Buckets:
+    """Observations of a histogram"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets
+
+    :param buckets: upper bounds of the buckets
+    :type  buckets: tuple, optional
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Buckets(self.bounds)
+
+    def observe(self, value):
+        """Record a value without labels"""
+        self.labels().observe(value)
+
+    def _samples(self, values, child):
+        with child.lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class WebhookMetrics:
+    """Metrics of the webhook server
+
+    The GitHub requests of a session are observed by adding
+    :meth:`observe_response` to its response hooks.
+    """
+
+    def __init__(self):
+        self.deliveries = Counter(
+            'ghia_webhook_deliveries_total', 'Webhook deliveries by event and action.',
+            ('event', 'action'))
+        self.redeliveries = Counter(
+            'ghia_webhook_redeliveries_total', 'Redelivered webhooks answered without processing.')
+        self.signature_failures = Counter(
+            'ghia_webhook_signature_failures_total', 'Webhooks rejected for an invalid signature.')
+        self.rule_evaluation = Histogram(
+            'ghia_rule_evaluation_seconds', 'Time of evaluating the rules of an issue.')
+        self.github_requests = Histogram(
+            'ghia_github_request_duration_seconds', 'Latency of GitHub API requests.',
+            ('method', 'status'))
+        self.rate_limit = Gauge(
+            'ghia_github_rate_limit_remaining', 'Remaining GitHub API requests of the rate limit.')
+        self.issue_updates = Counter(
+            'ghia_issue_updates_total', 'Processed issues by whether an update was sent.',
+            ('outcome',))
+        self.metrics = [self.deliveries, self.redeliveries, self.signature_failures,
+                        self.rule_evaluation, self.github_requests, self.rate_limit,
+                        self.issue_updates]
+
+    def observe_response(self, response, *args, **kwargs):
+        """Record a GitHub response (requests response hook)
+
+        :param response: the response
+        :type  response: class:`requests.Response`
+        """
+        self.github_requests.labels(response.request.method, response.status_code).observe(
+            response.elapsed.total_seconds())
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is not None and remaining.isdigit():
+            self.rate_limit.set(int(remaining))
+
+    def count_update(self, outcome):
+        """Record the outcome of processing an issue
+
+        :param outcome: ``sent``, ``skipped`` (nothing to update or dry run) or ``failed``
+        :type  outcome: str
+        """
+        self.issue_updates.labels(outcome).inc()
+
+    def render(self):
+        """Render all metrics in the text exposition format
+
+        :return: the exposition
+        :rtype:  str
+        """
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,195 @@
+"""Multi-process batch processing sharding issue pages across CPU cores
+"""
+
+import concurrent.futures
+import contextlib
+import io
+import click
+from .cli import finish_repos, listing_cache, process_page, repo_since
+from .github import fetch_issue_page, issues_url, page_number, page_url
+from .httpcache import HTTPCache
+from .profiling import RuleProfiler
+from .rules import ContentCache
+from .state import StateStore
+
+
+# resources of the current worker process, set up by _init_worker
+_worker = {}
+
+
+class OutputCapture(io.TextIOBase):
+    """Text stream recording what is written to it along with other streams
+
+    :param chunks: list receiving pairs of the stream flag and written text
+    :type  chunks: list
+    :param err: whether the stream stands for the standard error
+    :type  err: bool
+    """
+
+    encoding = 'utf-8'
+    errors = 'strict'
+
+    def __init__(self, chunks, err):
+        super().__init__()
+        self.chunks = chunks
+        self.err = err
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        # refusing bytes makes click treat the stream as a text stream
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        self.chunks.append((self.err, text))
+        return len(text)
+
+
+def _init_worker(config, state_path, cache_path, content_cache_path=None, profile=False):
+    """Set up a worker with its own compiled rules, session, state and caches
+
+    :param config: configuration without the compiled rules and content cache
+    :type  config: dict
+    :param state_path: path to the state file, only read by the workers
+    :type  state_path: str
+    :param cache_path: path to the cache file
+    :type  cache_path: str
+    :param content_cache_path: path to the content cache file
+    :type  content_cache_path: str, optional
+    :param profile: whether to profile the rules
+    :type  profile: bool, optional
+    """
+    import requests
+
+    if content_cache_path is not None:
+        config['content_cache'] = ContentCache(path=content_cache_path)
+    if profile:
+        config['profiler'] = RuleProfiler()
+    _worker['config'] = config
+    _worker['session'] = requests.Session()
+    _worker['state'] = StateStore(state_path, config) if state_path is not None else None
+    _worker['cache'] = HTTPCache(cache_path) if cache_path is not None else None
+
+
+def _process_page(reposlug, since, page):
+    """Fetch and process a page of issues of a repo in a worker
+
+    Output is captured to be printed by the parent in order.
+    Processed issues are handed over to the parent, which alone writes
+    the state file.
+
+    :param reposlug: owner/repository GitHub reposlug
+    :type  reposlug: str
+    :param since: only list issues updated at or after this ISO 8601 timestamp
+    :type  since: str
+    :param page: page number
+    :type  page: int
+
+    :return: captured output, number of the last page of the repo, exit code,
+             rule profiling data of the page if profiling, records
+             of the processed issues (see :meth:`ghia.state.StateStore.take`)
+             and whether all issues were processed successfully
+    :rtype:  tuple
+    """
+    config, state = _worker['config'], _worker['state']
+    chunks, last, code, ok = [], page, 0, True
+    url = issues_url(reposlug, since)
+    if page > 1:
+        url = page_url(url, page)
+
+    # styles are kept, the parent strips them if its output is not a terminal
+    with click.Context(click.Command('ghia'), color=True), \
+            contextlib.redirect_stdout(OutputCapture(chunks, False)), \
+            contextlib.redirect_stderr(OutputCapture(chunks, True)):
+        try:
+            issues, links = fetch_issue_page(_worker['session'], reposlug, config['github']['token'],
+                                             url, listing_cache(config, since, _worker['cache']))
+            if 'last' in links:
+                last = page_number(links['last']['url'])
+            ok = process_page(_worker['session'], config, reposlug, issues, state)
+            if 'content_cache' in config:
+                config['content_cache'].save()
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+    profile = None
+    if 'profiler' in config:
+        profile = config['profiler'].export()
+        config['profiler'].reset()
+    recorded = state.take() if state is not None else []
+    return chunks, last, code, profile, recorded, ok
+
+
+def batch_process_sharded(config, reposlugs, workers, state=None, state_path=None,
+                          cache_path=None, executor_class=concurrent.futures.ProcessPoolExecutor):
+    """Process all issues in given repos by a pool of worker processes
+
+    The first pages of all repos are requested at once, the remaining
+    pages of a repo as soon as its first page tells how many there are.
+    Output is printed per repo in the given order.
+
+    :param config: full configuration
+    :type  config: dict
+    :param reposlugs: owner/repository GitHub reposlugs
+    :type  reposlugs: tuple
+    :param workers: number of worker processes
+    :type  workers: int
+    :param state: state of previous runs, unchanged issues are skipped
+    :type  state: class:`ghia.state.StateStore`, optional
+    :param state_path: path to the state file opened by the workers
+    :type  state_path: str, optional
+    :param cache_path: path to the cache file opened by the workers
+    :type  cache_path: str, optional
+    :param executor_class: executor running the workers
+    :type  executor_class: class:`concurrent.futures.Executor`, optional
+    """
+    # the ruleset is compiled again in the workers on first use, caches are opened there
+    content_cache = config.get('content_cache')
+    shared = {key: value for key, value in config.items()
+              if key not in ('ruleset', 'content_cache', 'profiler')}
+    content_cache_path = content_cache.path if content_cache is not None else None
+    profiler = config.get('profiler')
+    with executor_class(workers, initializer=_init_worker,
+                        initargs=(shared, state_path, cache_path, content_cache_path,
+                                  profiler is not None)) as executor:
+        since = [repo_since(config, reposlug, state) for reposlug in reposlugs]
+        pages = [[executor.submit(_process_page, reposlug, since[i], 1)]
+                 for i, reposlug in enumerate(reposlugs)]
+        first = {futures[0]: i for i, futures in enumerate(pages)}
+        pending = set(first)
+        expanded = set()
+        printed = 0
+
+        while printed < len(reposlugs):
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future not in first:
+                    continue
+                i = first[future]
+                _, last, code, _, _, _ = future.result()
+                if not code:
+                    for page in range(2, last + 1):
+                        pages[i].append(executor.submit(_process_page, reposlugs[i], since[i], page))
+                    pending.update(pages[i][1:])
+                expanded.add(i)
+
+            # print repos in order once all their pages are done
+            while printed in expanded and all(future.done() for future in pages[printed]):
+                failed = set()
+                for future in pages[printed]:
+                    chunks, _, code, profile, recorded, ok = future.result()
+                    if not ok:
+                        failed.add(reposlugs[printed])
+                    for err, text in chunks:
+                        click.echo(text, nl=False, err=err)
+                    if profile is not None:
+                        profiler.merge(profile)
+                    if state is not None:
+                        state.add(recorded)
+                    if code:
+                        for other in pending:
+                            other.cancel()
+                        exit(code)
+                if state is not None:
+                    finish_repos(state, [reposlugs[printed]], failed)
+                printed += 1
@@ -0,0 +1,178 @@
+"""Per-pattern profiling of rule evaluation
+"""
+
+import heapq
+import json
+import threading
+import time
+from .matching import compile_pattern
+from .rules import FIELDS, issue_fields
+
+
+class RuleProfiler:
+    """Evaluates every pattern on its own, recording its cost and hits
+
+    The compiled rule engine skips the patterns of users which already
+    matched and texts which cannot match, so profiled issues are matched
+    pattern by pattern, without the engine and its caches. All patterns
+    of a user are evaluated even after one of them matched, so dead
+    patterns show up with no hits.
+
+    :param slowest: number of the slowest issues to remember
+    :type  slowest: int, optional
+    """
+
+    def __init__(self, slowest=10):
+        self.slowest_limit = slowest
+        self.lock = threading.Lock()
+        self.compiled = {}
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self.lock:
+            # (user, subject, pattern) -> [evaluations, seconds, hits, {field: hits}]
+            self.patterns = {}
+            self.issues = 0
+            self.seconds = 0.0
+            self.slowest = []
+
+    def _compile(self, ruleset, rgx):
+        """Compile a pattern with the engine of the rule set, once"""
+        key = (rgx.pattern, rgx.flags, ruleset['engine'])
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = self.compiled[key] = compile_pattern(rgx.pattern, rgx.flags,
+                                                            ruleset['engine'])
+        return compiled
+
+    def match(self, ruleset, issue):
+        """Find all users matching an issue, profiling every pattern
+
+        :param ruleset: compiled rule set (see :func:`ghia.rules.compile_rules`)
+        :type  ruleset: dict
+        :param issue: issue to match against
+        :type  issue: dict
+
+        :return: matching users
+        :rtype:  set
+        """
+        texts = issue_fields(issue)
+        matched = set()
+        records = []
+        started = time.perf_counter()
+        for user, rules in ruleset['patterns'].items():
+            for item, rgx in rules:
+                compiled = self._compile(ruleset, rgx)
+                fields = FIELDS if item == 'any' else (item,)
+                start = time.perf_counter()
+                hits = [field for field in fields if field in texts
+                        and any(compiled.search(text) for text in texts[field])]
+                records.append(((user, item, rgx.pattern), time.perf_counter() - start, hits))
+                if hits:
+                    matched.add(user)
+        elapsed = time.perf_counter() - started
+
+        url = issue.get('html_url') or issue.get('url')
+        self.merge({
+            'patterns': {key: [1, seconds, int(bool(hits)), {field: 1 for field in hits}]
+                         for key, seconds, hits in records},
+            'issues': 1,
+            'seconds': elapsed,
+            'slowest': [(elapsed, url or '', len(issue.get('body') or ''))],
+        })
+        return matched
+
+    def export(self):
+        """Get the recorded data in a picklable form accepted by :meth:`merge`
+
+        :return: recorded data
+        :rtype:  dict
+        """
+        with self.lock:
+            return {
+                'patterns': {key: [entry[0], entry[1], entry[2], dict(entry[3])]
+                             for key, entry in self.patterns.items()},
+                'issues': self.issues,
+                'seconds': self.seconds,
+                'slowest': list(self.slowest),
+            }
+
+    def merge(self, data):
+        """Add data recorded elsewhere, e.g. by another process
+
+        :param data: data returned by :meth:`export`
+        :type  data: dict
+        """
+        with self.lock:
+            for key, (evaluations, seconds, hits, fields) in data['patterns'].items():
+                entry = self.patterns.setdefault(key, [0, 0.0, 0, {}])
+                entry[0] += evaluations
+                entry[1] += seconds
+                entry[2] += hits
+                for field, count in fields.items():
+                    entry[3][field] = entry[3].get(field, 0) + count
+            self.issues += data['issues']
+            self.seconds += data['seconds']
+            for item in data['slowest']:
+                if len(self.slowest) < self.slowest_limit:
+                    heapq.heappush(self.slowest, tuple(item))
+                else:
+                    heapq.heappushpop(self.slowest, tuple(item))
+
+    def report(self):
+        """Summarize the recorded data
+
+        Patterns are sorted by their cumulative time, most expensive first.
+
+        :return: totals, per-pattern statistics and the slowest issues
+        :rtype:  dict
+        """
+        with self.lock:
+            patterns = [{
+                'user': user,
+                'subject': item,
+                'pattern': pattern,
+                'evaluations': evaluations,
+                'seconds': seconds,
+                'mean_us': seconds / evaluations * 1e6 if evaluations else 0.0,
+                'hits': hits,
+                'hit_rate': hits / evaluations if evaluations else 0.0,
+                'fields': dict(fields),
+            } for (user, item, pattern), (evaluations, seconds, hits, fields)
+                in self.patterns.items()]
+            slowest = [{'url': url, 'body_size': size, 'seconds': seconds}
+                       for seconds, url, size in sorted(self.slowest, reverse=True)]
+            issues, total = self.issues, self.seconds
+        patterns.sort(key=lambda row: row['seconds'], reverse=True)
+        return {'issues': issues, 'seconds': total, 'patterns': patterns,
+                'slowest_issues': slowest}
+
+
+def format_report(report, fmt='table'):
+    """Render a profiling report
+
+    :param report: report produced by :meth:`RuleProfiler.report`
+    :type  report: dict
+    :param fmt: ``table`` or ``json``
+    :type  fmt: str, optional
+
+    :return: the rendered report
+    :rtype:  str
+    """
+    if fmt == 'json':
+        return json.dumps(report, indent=2) + '\n'
+
+    lines = [f"{report['issues']} issues matched in {report['seconds']:.3f} s", '',
+             f"{'seconds':>9} {'mean us':>9} {'evals':>7} {'hits':>7} {'rate':>6}  "
+             f"{'fields':<18} {'user':<16} rule"]
+    for row in report['patterns']:
+        fields = ','.join(f"{field}={count}" for field, count in sorted(row['fields'].items()))
+        lines.append(f"{row['seconds']:9.4f} {row['mean_us']:9.1f} {row['evaluations']:7} "
+                     f"{row['hits']:7} {row['hit_rate']:6.1%}  {fields or '-':<18} "
+                     f"{row['user']:<16} {row['subject']}:{row['pattern']}")
+    if report['slowest_issues']:
+        lines += ['', 'Slowest issues:', f"{'seconds':>9} {'body size':>10} issue"]
+        for issue in report['slowest_issues']:
+            lines.append(f"{issue['seconds']:9.4f} {issue['body_size']:10} {issue['url']}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,170 @@
+"""Rate-limit aware request scheduling for the asynchronous mode
+"""
+
+import asyncio
+import contextlib
+import email.utils
+import random
+import time
+
+
+#: statuses worth retrying, 403 only when caused by rate limiting
+RETRY_STATUSES = (403, 429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value, now=None):
+    """Parse a ``Retry-After`` header into seconds to wait
+
+    :param value: header value, delay in seconds or an HTTP date
+    :type  value: str
+    :param now: current UNIX time, defaults to :func:`time.time`
+    :type  now: float, optional
+
+    :return: seconds to wait or None if unparsable
+    :rtype:  float
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, date.timestamp() - now)
+
+
+class RateLimitedSession:
+    """Wrapper of :class:`aiohttp.ClientSession` bounding concurrency
+
+    Requests wait for a free slot, pace themselves when the GitHub
+    rate limit runs low and are retried with exponential backoff on
+    rate limiting and server errors.
+    The wrapper exposes ``get``, ``patch`` and ``post`` like the wrapped session.
+
+    :param session: the wrapped session
+    :type  session: class:`aiohttp.ClientSession`
+    :param max_concurrency: maximum number of requests in flight
+    :type  max_concurrency: int, optional
+    :param retries: maximum number of retries of a single request
+    :type  retries: int, optional
+    :param backoff: initial backoff delay in seconds
+    :type  backoff: float, optional
+    :param reserve: remaining rate limit below which requests are paced
+    :type  reserve: int, optional
+    """
+
+    def __init__(self, session, max_concurrency=10, retries=5, backoff=1.0, reserve=50):
+        self.session = session
+        self.retries = retries
+        self.backoff = backoff
+        self.reserve = reserve
+        self.remaining = None
+        self.reset = None
+        self.paused_until = 0.0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    def get(self, url, **kwargs):
+        """Send a throttled GET request, see :meth:`request`"""
+        return self.request('GET', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        """Send a throttled PATCH request, see :meth:`request`"""
+        return self.request('PATCH', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a throttled POST request, see :meth:`request`"""
+        return self.request('POST', url, **kwargs)
+
+    def update(self, status, headers):
+        """Update the rate limit state from response headers
+
+        :param status: HTTP status of the response
+        :type  status: int
+        :param headers: response headers
+        :type  headers: class:`multidict.CIMultiDictProxy`
+
+        :return: seconds the server asked to wait or None
+        :rtype:  float
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is not None and remaining.isdigit():
+            self.remaining = int(remaining)
+        if reset is not None and reset.isdigit():
+            self.reset = int(reset)
+
+        delay = parse_retry_after(headers.get('Retry-After'))
+        if delay is None and status in (403, 429) and self.remaining == 0 and self.reset:
+            delay = max(0.0, self.reset - time.time())
+        if delay is not None:
+            self.paused_until = max(self.paused_until, time.time() + delay)
+        return delay
+
+    def delay(self):
+        """Compute how long the next request should wait
+
+        Past the reserve the remaining requests are spread evenly
+        until the rate limit resets.
+
+        :return: seconds to wait
+        :rtype:  float
+        """
+        now = time.time()
+        delay = max(0.0, self.paused_until - now)
+        if self.remaining is not None and self.reset is not None \
+                and self.remaining < self.reserve and self.reset > now:
+            delay = max(delay, (self.reset - now) / max(self.remaining, 1))
+        return delay
+
+    def retryable(self, status, server_delay):
+        """Check if a response status calls for a retry
+
+        :param status: HTTP status of the response
+        :type  status: int
+        :param server_delay: delay requested by the server, if any
+        :type  server_delay: float
+
+        :return: True if the request should be retried
+        :rtype:  bool
+        """
+        if status not in RETRY_STATUSES:
+            return False
+        # plain 403 means forbidden, only retry it when rate limited
+        return status != 403 or server_delay is not None
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, url, **kwargs):
+        """Send a throttled request with retries
+
+        Used as an asynchronous context manager yielding the final response.
+
+        :param method: HTTP method
+        :type  method: str
+        :param url: request URL
+        :type  url: str
+        :param kwargs: arguments passed to :meth:`aiohttp.ClientSession.request`
+        :type  kwargs: dict
+        """
+        async with self._slots:
+            attempt = 0
+            while True:
+                delay = self.delay()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                r = await self.session.request(method, url, **kwargs)
+                server_delay = self.update(r.status, r.headers)
+                if attempt >= self.retries or not self.retryable(r.status, server_delay):
+                    break
+                r.release()
+                if server_delay is None:
+                    # exponential backoff with jitter
+                    await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()) / 2)
+                attempt += 1
+            try:
+                yield r
+            finally:
+                r.release()
@@ -0,0 +1,141 @@
+"""Configuration hot reload for the web app
+"""
+
+import os
+import threading
+import click
+from .helpers import load_config_multiple
+from .github import get_gh_login
+
+
+class ConfigManager:
+    """Holder of the current configuration, reloading it on file changes
+
+    A background thread polls the modification times of the configuration
+    files. A changed configuration is parsed and its rules compiled off the
+    request path, then swapped in at once. The GitHub login is only
+    resolved again when the token changes.
+
+    :param paths: colon separated paths to the configuration files
+    :type  paths: str
+    :param session: session used to resolve the GitHub login
+    :type  session: class:`requests.sessions.Session`
+    :param settings: extra settings added to every configuration (strategy, dry run)
+    :type  settings: dict
+    :param on_reload: callback receiving every newly loaded configuration
+    :type  on_reload: callable, optional
+    """
+
+    def __init__(self, paths, session, settings, on_reload=None):
+        self.paths = paths
+        self.session = session
+        self.settings = settings
+        self.on_reload = on_reload
+        self.config = None
+        self.reloads = 0
+        self.failures = 0
+        self.stamps = self._stamps()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, session, on_reload=None):
+        """Create a manager configured by the environment
+
+        The configuration files are given by ``GHIA_CONFIG``,
+        the strategy by ``GHIA_STRATEGY`` and dry run by ``GHIA_DRYRUN``.
+
+        :param session: session used to resolve the GitHub login
+        :type  session: class:`requests.sessions.Session`
+        :param on_reload: callback receiving every newly loaded configuration
+        :type  on_reload: callable, optional
+
+        :return: the configuration manager
+        :rtype:  class:`ghia.reload.ConfigManager`
+        """
+        dry_run = 'GHIA_DRYRUN' in os.environ
+        env_strategy = os.environ.get('GHIA_STRATEGY')
+        strategy = env_strategy if env_strategy in ['set', 'change'] else 'append'
+        settings = {'strategy': strategy, 'dry_run': dry_run}
+        return cls(os.environ.get('GHIA_CONFIG'), session, settings, on_reload)
+
+    def _stamps(self):
+        """Get modification stamps of the configuration files
+
+        :return: modification time and size of every file, None if missing
+        :rtype:  list
+        """
+        stamps = []
+        for path in (self.paths or '').split(':'):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamps.append(None)
+        return stamps
+
+    def load(self):
+        """Load and activate the configuration
+
+        :return: False if the configuration is invalid, True otherwise
+        :rtype:  bool
+        """
+        config = load_config_multiple(self.paths)
+        if not config:
+            click.echo("Bad config", err=True)
+            return False
+
+        token = config['github']['token']
+        if self.config is not None and self.config['github']['token'] == token:
+            login = self.config['login']
+        else:
+            try:
+                login = get_gh_login(self.session, token)
+            except SystemExit:
+                # get_gh_login reported the failure, keep the old config
+                login = None
+        if not login:
+            click.echo("Invalid token", err=True)
+            return False
+
+        config['login'] = login
+        config.update(self.settings)
+        self.config = config
+        if self.on_reload is not None:
+            self.on_reload(config)
+        return True
+
+    def check(self):
+        """Reload the configuration if any of its files changed
+
+        :return: True if a new configuration was activated
+        :rtype:  bool
+        """
+        stamps = self._stamps()
+        if stamps == self.stamps:
+            return False
+        self.stamps = stamps
+        if self.load():
+            self.reloads += 1
+            return True
+        self.failures += 1
+        return False
+
+    def watch(self, interval):
+        """Start polling the configuration files in a background thread
+
+        :param interval: polling interval in seconds
+        :type  interval: float
+        """
+        def poll():
+            while not self._stop.wait(interval):
+                self.check()
+
+        self._thread = threading.Thread(target=poll, name='ghia-config', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling the configuration files"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,682 @@
+"""Compiled rule engine matching issues against all users field by field
+"""
+
+import collections
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from .matching import compile_pattern, required_literal
+
+
+#: issue fields rules may target, ``any`` targets all of them
+FIELDS = ('title', 'text', 'label')
+
+# characters with a special meaning in patterns, anything else matches itself
+_rgx_special = frozenset('.^$*+?{}[]|()')
+# persisted match results are saved and pruned every this many new results
+_save_every = 100
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS matches (
+    digest TEXT PRIMARY KEY,
+    results TEXT NOT NULL,
+    used REAL NOT NULL
+);
+'''
+
+
+class BudgetExceeded(Exception):
+    """Matching an issue ran out of its time budget
+
+    The issue was evaluated only partially, its results must be neither
+    cached nor acted upon.
+    """
+
+
+def _literal(source):
+    """Get the text a pattern matches literally
+
+    :param source: pattern source
+    :type  source: str
+
+    :return: the matched text or None if the pattern is not a plain literal
+    :rtype:  str
+    """
+    chars = []
+    escaped = False
+    for char in source:
+        if escaped:
+            # escaped letters and digits are classes or references
+            if char.isalnum() or not char.isascii():
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in _rgx_special:
+            return None
+        else:
+            chars.append(char)
+    return None if escaped else ''.join(chars)
+
+
+def _split_alternatives(source):
+    """Split a pattern source on its top level ``|``
+
+    :param source: pattern source
+    :type  source: str
+
+    :return: sources of the alternatives
+    :rtype:  list
+    """
+    parts, start, escaped = [], 0, False
+    for i, char in enumerate(source):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '|':
+            parts.append(source[start:i])
+            start = i + 1
+    parts.append(source[start:])
+    return parts
+
+
+def _fast_rule(rgx):
+    """Find a way to evaluate a pattern without regular expressions
+
+    Plain literals become substring checks and anchored alternations
+    of literals (``^(network|networking)$``) become set lookups.
+    Case insensitive patterns take part only if they are ASCII,
+    where lowering texts is exactly what the ``re`` module does.
+
+    :param rgx: compiled pattern
+    :type  rgx: class:`re.Pattern`
+
+    :return: kind (``literal`` or ``exact``), texts to look for and
+             whether case is ignored, None if a regex is needed
+    :rtype:  tuple
+    """
+    if not isinstance(rgx.pattern, str) or rgx.flags & ~(re.IGNORECASE | re.UNICODE):
+        return None
+    fold = bool(rgx.flags & re.IGNORECASE)
+    source = rgx.pattern
+
+    kind, alternatives = 'literal', [source]
+    if source.startswith('^') and source.endswith('$') and _literal(source[-2:]) is None:
+        inner = source[1:-1]
+        if inner.startswith('(?:') and inner.endswith(')'):
+            inner = inner[3:-1]
+        elif inner.startswith('(') and inner.endswith(')') and not inner.startswith('(?'):
+            inner = inner[1:-1]
+        elif '|' in inner:
+            # ^a|b$ is ^a or b$, not an exact match
+            return None
+        kind, alternatives = 'exact', _split_alternatives(inner)
+
+    texts = [_literal(alternative) for alternative in alternatives]
+    if None in texts or (fold and not all(text.isascii() for text in texts)):
+        return None
+    if fold:
+        texts = [text.lower() for text in texts]
+    return kind, texts, fold
+
+
+def _prefilter(rgx):
+    """Find a text a pattern cannot match without
+
+    Case insensitive patterns are prefiltered only with ASCII texts,
+    see :func:`_fast_rule`.
+
+    :param rgx: compiled pattern
+    :type  rgx: class:`re.Pattern`
+
+    :return: the text (lowered if case is ignored) or None and whether case is ignored
+    :rtype:  tuple
+    """
+    fold = bool(rgx.flags & re.IGNORECASE)
+    literal = None
+    if not rgx.flags & re.LOCALE:
+        literal = required_literal(rgx.pattern, rgx.flags)
+    if literal is not None and fold:
+        literal = literal.lower() if literal.isascii() else None
+    return literal, fold
+
+
+def compile_rules(patterns, engine='re', budget=0):
+    """Compile user patterns into a rule set
+
+    Patterns are grouped by the field they target. Plain literals and
+    exact matches do not need a regex at all and are checked directly
+    (see :func:`_fast_rule`). Other patterns are searched one by one,
+    each keeping the optimizations ``re`` does for a single pattern,
+    and only if the text contains their literal part
+    (see :func:`ghia.matching.required_literal`).
+
+    :param patterns: user patterns as produced by
+                     :func:`ghia.helpers.load_config_rules`
+    :type  patterns: dict
+    :param engine: regex engine, ``re`` or ``re2`` (see :mod:`ghia.matching`)
+    :type  engine: str, optional
+    :param budget: seconds of regex searches allowed per issue, checked between searches,
+                   0 for no limit
+    :type  budget: float, optional
+
+    :return: compiled rule set
+    :rtype:  dict
+    """
+    users = list(patterns)
+    fields = {field: {'regexes': [], 'literals': [], 'exact': {}, 'exact_rules': []}
+              for field in FIELDS}
+
+    for uidx, user in enumerate(users):
+        for item, rgx in patterns[user]:
+            targets = FIELDS if item == 'any' else (item,)
+            for field in targets:
+                if field not in fields:
+                    continue
+                fast = _fast_rule(rgx)
+                if fast is not None:
+                    kind, texts, fold = fast
+                    if kind == 'literal':
+                        fields[field]['literals'].append((uidx, texts[0], fold, rgx))
+                        continue
+                    for text in texts:
+                        fields[field]['exact'].setdefault((text, fold), set()).add(uidx)
+                    if fold:
+                        fields[field]['exact_rules'].append((uidx, rgx))
+                    continue
+                fields[field]['regexes'].append(
+                    (uidx, compile_pattern(rgx.pattern, rgx.flags, engine)) + _prefilter(rgx))
+
+    return {'patterns': patterns, 'users': users, 'fields': fields, 'engine': engine,
+            'budget': budget, 'exceeded': 0, 'digest': rules_digest(patterns, engine)}
+
+
+def rules_digest(patterns, engine='re'):
+    """Compute a digest identifying a set of user patterns
+
+    :param patterns: user patterns
+    :type  patterns: dict
+    :param engine: regex engine running the patterns
+    :type  engine: str, optional
+
+    :return: hexadecimal SHA-1 digest
+    :rtype:  str
+    """
+    h = hashlib.sha1()
+    if engine != 're':
+        # engines differ in details such as the meaning of \w
+        h.update(f"engine\0{engine}\n".encode('utf8'))
+    for user in sorted(patterns):
+        for item, rgx in patterns[user]:
+            h.update(f"{user}\0{item}\0{rgx.flags}\0{rgx.pattern}\n".encode('utf8'))
+    return h.hexdigest()
+
+
+def get_ruleset(config):
+    """Get the compiled rule set of a configuration
+
+    The rule set is compiled on first use and stored in the configuration.
+
+    :param config: app configuration
+    :type  config: dict
+
+    :return: compiled rule set
+    :rtype:  dict
+    """
+    ruleset = config.get('ruleset')
+    if ruleset is None or ruleset['patterns'] is not config['patterns']:
+        matching = config.get('matching') or {}
+        ruleset = config['ruleset'] = compile_rules(
+            config['patterns'], matching.get('engine', 're'), matching.get('budget', 0))
+    return ruleset
+
+
+def issue_fields(issue):
+    """Extract the matchable texts of an issue
+
+    :param issue: issue to extract texts from
+    :type  issue: dict
+
+    :return: texts of every field
+    :rtype:  dict
+    """
+    return {
+        'title': [issue['title'] or ''],
+        'text': [issue['body'] or ''],
+        'label': [label['name'] for label in issue['labels']],
+    }
+
+
+def _match_fast(compiled, texts, matched):
+    """Check texts against literal and exact rules, adding matching users
+
+    Case insensitive rules fall back to their regex for non-ASCII texts.
+
+    :param compiled: compiled rules of a field
+    :type  compiled: dict
+    :param texts: texts to check
+    :type  texts: list
+    :param matched: indices of already matched users, updated in place
+    :type  matched: set
+    """
+    exact, literals = compiled['exact'], compiled['literals']
+    if not exact and not literals:
+        return
+    for text in texts:
+        ascii = text.isascii()
+        lowered = text.lower() if ascii else None
+        if exact:
+            # $ also matches before a trailing newline
+            whole = text[:-1] if text.endswith('\n') else text
+            matched |= exact.get((whole, False), set())
+            if ascii:
+                matched |= exact.get((whole.lower(), True), set())
+            else:
+                matched.update(uidx for uidx, rgx in compiled['exact_rules']
+                               if uidx not in matched and rgx.search(text))
+        for uidx, literal, fold, rgx in literals:
+            if uidx in matched:
+                continue
+            if not fold:
+                hit = literal in text
+            elif ascii:
+                hit = literal in lowered
+            else:
+                hit = rgx.search(text) is not None
+            if hit:
+                matched.add(uidx)
+
+
+def _match_field(compiled, texts, matched, deadline=None):
+    """Find users whose rules of a field match its texts
+
+    The literal and exact rules are checked first, regex searches
+    stop as soon as the deadline passes.
+
+    :param compiled: compiled rules of the field
+    :type  compiled: dict
+    :param texts: texts of the field
+    :type  texts: list
+    :param matched: indices of already matched users, updated in place
+    :type  matched: set
+    :param deadline: :func:`time.perf_counter` value to stop searching at
+    :type  deadline: float, optional
+
+    :return: False if the deadline passed, True otherwise
+    :rtype:  bool
+    """
+    _match_fast(compiled, texts, matched)
+    if not compiled['regexes']:
+        return True
+    # lowered texts for the case insensitive prefilter, None where it does not apply
+    lowered = [text.lower() if text.isascii() else None for text in texts]
+    for uidx, rgx, literal, fold in compiled['regexes']:
+        if uidx in matched:
+            continue
+        for text, lower in zip(texts, lowered):
+            if literal is not None:
+                if not fold:
+                    if literal not in text:
+                        continue
+                elif lower is not None and literal not in lower:
+                    continue
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            if rgx.search(text):
+                matched.add(uidx)
+                break
+    return True
+
+
+def _deadline(ruleset):
+    """Get the deadline of matching an issue starting now
+
+    :return: :func:`time.perf_counter` value or None without a time budget
+    :rtype:  float
+    """
+    return time.perf_counter() + ruleset['budget'] if ruleset['budget'] else None
+
+
+def _over_budget(ruleset, issue):
+    """Count an issue whose evaluation ran out of time
+
+    :raises BudgetExceeded: always
+    """
+    ruleset['exceeded'] += 1
+    raise BudgetExceeded(f"matching {issue.get('html_url') or issue.get('url') or 'issue'} "
+                         f"took over {ruleset['budget']} s")
+
+
+def match_users(ruleset, issue):
+    """Find all users whose patterns match the given issue
+
+    :param ruleset: compiled rule set (see :func:`compile_rules`)
+    :type  ruleset: dict
+    :param issue: issue to match against
+    :type  issue: dict
+
+    :raises BudgetExceeded: the time budget of the rule set ran out
+
+    :return: matching users
+    :rtype:  set
+    """
+    matched = set()
+    texts = issue_fields(issue)
+    deadline = _deadline(ruleset)
+
+    for field in FIELDS:
+        if not _match_field(ruleset['fields'][field], texts[field], matched, deadline):
+            _over_budget(ruleset, issue)
+
+    return {ruleset['users'][uidx] for uidx in matched}
+
+
+def match_fields(ruleset, issue, fields=FIELDS):
+    """Find the users matching each of the given fields of an issue
+
+    :param ruleset: compiled rule set (see :func:`compile_rules`)
+    :type  ruleset: dict
+    :param issue: issue to match against
+    :type  issue: dict
+    :param fields: fields to evaluate
+    :type  fields: iterable, optional
+
+    :raises BudgetExceeded: the time budget of the rule set ran out
+
+    :return: fields mapped to sets of matching users
+    :rtype:  dict
+    """
+    texts = issue_fields(issue)
+    deadline = _deadline(ruleset)
+    result = {}
+
+    for field in fields:
+        matched = set()
+        if not _match_field(ruleset['fields'][field], texts[field], matched, deadline):
+            _over_budget(ruleset, issue)
+        result[field] = {ruleset['users'][uidx] for uidx in matched}
+    return result
+
+
+def field_digests(issue):
+    """Compute digests of the matchable content of every field of an issue
+
+    :param issue: issue to digest
+    :type  issue: dict
+
+    :return: fields mapped to hexadecimal SHA-1 digests
+    :rtype:  dict
+    """
+    texts = issue_fields(issue)
+    texts['label'] = sorted(texts['label'])
+    return {field: hashlib.sha1(json.dumps(texts[field]).encode('utf8')).hexdigest()
+            for field in FIELDS}
+
+
+def content_digest(ruleset, issue):
+    """Compute a digest of the matchable content of an issue and the rules
+
+    Label order does not matter to the rules so labels are sorted.
+
+    :param ruleset: compiled rule set (see :func:`compile_rules`)
+    :type  ruleset: dict
+    :param issue: issue to digest
+    :type  issue: dict
+
+    :return: hexadecimal SHA-1 digest
+    :rtype:  str
+    """
+    texts = issue_fields(issue)
+    data = [ruleset['digest'], texts['title'], texts['text'], sorted(texts['label'])]
+    return hashlib.sha1(json.dumps(data).encode('utf8')).hexdigest()
+
+
+class ContentCache:
+    """Bounded LRU cache of per-field match results keyed by issue content
+
+    Issues whose title, body and labels were already evaluated with the same
+    rules cost a single lookup. Optionally the results are kept in a SQLite
+    file to be reused by later runs. New results are written in batches,
+    each in one short transaction, so several processes may share the file.
+
+    :param maxsize: maximum number of remembered results
+    :type  maxsize: int, optional
+    :param path: path to the SQLite database, created if missing
+    :type  path: str, optional
+    """
+
+    def __init__(self, maxsize=10000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # digest -> row waiting to be written
+        self.unsaved = {}
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.executescript(_schema)
+            rows = self.db.execute('SELECT digest, results FROM matches ORDER BY used DESC LIMIT ?',
+                                   (maxsize,)).fetchall()
+            for digest, results in reversed(rows):
+                self.entries[digest] = {field: set(users)
+                                        for field, users in json.loads(results).items()}
+
+    def get(self, digest):
+        """Look up per-field results of a content digest
+
+        :param digest: digest computed by :func:`content_digest`
+        :type  digest: str
+
+        :return: fields mapped to sets of matching users, None if unknown
+        :rtype:  dict
+        """
+        with self.lock:
+            results = self.entries.get(digest)
+            if results is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(digest)
+            return results
+
+    def put(self, digest, results):
+        """Remember per-field results of a content digest
+
+        :param digest: digest computed by :func:`content_digest`
+        :type  digest: str
+        :param results: fields mapped to sets of matching users
+        :type  results: dict
+        """
+        with self.lock:
+            self.entries[digest] = results
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            if self.db is not None:
+                data = json.dumps({field: sorted(users) for field, users in results.items()})
+                self.unsaved[digest] = (digest, data, time.time())
+                if len(self.unsaved) >= _save_every:
+                    self._save()
+
+    def _save(self):
+        """Save new results and forget the least recently stored ones, lock must be held
+
+        If another process holds the database for too long,
+        the results are kept to be saved next time.
+        """
+        try:
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO matches VALUES (?, ?, ?)',
+                                    self.unsaved.values())
+                self.db.execute('DELETE FROM matches WHERE digest NOT IN '
+                                '(SELECT digest FROM matches ORDER BY used DESC LIMIT ?)',
+                                (self.maxsize,))
+        except sqlite3.OperationalError:
+            return
+        self.unsaved = {}
+
+    def save(self):
+        """Save new results to the database if any"""
+        with self.lock:
+            if self.db is not None and self.unsaved:
+                self._save()
+
+    def match_fields(self, ruleset, issue):
+        """Find the users matching each field of an issue, evaluating unknown content only
+
+        :param ruleset: compiled rule set (see :func:`compile_rules`)
+        :type  ruleset: dict
+        :param issue: issue to match against
+        :type  issue: dict
+
+        :return: fields mapped to sets of matching users
+        :rtype:  dict
+        """
+        digest = content_digest(ruleset, issue)
+        results = self.get(digest)
+        if results is None:
+            results = match_fields(ruleset, issue)
+            self.put(digest, results)
+        return results
+
+    def match(self, ruleset, issue):
+        """Find all users matching an issue, evaluating unknown content only
+
+        :param ruleset: compiled rule set (see :func:`compile_rules`)
+        :type  ruleset: dict
+        :param issue: issue to match against
+        :type  issue: dict
+
+        :return: matching users
+        :rtype:  set
+        """
+        return set().union(*self.match_fields(ruleset, issue).values())
+
+    def stats(self):
+        """Get cache statistics
+
+        :return: remembered results, hits and misses
+        :rtype:  dict
+        """
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        """Save the results and close the database"""
+        with self.lock:
+            if self.db is not None:
+                if self.unsaved:
+                    self._save()
+                self.db.close()
+                self.db = None
+
+
+class MatchCache:
+    """Bounded cache of per-field match results of issues
+
+    Results of every field are kept with a digest of its content. When an
+    issue comes again, only fields whose content changed are evaluated,
+    whatever changed them. Issues evaluated as a whole are first looked up
+    by their content. With a profiler every issue is evaluated by it
+    and nothing is cached.
+
+    :param maxsize: maximum number of remembered issues
+    :type  maxsize: int, optional
+    :param content: cache of results by issue content
+    :type  content: class:`ContentCache`, optional
+    :param profiler: profiler evaluating all issues
+    :type  profiler: class:`ghia.profiling.RuleProfiler`, optional
+    :param timing: histogram observing the seconds of every match
+    :type  timing: class:`ghia.metrics.Histogram`, optional
+    """
+
+    def __init__(self, maxsize=10000, content=None, profiler=None, timing=None):
+        self.maxsize = maxsize
+        self.content = content
+        self.profiler = profiler
+        self.timing = timing
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.evaluated = 0
+        self.reused = 0
+
+    def match(self, ruleset, issue):
+        """Find all users matching an issue, reusing results of unchanged fields
+
+        :param ruleset: compiled rule set (see :func:`compile_rules`)
+        :type  ruleset: dict
+        :param issue: issue to match against
+        :type  issue: dict
+
+        :return: matching users
+        :rtype:  set
+        """
+        if self.timing is None:
+            return self._match(ruleset, issue)
+        started = time.perf_counter()
+        try:
+            return self._match(ruleset, issue)
+        finally:
+            self.timing.observe(time.perf_counter() - started)
+
+    def _match(self, ruleset, issue):
+        """Find all users matching an issue, see :meth:`match`"""
+        if self.profiler is not None:
+            return self.profiler.match(ruleset, issue)
+        key = (issue.get('url'), ruleset['digest'])
+        updated = issue.get('updated_at') or ''
+        digests = field_digests(issue)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        cached = entry[1] if entry is not None else {}
+        results = {field: cached[field][1] for field in FIELDS
+                   if field in cached and cached[field][0] == digests[field]}
+        fields = [field for field in FIELDS if field not in results]
+        digest = None
+        if self.content is not None and fields:
+            digest = content_digest(ruleset, issue)
+            if len(fields) == len(FIELDS):
+                found = self.content.get(digest)
+                if found is not None:
+                    results, fields = dict(found), []
+        if fields:
+            results.update(match_fields(ruleset, issue, fields))
+
+        with self.lock:
+            self.evaluated += len(fields)
+            self.reused += len(FIELDS) - len(fields)
+            # results of an outdated payload do not replace newer ones
+            current = self.entries.get(key)
+            if current is None or current[0] <= updated:
+                self.entries[key] = (updated, {field: (digests[field], results[field])
+                                               for field in FIELDS})
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        if digest is not None and fields:
+            self.content.put(digest, results)
+        return set().union(*results.values())
+
+    def stats(self):
+        """Get cache statistics
+
+        :return: remembered issues, evaluated and reused field results
+        :rtype:  dict
+        """
+        with self.lock:
+            stats = {'size': len(self.entries), 'evaluated': self.evaluated,
+                     'reused': self.reused}
+        if self.content is not None:
+            stats['content'] = self.content.stats()
+        return stats
@@ -0,0 +1,73 @@
+"""Pooled HTTP sessions shared across threads
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledAdapter(HTTPAdapter):
+    """Keep-alive connection pool adapter with a default timeout
+
+    :param pool_size: maximum number of kept connections per host
+    :type  pool_size: int, optional
+    :param timeout: default request timeout in seconds
+    :type  timeout: float, optional
+    """
+
+    def __init__(self, pool_size=10, timeout=10, **kwargs):
+        self.timeout = timeout
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size,
+                         pool_block=False, **kwargs)
+
+    def send(self, request, **kwargs):
+        """Send a request, applying the default timeout if none is given"""
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def make_session(pool_size=10, timeout=10):
+    """Create a session with a pooled adapter for HTTPS
+
+    The session is safe to share between threads as long as
+    its headers and cookies are not modified.
+
+    :param pool_size: maximum number of kept connections per host
+    :type  pool_size: int, optional
+    :param timeout: default request timeout in seconds
+    :type  timeout: float, optional
+
+    :return: pooled session
+    :rtype:  class:`requests.sessions.Session`
+    """
+    session = requests.Session()
+    session.mount('https://', PooledAdapter(pool_size, timeout))
+    return session
+
+
+def pool_stats(session):
+    """Get connection reuse statistics of a session
+
+    :param session: session created by :func:`make_session`
+    :type  session: class:`requests.sessions.Session`
+
+    :return: per host counts of opened connections and sent requests
+    :rtype:  dict
+    """
+    stats = {}
+    if not isinstance(session, requests.Session):
+        return stats
+    adapter = session.get_adapter('https://')
+    if not isinstance(adapter, PooledAdapter):
+        return stats
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats[pool.host] = {
+            'connections': pool.num_connections,
+            'requests': pool.num_requests,
+            'reused': max(pool.num_requests - pool.num_connections, 0),
+        }
+    return stats
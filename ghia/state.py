@@ -0,0 +1,167 @@
+"""Persistent state of incremental batch runs
+"""
+
+import datetime
+import hashlib
+import sqlite3
+from .rules import get_ruleset
+
+
+#: timestamp format used by the GitHub API
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+#: safety margin subtracted from run start times to cover clock skew
+SINCE_MARGIN = datetime.timedelta(minutes=5)
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS repos (
+    reposlug TEXT PRIMARY KEY,
+    last_run TEXT NOT NULL,
+    rules TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS issues (
+    reposlug TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    rules TEXT NOT NULL,
+    PRIMARY KEY (reposlug, number)
+);
+'''
+
+
+def config_digest(config):
+    """Compute a digest of everything deciding the outcome of a run
+
+    :param config: app configuration
+    :type  config: dict
+
+    :return: hexadecimal SHA-1 digest
+    :rtype:  str
+    """
+    fallback = config.get('fallback', {}).get('label', '')
+    data = f"{get_ruleset(config)['digest']}\0{config['strategy']}\0{fallback}"
+    return hashlib.sha1(data.encode('utf8')).hexdigest()
+
+
+class StateStore:
+    """SQLite store remembering what previous batch runs processed
+
+    For every repo the store keeps the time of the last complete run,
+    for every issue its ``updated_at`` when it was last processed.
+    Both are bound to a digest of the rules, strategy and fallback label,
+    changing any of them makes the store forget the previous runs.
+
+    Recorded issues are kept in memory and written by :meth:`save`
+    in one short transaction, so processes reading the same file
+    are never locked out while issues are being processed.
+
+    :param path: path to the SQLite database, created if missing
+    :type  path: str
+    :param config: app configuration
+    :type  config: dict
+    """
+
+    def __init__(self, path, config):
+        self.rules = config_digest(config)
+        self.started = (datetime.datetime.utcnow() - SINCE_MARGIN).strftime(TIME_FORMAT)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_schema)
+        self.recorded = []
+
+    def since(self, reposlug):
+        """Get the time issues of a repo should be listed from
+
+        :param reposlug: GitHub reposlug "owner/repository"
+        :type  reposlug: str
+
+        :return: ISO 8601 timestamp or None to list all issues
+        :rtype:  str
+        """
+        row = self.db.execute('SELECT last_run FROM repos WHERE reposlug = ? AND rules = ?',
+                              (reposlug, self.rules)).fetchone()
+        return row[0] if row else None
+
+    def unchanged(self, reposlug, issue):
+        """Check if an issue was already processed in its current form
+
+        :param reposlug: GitHub reposlug "owner/repository"
+        :type  reposlug: str
+        :param issue: fetched issue
+        :type  issue: dict
+
+        :return: True if the issue may be skipped
+        :rtype:  bool
+        """
+        row = self.db.execute(
+            'SELECT 1 FROM issues WHERE reposlug = ? AND number = ? AND updated_at = ? AND rules = ?',
+            (reposlug, issue['number'], issue['updated_at'], self.rules)
+        ).fetchone()
+        return row is not None
+
+    def record(self, reposlug, issue):
+        """Remember a successfully processed issue
+
+        :param reposlug: GitHub reposlug "owner/repository"
+        :type  reposlug: str
+        :param issue: processed issue
+        :type  issue: dict
+        """
+        self.recorded.append((reposlug, issue['number'], issue['updated_at'], self.rules))
+
+    def take(self):
+        """Take the issues recorded since the last save
+
+        Worker processes hand their records over to the parent,
+        which adds them to its store, so a single process writes the file.
+
+        :return: records accepted by :meth:`add`
+        :rtype:  list
+        """
+        recorded, self.recorded = self.recorded, []
+        return recorded
+
+    def add(self, recorded):
+        """Add issues recorded by another store
+
+        :param recorded: records returned by :meth:`take`
+        :type  recorded: list
+        """
+        self.recorded += recorded
+
+    def _write(self):
+        """Write the recorded issues, the transaction is left to the caller"""
+        self.db.executemany('INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?)', self.recorded)
+        self.recorded = []
+
+    def save(self):
+        """Save the recorded issues"""
+        with self.db:
+            self._write()
+
+    def finish(self, reposlug):
+        """Mark a complete run over a repo and save the state
+
+        :param reposlug: GitHub reposlug "owner/repository"
+        :type  reposlug: str
+        """
+        with self.db:
+            self._write()
+            self.db.execute('INSERT OR REPLACE INTO repos VALUES (?, ?, ?)',
+                            (reposlug, self.started, self.rules))
+
+    def close(self):
+        """Save the state and close the database"""
+        self.save()
+        self.db.close()
+
+
+def merge_since(*timestamps):
+    """Pick the latest of ISO 8601 timestamps
+
+    :param timestamps: timestamps, None for unset
+    :type  timestamps: str
+
+    :return: the latest timestamp or None if none is set
+    :rtype:  str
+    """
+    timestamps = [ts for ts in timestamps if ts is not None]
+    return max(timestamps) if timestamps else None
@@ -1,27 +1,35 @@
 """Flask server as a GitHub webhook receiver
 """
 
-import requests
-import hmac
-import os
-import click
-from flask import Flask, Blueprint, current_app, config, request, abort, render_template
-from .helpers import load_config_multiple
-from .github import get_gh_login, process_issue
+import atexit
+from flask import Flask, Blueprint, current_app, config, request, abort, render_template, jsonify
+from .helpers import env_deliveries, env_int, env_matches
+from .github import process_issue
+from .rules import BudgetExceeded, get_ruleset
+from .worker import Debouncer, WorkQueue
+from .session import make_session, pool_stats
+from .metrics import CONTENT_TYPE, WebhookMetrics
+from .reload import ConfigManager
+from .webhook import app_hook_issues_action_wl, issue_event, verify_signature
+
+# the action whitelist moved to ghia.webhook, it is still importable from here
+__all__ = ['app_hook_issues_action_wl', 'create_app', 'index_bp', 'index', 'queue_stats',
+           'prometheus_metrics', 'pool_usage', 'rules_profile', 'webapp_gh_delivery',
+           'webapp_gh_issue_handler', 'webapp_gh_validate']
 
 
 # Initialize app
 index_bp = Blueprint('index', __name__)
-app_hook_issues_action_wl = ['opened', 'edited', 'transferred', 'reopened',
-                             'assigned', 'unassigned', 'labeled', 'unlabeled']
 
 
-def create_app(config_filename=None, session=requests.Session()):
+def create_app(config_filename=None, session=None):
     """Create a configured Flask application
 
+    The app owns a pooled session shared by all requests and workers.
+
     :param config_filename: config file to use, UNUSED
     :type  config_filename: str, optional
-    :param session: the current session
+    :param session: session used instead of a new pooled one
     :type  session: class:`requests.session.Session`, optional
 
     :return: Flask application
@@ -30,25 +38,54 @@ def create_app(config_filename=None, session=requests.Session()):
     app = Flask(__name__)
     app.register_blueprint(index_bp)
     # Fetch configuration
-    dry_run = 'GHIA_DRYRUN' in os.environ
-    env_strategy = os.environ.get('GHIA_STRATEGY')
-    strategy = env_strategy if env_strategy in ['set', 'change'] else 'append'
-    env_conf = os.environ.get('GHIA_CONFIG')
-
-    config = load_config_multiple(env_conf)
-    if not config:
-        click.echo("Bad config", err=True)
-        exit(10)
-
-    login = get_gh_login(session, config['github']['token'])
-    if not login:
-        click.echo("Invalid token", err=True)
+    workers = env_int('GHIA_WORKERS', 4)
+
+    if session is None:
+        session = make_session(env_int('GHIA_POOL_SIZE', max(workers, 1)),
+                               env_int('GHIA_TIMEOUT', 10))
+    app.extensions['ghia_session'] = session
+
+    # collect Prometheus metrics unless disabled with GHIA_METRICS=0
+    metrics = None
+    if env_int('GHIA_METRICS', 1) > 0:
+        metrics = app.extensions['ghia_metrics'] = WebhookMetrics()
+        if hasattr(session, 'hooks'):
+            session.hooks['response'].append(metrics.observe_response)
+
+    # parse and compile the configuration, swapped in whole on every reload
+    manager = ConfigManager.from_env(session, lambda config: app.config.__setitem__('ghia', config))
+    if metrics is not None:
+        # every loaded configuration carries the metrics to process_issue
+        manager.settings['metrics'] = metrics
+    if not manager.load():
         exit(10)
-
-    app.config['ghia'] = config
-    app.config['ghia']['login'] = login
-    app.config['ghia']['strategy'] = strategy
-    app.config['ghia']['dry_run'] = dry_run
+    app.extensions['ghia_config'] = manager
+    # watch the config files, GHIA_RELOAD=0 disables it
+    reload_interval = env_int('GHIA_RELOAD', 5)
+    if reload_interval > 0:
+        manager.watch(reload_interval)
+
+    # remember deliveries to skip redeliveries, GHIA_DELIVERY_CACHE=0 disables it
+    deliveries = env_deliveries()
+    if deliveries is not None:
+        app.extensions['ghia_deliveries'] = deliveries
+
+    # remember rule results of issues and their content, or profile the rules
+    matches = app.extensions['ghia_matches'] = env_matches(
+        metrics.rule_evaluation if metrics is not None else None)
+    if matches.content is not None and matches.content.path is not None:
+        atexit.register(matches.content.close)
+    if matches.profiler is not None:
+        app.extensions['ghia_profiler'] = matches.profiler
+    # process issues in the background unless disabled with GHIA_WORKERS=0
+    if workers > 0:
+        queue_size = env_int('GHIA_QUEUE_SIZE', 1000)
+        work_queue = WorkQueue(workers, queue_size, session, matches)
+        app.extensions['ghia_queue'] = work_queue
+        # collapse bursts of events of the same issue, GHIA_DEBOUNCE=0 disables it
+        debounce = env_int('GHIA_DEBOUNCE', 2)
+        if debounce > 0:
+            app.extensions['ghia_debouncer'] = Debouncer(debounce, work_queue.submit, queue_size)
 
     return app
 
@@ -62,31 +99,139 @@ def index():
     if request.method == 'GET':
         return render_template('index.html', config=config)
 
+    metrics = current_app.extensions.get('ghia_metrics')
+
     # Validate request
     if not webapp_gh_validate():
+        if metrics is not None:
+            metrics.signature_failures.inc()
         abort(403)
 
     # Respond to ping and issue events
     event = request.headers.get('X-GitHub-Event')
+    if metrics is not None and event != 'issues':
+        # issue deliveries are counted with their action once parsed
+        metrics.deliveries.labels(event or '', '').inc()
     if event == 'ping':
         return '', 200
 
     if event == 'issues':
-        return webapp_gh_issue_handler()
+        return webapp_gh_delivery(webapp_gh_issue_handler)
 
     abort(404)
 
 
+@index_bp.route('/queue', methods=['GET'])
+def queue_stats():
+    """Statistics of the background processing queue (GET /queue route)
+    """
+    work_queue = current_app.extensions.get('ghia_queue')
+    if work_queue is None:
+        abort(404)
+    stats = work_queue.stats()
+    debouncer = current_app.extensions.get('ghia_debouncer')
+    if debouncer is not None:
+        stats['debounce'] = debouncer.stats()
+    stats['matches'] = current_app.extensions['ghia_matches'].stats()
+    return jsonify(stats)
+
+
+@index_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics of the server (GET /metrics route)
+    """
+    metrics = current_app.extensions.get('ghia_metrics')
+    if metrics is None:
+        abort(404)
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+
+@index_bp.route('/pool', methods=['GET'])
+def pool_usage():
+    """Connection reuse statistics of the shared session (GET /pool route)
+    """
+    return jsonify(pool_stats(current_app.extensions['ghia_session']))
+
+
+@index_bp.route('/profile', methods=['GET'])
+def rules_profile():
+    """Profile of the rule patterns (GET /profile route)
+
+    JSON by default, ``?format=table`` renders a plain text table.
+    """
+    profiler = current_app.extensions.get('ghia_profiler')
+    if profiler is None:
+        abort(404)
+    report = profiler.report()
+    if request.args.get('format') == 'table':
+        from .profiling import format_report
+        return format_report(report), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return jsonify(report)
+
+
+def webapp_gh_delivery(handler):
+    """Run a webhook handler unless the delivery was already handled
+
+    Redeliveries are answered before their payload is even parsed.
+    A delivery which fails is forgotten so that its redelivery is handled.
+
+    :param handler: webhook handler
+    :type  handler: callable
+
+    :return: response of the handler
+    """
+    deliveries = current_app.extensions.get('ghia_deliveries')
+    delivery = request.headers.get('X-GitHub-Delivery')
+    if deliveries is None or not delivery:
+        return handler()
+
+    if not deliveries.claim(delivery):
+        metrics = current_app.extensions.get('ghia_metrics')
+        if metrics is not None:
+            metrics.redeliveries.inc()
+        return '', 200
+    try:
+        return handler()
+    except Exception:
+        deliveries.release(delivery)
+        raise
+
+
 def webapp_gh_issue_handler():
     """Handler for incoming issue webhooks
+
+    With background workers the issue is enqueued and 202 is returned at once.
+    Events sent by the GitHub user of the app are dropped, bursts of events
+    concerning the same issue are coalesced into one evaluation.
+    Only rules of the issue fields whose content changed are evaluated again.
     """
+    config = current_app.config['ghia']
     payload = request.json
-    # Only act on specific actions
-    if payload['action'] not in app_hook_issues_action_wl:
+    metrics = current_app.extensions.get('ghia_metrics')
+    if metrics is not None:
+        metrics.deliveries.labels('issues', payload.get('action') or '').inc()
+    issue = issue_event(payload, config)
+    if issue is None:
         return '', 200
 
-    issue = payload['issue']
-    if not process_issue(requests.Session(), issue, current_app.config['ghia']):
+    debouncer = current_app.extensions.get('ghia_debouncer')
+    if debouncer is not None:
+        if not debouncer.push(issue.get('url'), issue, config):
+            abort(503, description='Too many issues waiting for processing')
+        return '', 202
+
+    work_queue = current_app.extensions.get('ghia_queue')
+    if work_queue is not None:
+        if not work_queue.submit(issue, config):
+            abort(503, description='Too many issues waiting for processing')
+        return '', 202
+
+    session = current_app.extensions['ghia_session']
+    try:
+        matched = current_app.extensions['ghia_matches'].match(get_ruleset(config), issue)
+    except BudgetExceeded:
+        abort(400, description='Matching the received issue ran out of time')
+    if not process_issue(session, issue, config, matched=matched):
         abort(400, description='Received issue cannot be processed')
     return '', 200
 
@@ -95,18 +240,4 @@ def webapp_gh_validate():
     """Validate github webhook using ``secret`` if applicable
     """
     conf = current_app.config['ghia']
-    # If secret is not set, do not authenticate
-    if 'secret' not in conf['github']:
-        return True
-
-    secret = conf['github']['secret']
-    sign_hdr = request.headers.get('X-Hub-Signature')
-
-    # Signature is mandatory
-    if not sign_hdr:
-        return False
-
-    algo, sign = sign_hdr.split('=')
-    dg = hmac.new(secret.encode('utf8'), request.data, algo)
-    print(request.data, algo, dg.hexdigest())
-    return hmac.compare_digest(dg.hexdigest(), sign)
+    return verify_signature(conf, request.data, request.headers.get('X-Hub-Signature'))
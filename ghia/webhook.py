@@ -0,0 +1,56 @@
+"""Framework independent handling of GitHub webhooks
+"""
+
+import hmac
+
+
+app_hook_issues_action_wl = ['opened', 'edited', 'transferred', 'reopened',
+                             'assigned', 'unassigned', 'labeled', 'unlabeled']
+
+
+def verify_signature(config, data, sign_hdr):
+    """Validate a webhook payload using ``secret`` if applicable
+
+    :param config: app configuration
+    :type  config: dict
+    :param data: raw request body
+    :type  data: bytes
+    :param sign_hdr: value of the ``X-Hub-Signature`` header
+    :type  sign_hdr: str
+
+    :return: False if the signature is missing or wrong, True otherwise
+    :rtype:  bool
+    """
+    # If secret is not set, do not authenticate
+    if 'secret' not in config['github']:
+        return True
+
+    # Signature is mandatory
+    if not sign_hdr:
+        return False
+
+    secret = config['github']['secret']
+    algo, sign = sign_hdr.split('=')
+    dg = hmac.new(secret.encode('utf8'), data, algo)
+    return hmac.compare_digest(dg.hexdigest(), sign)
+
+
+def issue_event(payload, config):
+    """Pick the issue to evaluate from an issue webhook
+
+    Only whitelisted actions are handled, events sent by the GitHub user
+    of the app (echoes of its own changes) are dropped.
+
+    :param payload: issue webhook payload
+    :type  payload: dict
+    :param config: app configuration
+    :type  config: dict
+
+    :return: the issue, None if the event is ignored
+    :rtype:  dict
+    """
+    if payload['action'] not in app_hook_issues_action_wl:
+        return None
+    if payload.get('sender', {}).get('login') == config['login']:
+        return None
+    return payload['issue']
@@ -0,0 +1,228 @@
+"""Background processing of webhook issues
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+import click
+from .github import process_issue
+from .rules import get_ruleset
+
+
+class WorkQueue:
+    """Queue of issues drained by a pool of worker threads
+
+    Workers share the given thread-safe session or each create their own.
+    Queue depth and latencies are collected in :meth:`stats`.
+
+    :param workers: number of worker threads
+    :type  workers: int, optional
+    :param maxsize: maximum number of waiting issues, 0 for unbounded
+    :type  maxsize: int, optional
+    :param session: session shared by the workers
+    :type  session: class:`requests.sessions.Session`, optional
+    :param matches: cache of per-field match results
+    :type  matches: class:`ghia.rules.MatchCache`, optional
+    """
+
+    def __init__(self, workers=4, maxsize=1000, session=None, matches=None):
+        self.session = session
+        self.matches = matches
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.work_total = 0.0
+        self.work_max = 0.0
+        self.threads = [threading.Thread(target=self._work, name=f"ghia-worker-{i}", daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, issue, config):
+        """Enqueue an issue for processing
+
+        :param issue: the issue to process
+        :type  issue: dict
+        :param config: app configuration
+        :type  config: dict
+
+        :return: False if the queue is full, True otherwise
+        :rtype:  bool
+        """
+        try:
+            self.queue.put_nowait((time.monotonic(), issue, config))
+        except queue.Full:
+            return False
+        return True
+
+    def _work(self):
+        """Worker thread loop"""
+        session = self.session
+        if session is None:
+            import requests
+            session = requests.Session()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            enqueued, issue, config = item
+            started = time.monotonic()
+            try:
+                matched = None
+                if self.matches is not None:
+                    matched = self.matches.match(get_ruleset(config), issue)
+                ok = process_issue(session, issue, config, matched=matched)
+            except Exception as e:
+                click.echo(f"Processing of issue {issue.get('url')} failed: {e}", err=True)
+                ok = False
+            self._account(ok, started - enqueued, time.monotonic() - started)
+            self.queue.task_done()
+
+    def _account(self, ok, wait, work):
+        """Record a finished job
+
+        :param ok: whether the processing succeeded
+        :type  ok: bool
+        :param wait: seconds spent in the queue
+        :type  wait: float
+        :param work: seconds spent processing
+        :type  work: float
+        """
+        with self.lock:
+            self.processed += 1
+            self.failed += not ok
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.work_total += work
+            self.work_max = max(self.work_max, work)
+
+    def stats(self):
+        """Get queue statistics
+
+        :return: queue depth, job counts and latencies in seconds
+        :rtype:  dict
+        """
+        with self.lock:
+            done = max(self.processed, 1)
+            return {
+                'depth': self.queue.qsize(),
+                'workers': len(self.threads),
+                'processed': self.processed,
+                'failed': self.failed,
+                'wait_avg': self.wait_total / done,
+                'wait_max': self.wait_max,
+                'work_avg': self.work_total / done,
+                'work_max': self.work_max,
+            }
+
+    def join(self):
+        """Wait until all enqueued issues are processed"""
+        self.queue.join()
+
+    def stop(self):
+        """Process the remaining issues and stop the workers"""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class Debouncer:
+    """Coalescer of bursts of events concerning the same issue
+
+    The first event of an issue opens a window, events arriving within
+    the window only replace the pending issue. When the window closes,
+    the latest issue is submitted. A rejected issue stays pending and is
+    submitted again when another window closes, so accepted events are
+    never lost. All windows are closed by a single scheduler thread.
+
+    :param window: window length in seconds
+    :type  window: float
+    :param submit: callback taking the issue and config, returning False if rejected
+    :type  submit: callable
+    :param limit: maximum number of pending issues, 0 for unbounded
+    :type  limit: int, optional
+    """
+
+    def __init__(self, window, submit, limit=0):
+        self.window = window
+        self.submit = submit
+        self.limit = limit
+        self.lock = threading.Condition()
+        self.pending = {}
+        # heap of (closing time, sequence number, key) of open windows
+        self.windows = []
+        self.sequence = itertools.count()
+        self.coalesced = 0
+        self.rejected = 0
+        self.thread = threading.Thread(target=self._run, name='ghia-debouncer', daemon=True)
+        self.thread.start()
+
+    def push(self, key, issue, config):
+        """Add an event to the window of its issue
+
+        :param key: issue identifier, e.g. its URL
+        :type  key: str
+        :param issue: the latest issue
+        :type  issue: dict
+        :param config: app configuration
+        :type  config: dict
+
+        :return: False if too many issues are pending, True otherwise
+        :rtype:  bool
+        """
+        with self.lock:
+            if key in self.pending:
+                self.coalesced += 1
+                self.pending[key] = (issue, config)
+                return True
+            if self.limit and len(self.pending) >= self.limit:
+                return False
+            self.pending[key] = (issue, config)
+            self._open(key)
+        return True
+
+    def _open(self, key):
+        """Open a window of an issue, lock must be held
+
+        :param key: issue identifier
+        :type  key: str
+        """
+        heapq.heappush(self.windows, (time.monotonic() + self.window, next(self.sequence), key))
+        self.lock.notify()
+
+    def _run(self):
+        """Scheduler thread loop submitting issues of closed windows"""
+        while True:
+            with self.lock:
+                while not self.windows or self.windows[0][0] > time.monotonic():
+                    self.lock.wait(self.windows[0][0] - time.monotonic() if self.windows else None)
+                _, _, key = heapq.heappop(self.windows)
+                issue, config = self.pending.pop(key)
+            if self.submit(issue, config):
+                continue
+            with self.lock:
+                self.rejected += 1
+                # retry unless a newer event of the issue opened a window meanwhile
+                if key not in self.pending:
+                    self.pending[key] = (issue, config)
+                    self._open(key)
+
+    def stats(self):
+        """Get coalescing statistics
+
+        :return: pending issues, coalesced events and rejected submissions
+        :rtype:  dict
+        """
+        with self.lock:
+            return {
+                'pending': len(self.pending),
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+            }
@@ -22,12 +22,12 @@ setup(
             'ghia = ghia.cli:main',
         ],
     },
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     classifiers=[
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Operating System :: POSIX :: Linux',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
         'Framework :: Flask',
         'Environment :: Console',
         'Environment :: Web Environment',
@@ -37,6 +37,7 @@ setup(
     tests_require=['pytest', 'betamax', 'Flask', 'click'],
     extras_require={
         'dev': ['sphinx'],
+        're2': ['google-re2'],
     },
     zip_safe=False,
 )
@@ -1,7 +1,9 @@
 import os
 import re
+import json
 import pathlib
 import atexit
+import datetime
 import betamax
 from ghia.helpers import load_config
 
@@ -101,6 +103,103 @@ def get_repo():
     return f"mi-pyt-ghia/{get_user()}"
 
 
+def mkissue(title='', body='', labels=(), number=1, reposlug='o/r', assignees=(), **fields):
+    """Issue in the REST API shape, extra fields are added or override the defaults"""
+    return {
+        'url': f"https://api.github.com/repos/{reposlug}/issues/{number}",
+        'html_url': f"https://github.com/{reposlug}/issues/{number}",
+        'repository_url': f"https://api.github.com/repos/{reposlug}",
+        'number': number,
+        'state': 'open',
+        'title': title,
+        'body': body,
+        'labels': [{'name': label} for label in labels],
+        'assignees': [{'login': login} for login in assignees],
+        'updated_at': '2020-01-01T00:00:00Z',
+        **fields,
+    }
+
+
+class FakeRequest:
+    def __init__(self, method):
+        self.method = method
+
+
+class FakeResponse:
+    """Response of a :mod:`requests` session"""
+
+    def __init__(self, status_code=200, body=None, headers=None, links=None,
+                 method='GET', elapsed=0):
+        self.status_code = status_code
+        self.text = json.dumps(body)
+        self.headers = headers or {}
+        self.links = links or {}
+        self.request = FakeRequest(method)
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeAsyncResponse:
+    """Response of an :mod:`aiohttp` session, usable as a context manager"""
+
+    def __init__(self, status=200, body=None, headers=None, links=None):
+        self.status = status
+        self.body = {} if body is None else body
+        self.headers = headers or {}
+        self.links = links or {}
+        self.released = False
+
+    async def json(self, content_type='application/json'):
+        return self.body
+
+    async def text(self):
+        return json.dumps(self.body)
+
+    def release(self):
+        self.released = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class LoginSession:
+    """Answers login requests without a cassette, counting them"""
+
+    def __init__(self, login=None):
+        self.login = login
+        self.calls = 0
+
+    def get(self, url, headers):
+        self.calls += 1
+        return FakeResponse(body={'login': self.login or get_user()})
+
+
+class PatchSession:
+    """Records issue updates, answering them with the given status and body"""
+
+    def __init__(self, status=200, body=None):
+        self.status = status
+        self.body = {} if body is None else body
+        self.patches = []
+
+    def patch(self, url, json, headers):
+        self.patches.append((url, json))
+        return self.response()
+
+    def response(self):
+        return FakeResponse(self.status, self.body)
+
+
+class AsyncPatchSession(PatchSession):
+    def response(self):
+        return FakeAsyncResponse(self.status, self.body)
+
+
 mkauth_default()
 atexit.register(fixture('auth.cfg').unlink)
 with betamax.Betamax.configure() as config:
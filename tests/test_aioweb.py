@@ -0,0 +1,101 @@
+import asyncio
+import hmac
+import json
+import threading
+from aiohttp.test_utils import TestClient, TestServer
+from ghia import aioweb
+from ghia.aioweb import IssueTasks, WebhookReceiver, create_app
+from helpers import init_flask_env, auth_default, get_user, mkissue, AsyncPatchSession, LoginSession
+
+
+def signed(payload, event='issues', delivery=None):
+    data = json.dumps(payload).encode('utf-8')
+    sign = hmac.new(auth_default()[1].encode('utf8'), data, 'sha1').hexdigest()
+    headers = {'X-GitHub-Event': event, 'X-Hub-Signature': f"sha1={sign}"}
+    if delivery is not None:
+        headers['X-GitHub-Delivery'] = delivery
+    return {'data': data, 'headers': headers}
+
+
+def run_app(session, requests):
+    init_flask_env()
+
+    async def run():
+        app = create_app(session=session, login_session=LoginSession())
+        responses = []
+        async with TestClient(TestServer(app)) as client:
+            for method, path, kwargs in requests:
+                r = await client.request(method, path, **kwargs)
+                responses.append((r.status, await r.text()))
+        return responses
+
+    return asyncio.run(run())
+
+
+issue = mkissue('Python network')
+
+
+def test_aio_issue():
+    session = AsyncPatchSession()
+    responses = run_app(session, [
+        ('GET', '/', {}),
+        ('POST', '/', signed({}, 'ping')),
+        ('POST', '/', {'data': b'{}', 'headers': {'X-GitHub-Event': 'ping'}}),
+        ('POST', '/', signed({'action': 'opened', 'issue': issue}, delivery='1')),
+        ('POST', '/', signed({'action': 'opened', 'issue': issue}, delivery='1')),
+        ('POST', '/', signed({'action': 'assigned', 'issue': issue,
+                              'sender': {'login': get_user()}})),
+    ])
+    status = [status for status, text in responses]
+    assert status == [200, 200, 403, 202, 200, 200]
+    assert get_user() in responses[0][1]
+    # processed once, the redelivery and the own event are skipped
+    assert len(session.patches) == 1
+    url, update = session.patches[0]
+    assert url == issue['url']
+    assert sorted(update['assignees']) == ['Dawnflash', 'hroncok']
+
+
+def test_issue_tasks():
+    async def run():
+        gate = asyncio.Event()
+        seen = []
+
+        async def process(issue, config):
+            seen.append(issue)
+            await gate.wait()
+            return issue != 'bad'
+
+        tasks = IssueTasks(process, limit=2)
+        assert tasks.submit('a', 'a1', None)
+        await asyncio.sleep(0)
+        # events of a busy issue wait for it and are coalesced
+        assert tasks.submit('a', 'a2', None)
+        assert tasks.submit('a', 'a3', None)
+        assert tasks.submit('b', 'bad', None)
+        assert not tasks.submit('c', 'c1', None)
+        gate.set()
+        await tasks.join()
+        assert seen == ['a1', 'bad', 'a3']
+        return tasks.stats()
+
+    assert asyncio.run(run()) == {'in_flight': 0, 'processed': 3, 'failed': 1, 'coalesced': 1}
+
+
+def test_process_in_executor(monkeypatch):
+    threads = []
+
+    def match(ruleset, issue):
+        threads.append(threading.get_ident())
+        return {'alice'}
+
+    async def fake_process_issue_async(session, issue, config, matched=None):
+        return matched == {'alice'}
+
+    monkeypatch.setattr(aioweb, 'process_issue_async', fake_process_issue_async)
+    monkeypatch.setattr(aioweb, 'get_ruleset', lambda config: None)
+    receiver = WebhookReceiver(None)
+    receiver.matches.match = match
+    # rules are evaluated off the event loop thread
+    assert asyncio.run(receiver.process(issue, {}))
+    assert threads and threads[0] != threading.get_ident()
@@ -1,6 +1,10 @@
+import asyncio
+import subprocess
+import sys
 import pytest
 from click.testing import CliRunner
-from ghia.cli import click_validate_reposlug
+import ghia.cli
+from ghia.cli import batch_process_async, click_validate_reposlug
 from ghia.cli import main_cmd
 from helpers import fixture
 
@@ -18,3 +22,55 @@ def test_run():
     print(result.output)
     assert result.exit_code == 10
     assert "Could not list issues" in result.output
+
+
+def test_lazy_imports():
+    # the CLI must not pay for the web app or the asynchronous stack at startup
+    code = "import sys, ghia.cli; print(sorted({'aiohttp', 'flask', 'requests'} & set(sys.modules)))"
+    cp = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                        universal_newlines=True, check=True)
+    assert cp.stdout.strip() == '[]'
+
+
+def test_workers_async():
+    runner = CliRunner()
+    param = f"-w 2 -x -a {fixture('auth.cfg')} -r {fixture('rules.cfg')} abc/def"
+    result = runner.invoke(main_cmd, param)
+    assert result.exit_code == 2
+    assert "--workers" in result.output
+
+
+def test_missing_reposlug():
+    runner = CliRunner()
+    param = f"-a {fixture('auth.cfg')} -r {fixture('rules.cfg')}"
+    result = runner.invoke(main_cmd, param)
+    assert result.exit_code == 2
+    assert "Missing argument" in result.output
+
+
+def test_async_org_streaming(monkeypatch):
+    started = []
+    events = {}
+
+    async def fake_org_repos(session, org, token, cache=None):
+        yield ['o/a', 'o/b']
+        # repos of the first page are processed before the next page is listed
+        await asyncio.wait_for(events['o/a'].wait(), 5)
+        yield ['o/b', 'o/c']
+
+    def fake_sources(session, config, reposlugs, state=None, cache=None):
+        async def pages(reposlug):
+            started.append(reposlug)
+            events[reposlug].set()
+            yield reposlug, []
+        return [([reposlug], pages(reposlug)) for reposlug in reposlugs]
+
+    async def run():
+        events.update((reposlug, asyncio.Event()) for reposlug in ('o/a', 'o/b', 'o/c', 'o/x'))
+        await batch_process_async({'github': {'token': 'abc'}}, ('o/x', 'o/a'), orgs=('o',))
+
+    monkeypatch.setattr(ghia.cli, 'iter_org_repos_async', fake_org_repos)
+    monkeypatch.setattr(ghia.cli, 'page_sources_async', fake_sources)
+    asyncio.run(run())
+    # every repo is processed once
+    assert sorted(started) == ['o/a', 'o/b', 'o/c', 'o/x']
@@ -0,0 +1,58 @@
+from ghia import deliveries
+from ghia.deliveries import DeliveryCache
+
+
+def test_claim():
+    cache = DeliveryCache()
+    assert cache.claim('a')
+    assert not cache.claim('a')
+    assert cache.claim('b')
+    cache.release('a')
+    assert cache.claim('a')
+    assert cache.stats() == {'size': 2, 'duplicates': 1}
+
+
+def test_lru_bound():
+    cache = DeliveryCache(maxsize=2)
+    for delivery in 'abc':
+        assert cache.claim(delivery)
+    assert cache.stats()['size'] == 2
+    # the oldest delivery was forgotten
+    assert cache.claim('a')
+
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(deliveries.time, 'time', lambda: now[0])
+    cache = DeliveryCache(ttl=60)
+    assert cache.claim('a')
+    now[0] += 30
+    assert not cache.claim('a')
+    now[0] += 61
+    assert cache.claim('a')
+
+
+def test_ttl_duplicate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(deliveries.time, 'time', lambda: now[0])
+    cache = DeliveryCache(ttl=60)
+    assert cache.claim('a')
+    now[0] += 10
+    assert cache.claim('b')
+    now[0] += 10
+    assert not cache.claim('a')
+    # a duplicate does not extend the life of the delivery
+    now[0] += 45
+    assert cache.claim('a')
+    assert not cache.claim('b')
+
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / 'deliveries.db')
+    cache = DeliveryCache(path=path)
+    assert cache.claim('a')
+    assert cache.claim('b')
+    cache.release('b')
+    cache = DeliveryCache(path=path)
+    assert not cache.claim('a')
+    assert cache.claim('b')
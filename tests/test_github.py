@@ -1,10 +1,17 @@
 import betamax
 import pytest
 import os
+import re
+import asyncio
+import urllib.parse
 import io
 from contextlib import redirect_stdout
-from ghia.github import get_gh_login, gather_issues, process_issue
-from helpers import auth_default, issue_configs, fetch_issue, get_repo, get_user
+from ghia.github import get_gh_login, gather_issues, process_issue, process_issue_async
+from ghia.github import iter_issue_pages_async, page_url, issues_url, skip_pull_requests
+from ghia.github import active_repos, iter_org_repos, iter_org_repos_async, org_repos_url
+from ghia.rules import compile_rules
+from helpers import auth_default, issue_configs, fetch_issue, get_repo, get_user, mkissue
+from helpers import AsyncPatchSession, FakeAsyncResponse, FakeResponse, PatchSession
 
 
 with betamax.Betamax.configure() as config:
@@ -53,3 +60,172 @@ def test_process_issue(issue_no, config, counts, label,
         assert label in fval
     else:
         assert "FALLBACK" not in fval
+
+
+def async_config(**kwargs):
+    return {
+        'github': {'token': 'f' * 40},
+        'patterns': {'john': [('title', re.compile('python', re.IGNORECASE))]},
+        'strategy': 'append',
+        'fallback': {'label': 'AssignMe'},
+        'dry_run': False,
+        **kwargs
+    }
+
+
+@pytest.mark.parametrize("title,assignees,strategy,patched", [
+    ('Python', (), 'append', [{'assignees': ['john']}]),
+    ('Python', ('john',), 'append', []),
+    ('Python', ('frank',), 'set', []),
+    ('Java', ('frank',), 'change', [{'labels': ['AssignMe'], 'assignees': []}]),
+    ('Java', (), 'append', [{'labels': ['AssignMe']}]),
+])
+def test_process_issue_async(title, assignees, strategy, patched):
+    session = AsyncPatchSession()
+    issue = mkissue(title, assignees=assignees)
+    with redirect_stdout(io.StringIO()):
+        assert asyncio.run(process_issue_async(
+            session, issue, async_config(strategy=strategy), True))
+    assert session.patches == [(issue['url'], patch) for patch in patched]
+
+
+def test_process_issue_async_failure():
+    session = AsyncPatchSession(403)
+    f = io.StringIO()
+    with redirect_stdout(f):
+        assert not asyncio.run(process_issue_async(
+            session, mkissue('Python'), async_config(), True))
+    assert "+ john" not in f.getvalue()
+
+
+def test_page_url():
+    url = 'https://api.github.com/repositories/1/issues?state=open&page=7&per_page=100'
+    assert page_url(url, 3) == \
+        'https://api.github.com/repositories/1/issues?state=open&per_page=100&page=3'
+
+
+class FakePageSession:
+    def __init__(self, last):
+        self.last = last
+        self.requested = []
+
+    def get(self, url, headers):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query))
+        page = int(query.get('page', 1))
+        self.requested.append(page)
+        url = 'https://api.github.com/repositories/1/issues'
+        links = {'last': {'url': f"{url}?page={self.last}"}} if self.last > 1 else {}
+        return FakeAsyncResponse(200, [{'number': page}], links=links)
+
+
+@pytest.mark.parametrize("last", [1, 2, 10])
+def test_iter_issue_pages_async(last):
+    session = FakePageSession(last)
+
+    async def run():
+        pages = []
+        async for page in iter_issue_pages_async(session, 'o/r', 'f', prefetch=3):
+            # never more than prefetch pages ahead of the consumer
+            assert len(session.requested) <= len(pages) + 1 + 3
+            pages.append(page)
+        return pages
+
+    assert asyncio.run(run()) == [[{'number': page}] for page in range(1, last + 1)]
+    assert sorted(session.requested) == list(range(1, last + 1))
+
+
+@pytest.mark.parametrize("since,query", [
+    (None, 'state=open&per_page=100'),
+    ('2019-11-18T00:00:00Z', 'state=open&per_page=100&since=2019-11-18T00%3A00%3A00Z'),
+])
+def test_issues_url(since, query):
+    assert issues_url('o/r', since) == f"https://api.github.com/repos/o/r/issues?{query}"
+
+
+def test_skip_pull_requests():
+    page = [{'number': 1}, {'number': 2, 'pull_request': {}}, {'number': 3}]
+    assert [i['number'] for i in skip_pull_requests(page)] == [1, 3]
+
+
+@pytest.mark.parametrize("status,ok", [(200, True), (500, False)])
+def test_process_issue_single_patch(status, ok):
+    session = PatchSession(status)
+    f = io.StringIO()
+    with redirect_stdout(f):
+        assert process_issue(session, mkissue('Java', assignees=('frank',)),
+                             async_config(strategy='change'), True) is ok
+    assert [update for url, update in session.patches] == [{'labels': ['AssignMe'], 'assignees': []}]
+    # a failed update keeps the original assignees
+    assert ("- frank" in f.getvalue()) is ok
+
+
+@pytest.mark.parametrize("title,updated_at", [
+    ('Java', '2020-01-02T00:00:00Z'),
+    # edited by someone else before the update, must be processed again
+    ('Java 11', '2020-01-01T00:00:00Z'),
+])
+def test_process_issue_updated_at(title, updated_at):
+    data = {'title': title, 'body': '', 'labels': [{'name': 'AssignMe'}],
+            'updated_at': '2020-01-02T00:00:00Z'}
+    issue = mkissue('Java', updated_at='2020-01-01T00:00:00Z')
+    with redirect_stdout(io.StringIO()):
+        assert process_issue(PatchSession(200, data), issue, async_config(), True)
+    assert issue['updated_at'] == updated_at
+
+
+def test_process_issue_over_budget(capsys):
+    session = PatchSession()
+    config = async_config(patterns={'john': [('text', re.compile('a.c'))]})
+    config['ruleset'] = compile_rules(config['patterns'], budget=1e-9)
+    issue = mkissue('Java', 'abc')
+    # partial results would add the fallback label
+    assert not process_issue(session, issue, config, True)
+    assert session.patches == []
+    assert 'WARNING: matching https://github.com/o/r/issues/1 took over' in capsys.readouterr().err
+
+
+def test_active_repos():
+    repos = [
+        {'full_name': 'o/a', 'archived': False, 'has_issues': True, 'open_issues_count': 2},
+        {'full_name': 'o/b', 'archived': True, 'has_issues': True, 'open_issues_count': 2},
+        {'full_name': 'o/c', 'archived': False, 'has_issues': True, 'open_issues_count': 0},
+        {'full_name': 'o/d', 'archived': False, 'has_issues': False, 'open_issues_count': 1},
+    ]
+    assert active_repos(repos) == ['o/a']
+
+
+class FakeRepoSession:
+    def __init__(self, pages):
+        self.pages = pages
+        self.urls = []
+
+    def get(self, url, headers):
+        self.urls.append(url)
+        page = len(self.urls)
+        links = {'next': {'url': f"{url}&page={page + 1}"}} if page < self.pages else {}
+        repos = [{'full_name': f"o/r{page}", 'open_issues_count': 1}]
+        return self.response(repos, links)
+
+    def response(self, repos, links):
+        return FakeResponse(200, repos, links=links)
+
+
+class FakeAsyncRepoSession(FakeRepoSession):
+    def response(self, repos, links):
+        return FakeAsyncResponse(200, repos, links=links)
+
+
+def test_iter_org_repos():
+    session = FakeRepoSession(2)
+    assert list(iter_org_repos(session, 'o', 'token')) == [['o/r1'], ['o/r2']]
+    assert session.urls[0] == org_repos_url('o')
+
+
+def test_iter_org_repos_async():
+    session = FakeAsyncRepoSession(2)
+
+    async def run():
+        return [page async for page in iter_org_repos_async(session, 'o', 'token')]
+
+    assert asyncio.run(run()) == [['o/r1'], ['o/r2']]
+    assert session.urls[0] == org_repos_url('o')
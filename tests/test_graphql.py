@@ -0,0 +1,126 @@
+import re
+import pytest
+from ghia.graphql import (batches, build_labels_query, build_query, convert_issue, graphql_url,
+                          iter_issue_pages_graphql)
+from helpers import FakeResponse
+
+
+def mknode(number, state='OPEN'):
+    return {
+        'number': number,
+        'title': f"Issue {number}",
+        'body': None,
+        'state': state,
+        'url': f"https://github.com/o/r/issues/{number}",
+        'updatedAt': '2019-11-18T15:41:01Z',
+        'labels': {'pageInfo': {'hasNextPage': False, 'endCursor': None}, 'nodes': [{'name': 'bug'}]},
+        'assignees': {'nodes': [{'login': 'john'}]},
+    }
+
+
+class FakeSession:
+    """Serves repos 'o/a' with 2 pages and 'o/b' with 1 page"""
+
+    def __init__(self, missing=False):
+        self.queries = []
+        self.missing = missing
+
+    def post(self, url, json, headers):
+        query = json['query']
+        self.queries.append(query)
+        data = {}
+        for alias, name, after in re.findall(
+                r'(r\d+): repository\(owner: "o", name: "(\w+)"\) \{\s+issues\(([^)]*)\)', query):
+            if self.missing and name == 'b':
+                data[alias] = None
+                continue
+            last = name == 'b' or 'after' in after
+            data[alias] = {'issues': {
+                'pageInfo': {'hasNextPage': not last, 'endCursor': 'c1'},
+                'nodes': [mknode(2 if 'after' in after else 1)],
+            }}
+        return FakeResponse(200, {'data': data})
+
+
+def test_graphql_url():
+    assert graphql_url('https://api.github.com') == 'https://api.github.com/graphql'
+    # GitHub Enterprise
+    assert graphql_url('https://ghe.example.com/api/v3') == 'https://ghe.example.com/api/graphql'
+    assert graphql_url('http://127.0.0.1:8000') == 'http://127.0.0.1:8000/graphql'
+
+
+def test_build_query():
+    query = build_query({'o/a': None, 'o/b': 'abc'}, {'o/a': '2019-11-18T00:00:00Z'})
+    assert 'r0: repository(owner: "o", name: "a")' in query
+    assert 'r1: repository(owner: "o", name: "b")' in query
+    assert 'filterBy: {since: "2019-11-18T00:00:00Z"}' in query
+    assert 'after: "abc"' in query
+    assert 'states: OPEN' in query
+
+
+def test_convert_issue():
+    issue = convert_issue('o/r', mknode(7))
+    assert issue['url'] == 'https://api.github.com/repos/o/r/issues/7'
+    assert issue['repository_url'] == 'https://api.github.com/repos/o/r'
+    assert issue['html_url'] == 'https://github.com/o/r/issues/7'
+    assert issue['state'] == 'open'
+    assert issue['labels'] == [{'name': 'bug'}]
+    assert issue['assignees'] == [{'login': 'john'}]
+
+
+def test_iter_issue_pages_graphql():
+    session = FakeSession()
+    pages = [(reposlug, [i['number'] for i in issues])
+             for reposlug, issues in iter_issue_pages_graphql(session, ['o/a', 'o/b'], 'f')]
+    assert pages == [('o/a', [1]), ('o/b', [1]), ('o/a', [2])]
+    # the second round only asks for the unfinished repo
+    assert len(session.queries) == 2
+    assert 'name: "b"' not in session.queries[1]
+
+
+def test_iter_issue_pages_graphql_missing():
+    with pytest.raises(SystemExit):
+        list(iter_issue_pages_graphql(FakeSession(missing=True), ['o/a', 'o/b'], 'f'))
+
+
+class LabeledSession:
+    """Serves one issue of 'o/a' with 250 labels, 100 per page"""
+
+    def __init__(self):
+        self.queries = []
+
+    def post(self, url, json, headers):
+        query = json['query']
+        self.queries.append(query)
+        match = re.search(r'labels\(first: 100, after: "(\d+)"\)', query)
+        start = int(match.group(1)) if match else 0
+        labels = {
+            'pageInfo': {'hasNextPage': start + 100 < 250, 'endCursor': str(start + 100)},
+            'nodes': [{'name': f"l{i}"} for i in range(start, min(start + 100, 250))],
+        }
+        if match:
+            return FakeResponse(200, {'data': {'l0': {'issue': {'labels': labels}}}})
+        node = {**mknode(1), 'labels': labels}
+        return FakeResponse(200, {'data': {'r0': {'issues': {
+            'pageInfo': {'hasNextPage': False, 'endCursor': 'c1'},
+            'nodes': [node],
+        }}}})
+
+
+def test_build_labels_query():
+    query = build_labels_query([('o/a', {'number': 7}, 'abc')])
+    assert 'l0: repository(owner: "o", name: "a")' in query
+    assert 'issue(number: 7)' in query
+    assert 'labels(first: 100, after: "abc")' in query
+
+
+def test_iter_issue_pages_graphql_labels():
+    session = LabeledSession()
+    [(reposlug, issues)] = list(iter_issue_pages_graphql(session, ['o/a'], 'f'))
+    # all labels are listed, the fallback label must not drop any of them
+    assert [label['name'] for label in issues[0]['labels']] == [f"l{i}" for i in range(250)]
+    assert len(session.queries) == 3
+
+
+def test_batches():
+    assert batches(('a/a', 'a/b', 'a/c'), 2) == [['a/a', 'a/b'], ['a/c']]
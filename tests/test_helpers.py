@@ -29,6 +29,7 @@ def test_load_config_rules():
     assert type(cdict) is dict
     assert 'patterns' in cdict
     assert 'fallback' in cdict
+    assert 'ruleset' in cdict
 
 
 def test_load_config_multiple():
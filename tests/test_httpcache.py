@@ -0,0 +1,76 @@
+from ghia.cli import listing_cache
+from ghia.github import iter_issue_pages
+from ghia.httpcache import HTTPCache, normalize_links
+from helpers import FakeResponse
+
+
+class FakeSession:
+    """Serves two pages, answers 304 when the ETag matches"""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, headers):
+        self.requests.append((url, headers.get('If-None-Match')))
+        page = 2 if 'page=2' in url else 1
+        etag = f'"etag{page}"'
+        if headers.get('If-None-Match') == etag:
+            return FakeResponse(304)
+        links = {'next': {'url': f"{url}&page=2"}} if page == 1 else {}
+        return FakeResponse(200, [{'number': page}], {'ETag': etag}, links)
+
+
+def test_normalize_links():
+    links = {'next': {'url': 'https://x/?page=2', 'rel': 'next'}}
+    assert normalize_links(links) == {'next': {'url': 'https://x/?page=2'}}
+
+
+def test_conditional_pages(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    session = FakeSession()
+
+    cache = HTTPCache(path)
+    first = list(iter_issue_pages(session, 'o/r', 'f', cache=cache))
+    cache.close()
+    assert [etag for url, etag in session.requests] == [None, None]
+
+    session.requests.clear()
+    cache = HTTPCache(path)
+    second = list(iter_issue_pages(session, 'o/r', 'f', cache=cache))
+    assert [etag for url, etag in session.requests] == ['"etag1"', '"etag2"']
+    assert second == first == [[{'number': 1}], [{'number': 2}]]
+    assert (cache.hits, cache.misses) == (2, 0)
+    cache.close()
+
+
+def test_uncacheable(tmp_path):
+    cache = HTTPCache(str(tmp_path / 'cache.db'))
+    cache.store('https://x/', {}, '[]', {})
+    assert cache.conditions('https://x/') == {}
+    cache.store('https://x/', {'Last-Modified': 'Mon, 18 Nov 2019 15:41:01 GMT'}, '[]', {})
+    assert cache.conditions('https://x/') == {'If-Modified-Since': 'Mon, 18 Nov 2019 15:41:01 GMT'}
+
+
+def test_eviction(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = HTTPCache(path, maxsize=2)
+    for url in ('https://x/1', 'https://x/2', 'https://x/3'):
+        cache.store(url, {'ETag': url}, '[]', {})
+    # a response served after 304 counts as used
+    cache.load('https://x/1')
+    cache.close()
+
+    cache = HTTPCache(path, maxsize=2)
+    assert cache.conditions('https://x/1') == {'If-None-Match': 'https://x/1'}
+    assert cache.db.execute('SELECT COUNT(*) FROM responses').fetchone() == (2,)
+    cache.close()
+
+
+def test_listing_cache(tmp_path):
+    cache = HTTPCache(str(tmp_path / 'cache.db'))
+    config = {'since': '2019-11-18T00:00:00Z'}
+    assert listing_cache(config, '2019-11-18T00:00:00Z', cache) is cache
+    assert listing_cache({}, None, cache) is cache
+    # listings since the previous run change their URL on every run
+    assert listing_cache(config, '2019-11-20T10:00:00Z', cache) is None
+    cache.close()
@@ -0,0 +1,76 @@
+import configparser
+import re
+import pytest
+from ghia.helpers import load_config_rules
+from ghia.matching import analyze_pattern, compile_pattern, re2_available, resolve_engine
+
+
+@pytest.mark.parametrize("pattern", [
+    '(a+)+$',
+    r'(\w+\s?)*$',
+    r'(.|\s)*x',
+    '(ab|a.)*c',
+    r'(a.|\wb)+',
+    '(A.|a)+',
+])
+def test_analyze_unsafe(pattern):
+    assert analyze_pattern(pattern, re.IGNORECASE) is not None
+
+
+@pytest.mark.parametrize("pattern", [
+    'network',
+    '^(network|networking)$',
+    'http[s]{0,1}://localhost:[0-9]{2,5}',
+    r'(\w|\d)*',
+    '(a|b)+',
+    '(?:foo|bar)+',
+    '(?>a+)+',
+    '(',
+])
+def test_analyze_safe(pattern):
+    assert analyze_pattern(pattern, re.IGNORECASE) is None
+
+
+def test_resolve_engine():
+    assert resolve_engine('re') == 're'
+    assert resolve_engine('auto') == ('re2' if re2_available() else 're')
+    with pytest.raises(ValueError):
+        resolve_engine('pcre')
+
+
+def test_compile_re2():
+    pytest.importorskip('re2')
+    rgx = compile_pattern('(?P<g0>net)|(?P<g1>py)', re.IGNORECASE, 're2')
+    assert not isinstance(rgx, re.Pattern)
+    assert rgx.search('xx PY').lastgroup == 'g1'
+    # backreferences are left to re
+    assert isinstance(compile_pattern(r'(\w+) \1', 0, 're2'), re.Pattern)
+
+
+def rules(matching, pattern='(a+)+$'):
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    parser.read_string(f"[patterns]\nalice=title:{pattern}\n[matching]\n{matching}")
+    return load_config_rules(parser)
+
+
+def test_load_matching(capsys):
+    config = rules('budget=0')
+    assert config['matching'] == {'engine': 're', 'unsafe': 'warn', 'budget': 0}
+    assert 'WARNING: pattern title:(a+)+$ of alice' in capsys.readouterr().err
+    # unsafe patterns are rejected by default when there is a budget
+    with pytest.raises(ValueError, match='nested quantifiers'):
+        rules('budget=0.5')
+    config = rules('budget=0.5\nunsafe=warn')
+    assert config['matching'] == {'engine': 're', 'unsafe': 'warn', 'budget': 0.5}
+    assert config['ruleset']['budget'] == 0.5
+    capsys.readouterr()
+
+    rules('unsafe=allow')
+    assert capsys.readouterr().err == ''
+    with pytest.raises(ValueError, match='nested quantifiers'):
+        rules('unsafe=reject')
+    assert rules('unsafe=reject', 'network')['patterns']['alice']
+    for bad in ('engine=pcre', 'unsafe=maybe', 'budget=-1'):
+        with pytest.raises(ValueError):
+            rules(bad)
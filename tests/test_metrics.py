@@ -0,0 +1,43 @@
+from ghia.metrics import Counter, Gauge, Histogram, WebhookMetrics
+from helpers import FakeResponse
+
+
+def test_counter_gauge():
+    counter = Counter('deliveries_total', 'Deliveries.', ('event', 'action'))
+    counter.labels('issues', 'opened').inc()
+    counter.labels('issues', 'opened').inc(2)
+    counter.labels('ping', 'a"b\n').inc()
+    assert counter.render() == [
+        '# HELP deliveries_total Deliveries.',
+        '# TYPE deliveries_total counter',
+        'deliveries_total{event="issues",action="opened"} 3.0',
+        'deliveries_total{event="ping",action="a\\"b\\n"} 1.0',
+    ]
+    gauge = Gauge('remaining', 'Remaining.')
+    gauge.set(42)
+    assert gauge.render()[-1] == 'remaining 42.0'
+
+
+def test_histogram():
+    histogram = Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 3.65',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_webhook_metrics():
+    metrics = WebhookMetrics()
+    metrics.observe_response(FakeResponse(200, headers={'X-RateLimit-Remaining': '4999'},
+                                          method='PATCH', elapsed=0.03))
+    metrics.count_update('sent')
+    text = metrics.render()
+    assert 'ghia_github_request_duration_seconds_bucket{method="PATCH",status="200",le="0.05"} 1' in text
+    assert 'ghia_github_rate_limit_remaining 4999.0' in text
+    assert 'ghia_issue_updates_total{outcome="sent"} 1.0' in text
+    assert '# TYPE ghia_rule_evaluation_seconds histogram' in text
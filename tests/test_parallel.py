@@ -0,0 +1,150 @@
+import concurrent.futures
+import functools
+import multiprocessing
+import re
+import sqlite3
+import urllib.parse
+import pytest
+import ghia.cli
+import ghia.parallel
+from ghia.parallel import batch_process_sharded
+from ghia.profiling import RuleProfiler
+from ghia.rules import ContentCache
+from ghia.state import StateStore
+from helpers import mkissue
+
+
+config = {
+    'github': {'token': 'abc'},
+    'patterns': {'alice': [('title', re.compile('network'))]},
+    'strategy': 'append',
+    'dry_run': True,
+}
+
+
+def fake_fetch(session, reposlug, token, url, cache=None):
+    if reposlug == 'o/broken':
+        ghia.parallel.click.echo('Could not list issues', err=True)
+        exit(10)
+    page = int(dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query)).get('page', 1))
+    links = {'last': {'url': f"{url}&page=3"}} if reposlug == 'o/big' and page == 1 else {}
+    return [mkissue('network', number=page * 10 + n, reposlug=reposlug) for n in range(2)], links
+
+
+class SerialExecutor:
+    """Runs the work at submission, standing in for the process pool"""
+
+    def __init__(self, workers, initializer, initargs):
+        initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def run_sharded(monkeypatch, reposlugs, state=None, state_path=None):
+    monkeypatch.setattr(ghia.parallel, 'fetch_issue_page', fake_fetch)
+    batch_process_sharded(config, reposlugs, 2, state, state_path, executor_class=SerialExecutor)
+
+
+def test_sharded_order(monkeypatch, capsys, tmp_path):
+    path = str(tmp_path / 'state.db')
+    state = StateStore(path, config)
+    run_sharded(monkeypatch, ['o/small', 'o/big'], state, path)
+    out = capsys.readouterr().out
+    numbers = [int(n) for n in re.findall(r'-> o/\w+#(\d+)', out)]
+    assert re.findall(r'-> (o/\w+)#', out) == ['o/small'] * 2 + ['o/big'] * 6
+    assert numbers == [10, 11, 10, 11, 20, 21, 30, 31]
+    # issues recorded by the workers, repos finished by the parent
+    assert state.since('o/big') is not None
+    assert state.unchanged('o/big', mkissue('network', number=31, reposlug='o/big'))
+    state.close()
+
+
+def test_sharded_failed_issue(monkeypatch, capsys, tmp_path):
+    path = str(tmp_path / 'state.db')
+    state = StateStore(path, config)
+    original = ghia.cli.process_issue
+    monkeypatch.setattr(ghia.cli, 'process_issue',
+                        lambda session, issue, *args, **kwargs:
+                        issue['number'] != 21 and original(session, issue, *args, **kwargs))
+    run_sharded(monkeypatch, ['o/small', 'o/big'], state, path)
+    capsys.readouterr()
+    # the failed issue is retried by the next run listing the repo since the same time
+    assert state.since('o/small') is not None
+    assert state.since('o/big') is None
+    assert state.unchanged('o/big', mkissue('network', number=20, reposlug='o/big'))
+    assert not state.unchanged('o/big', mkissue('network', number=21, reposlug='o/big'))
+    state.close()
+
+
+def test_sharded_error(monkeypatch, capsys):
+    with pytest.raises(SystemExit) as e:
+        run_sharded(monkeypatch, ['o/small', 'o/broken', 'o/big'])
+    assert e.value.code == 10
+    captured = capsys.readouterr()
+    assert 'o/small#10' in captured.out
+    assert 'o/big' not in captured.out
+    assert 'Could not list issues' in captured.err
+
+
+def test_sharded_content_cache(monkeypatch, capsys, tmp_path):
+    path = str(tmp_path / 'matches.db')
+    monkeypatch.setattr(ghia.parallel, 'fetch_issue_page', fake_fetch)
+    batch_process_sharded({**config, 'content_cache': ContentCache(path=path)}, ['o/big'], 2,
+                          executor_class=SerialExecutor)
+    assert capsys.readouterr().out.count('+ alice') == 6
+    # the workers opened the file themselves
+    cache = ContentCache(path=path)
+    assert cache.stats()['size'] == 1
+    cache.close()
+
+
+def test_sharded_profile(monkeypatch, capsys):
+    profiler = RuleProfiler()
+    monkeypatch.setattr(ghia.parallel, 'fetch_issue_page', fake_fetch)
+    batch_process_sharded({**config, 'profiler': profiler}, ['o/small', 'o/big'], 2,
+                          executor_class=SerialExecutor)
+    # profiles of all pages are collected by the parent
+    report = profiler.report()
+    assert report['issues'] == 8
+    assert report['patterns'][0]['hits'] == 8
+
+
+def test_sharded_processes(monkeypatch, capsys, tmp_path):
+    try:
+        context = multiprocessing.get_context('fork')
+    except ValueError:
+        pytest.skip('workers inherit the fake API only when forked')
+    state_path, cache_path = str(tmp_path / 'state.db'), str(tmp_path / 'matches.db')
+    original = ghia.cli.process_issue
+
+    def process_issue(*args, **kwargs):
+        # no worker may keep the files locked while processing issues
+        for path in (state_path, cache_path):
+            db = sqlite3.connect(path, timeout=0.5)
+            db.execute('BEGIN IMMEDIATE')
+            db.rollback()
+            db.close()
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(ghia.parallel, 'fetch_issue_page', fake_fetch)
+    monkeypatch.setattr(ghia.cli, 'process_issue', process_issue)
+    state = StateStore(state_path, config)
+    reposlugs = ['o/big', 'o/small', 'o/other', 'o/more']
+    executor = functools.partial(concurrent.futures.ProcessPoolExecutor, mp_context=context)
+    batch_process_sharded({**config, 'content_cache': ContentCache(path=cache_path)}, reposlugs, 3,
+                          state, state_path, executor_class=executor)
+    assert capsys.readouterr().out.count('+ alice') == 12
+    # the parent saved what the workers processed
+    assert all(state.since(reposlug) is not None for reposlug in reposlugs)
+    assert state.unchanged('o/big', mkissue('network', number=31, reposlug='o/big'))
+    assert state.unchanged('o/more', mkissue('network', number=11, reposlug='o/more'))
+    state.close()
@@ -0,0 +1,73 @@
+import json
+import re
+from ghia.profiling import RuleProfiler, format_report
+from ghia.rules import compile_rules, match_users
+from helpers import mkissue
+
+
+patterns = {
+    'alice': [
+        ('title', re.compile('network', re.IGNORECASE)),
+        ('label', re.compile('^(network|networking)$', re.IGNORECASE)),
+    ],
+    'bob': [('any', re.compile('python', re.IGNORECASE))],
+    'carol': [('text', re.compile('never matches', re.IGNORECASE))],
+}
+
+
+issues = [
+    mkissue('Network down', 'python ' * 1000, ['networking'], number=1),
+    mkissue('Python', '', number=2),
+    mkissue('unrelated', 'python', number=3),
+]
+
+
+def test_profile_match():
+    ruleset = compile_rules(patterns)
+    profiler = RuleProfiler(slowest=2)
+    for issue in issues:
+        assert profiler.match(ruleset, issue) == match_users(ruleset, issue)
+
+    report = profiler.report()
+    assert report['issues'] == 3
+    rows = {(row['user'], row['subject']): row for row in report['patterns']}
+    assert [row['seconds'] for row in report['patterns']] == sorted(
+        (row['seconds'] for row in report['patterns']), reverse=True)
+    assert rows['bob', 'any']['evaluations'] == 3
+    assert rows['bob', 'any']['hits'] == 3
+    assert rows['bob', 'any']['fields'] == {'title': 1, 'text': 2}
+    assert rows['alice', 'label']['fields'] == {'label': 1}
+    # a dead pattern
+    assert rows['carol', 'text']['hits'] == 0
+    assert rows['carol', 'text']['hit_rate'] == 0
+    assert len(report['slowest_issues']) == 2
+    assert report['slowest_issues'][0]['seconds'] >= report['slowest_issues'][1]['seconds']
+
+
+def test_profile_merge():
+    ruleset = compile_rules(patterns)
+    first, second = RuleProfiler(), RuleProfiler()
+    first.match(ruleset, issues[0])
+    second.match(ruleset, issues[1])
+    second.match(ruleset, issues[2])
+    # data crosses process boundaries as JSON-like values
+    first.merge(second.export())
+    second.reset()
+    assert second.report()['issues'] == 0
+
+    report = first.report()
+    assert report['issues'] == 3
+    assert {row['evaluations'] for row in report['patterns']} == {3}
+    assert {issue['url'][-1] for issue in report['slowest_issues']} == {'1', '2', '3'}
+
+
+def test_format_report():
+    profiler = RuleProfiler()
+    profiler.match(compile_rules(patterns), issues[0])
+    report = profiler.report()
+    assert json.loads(format_report(report, 'json')) == report
+
+    table = format_report(report)
+    assert table.startswith('1 issues matched in')
+    assert 'bob              any:python' in table
+    assert 'https://github.com/o/r/issues/1' in table
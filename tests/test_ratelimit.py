@@ -0,0 +1,127 @@
+import asyncio
+import time
+import pytest
+from ghia import ratelimit
+from ghia.ratelimit import RateLimitedSession, parse_retry_after
+from helpers import FakeAsyncResponse
+
+
+class FakeClient:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        return self.responses.pop(0) if self.responses else FakeAsyncResponse(200)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        if delay:
+            delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(ratelimit.asyncio, 'sleep', fake_sleep)
+    return delays
+
+
+async def fetch(session, url='https://api.github.com/x', method='get'):
+    async with getattr(session, method)(url) as r:
+        return r.status
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after('Thu, 01 Jan 1970 00:01:40 GMT', now=40) == 60.0
+    assert parse_retry_after('garbage') is None
+
+
+def test_concurrency_cap(sleeps):
+    client = FakeClient([])
+
+    async def run():
+        session = RateLimitedSession(client, max_concurrency=3)
+        return await asyncio.gather(*[fetch(session) for _ in range(20)])
+
+    assert asyncio.run(run()) == [200] * 20
+    assert client.max_in_flight == 3
+
+
+@pytest.mark.parametrize("status", [429, 500, 502])
+def test_retry_transient(status, sleeps):
+    client = FakeClient([FakeAsyncResponse(status), FakeAsyncResponse(status),
+                         FakeAsyncResponse(200)])
+
+    async def run():
+        return await fetch(RateLimitedSession(client, backoff=1.0), method='patch')
+
+    assert asyncio.run(run()) == 200
+    assert [m for m, u in client.requests] == ['PATCH'] * 3
+    assert len(sleeps) == 2
+    assert 0.5 <= sleeps[0] <= 1.0 and 1.0 <= sleeps[1] <= 2.0
+
+
+def test_retry_gives_up(sleeps):
+    client = FakeClient([FakeAsyncResponse(503)] * 10)
+
+    async def run():
+        return await fetch(RateLimitedSession(client, retries=2))
+
+    assert asyncio.run(run()) == 503
+    assert len(client.requests) == 3
+
+
+def test_forbidden_not_retried(sleeps):
+    client = FakeClient([FakeAsyncResponse(403)])
+
+    async def run():
+        return await fetch(RateLimitedSession(client))
+
+    assert asyncio.run(run()) == 403
+    assert len(client.requests) == 1
+    assert sleeps == []
+
+
+def test_retry_after(sleeps):
+    client = FakeClient([FakeAsyncResponse(403, headers={'Retry-After': '30'}), FakeAsyncResponse(200)])
+
+    async def run():
+        return await fetch(RateLimitedSession(client))
+
+    assert asyncio.run(run()) == 200
+    assert len(sleeps) == 1 and 29 <= sleeps[0] <= 30
+
+
+def test_rate_limit_exhausted(sleeps):
+    reset = str(int(time.time()) + 60)
+    client = FakeClient([
+        FakeAsyncResponse(403, headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset}),
+        FakeAsyncResponse(200, headers={'X-RateLimit-Remaining': '4999', 'X-RateLimit-Reset': reset}),
+    ])
+
+    async def run():
+        return await fetch(RateLimitedSession(client))
+
+    assert asyncio.run(run()) == 200
+    assert len(sleeps) == 1 and 55 <= sleeps[0] <= 60
+
+
+def test_pacing_below_reserve():
+    session = RateLimitedSession(None, reserve=50)
+    session.update(200, {'X-RateLimit-Remaining': '100',
+                         'X-RateLimit-Reset': str(int(time.time()) + 100)})
+    assert session.delay() == 0
+    session.update(200, {'X-RateLimit-Remaining': '10'})
+    assert 9 <= session.delay() <= 10
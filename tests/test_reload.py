@@ -0,0 +1,52 @@
+import os
+from ghia.reload import ConfigManager
+from ghia.rules import match_users
+from helpers import LoginSession
+
+
+def write_config(path, token, user, pattern, mtime):
+    path.write_text(f"[github]\ntoken={token}\n[patterns]\n{user}=title:{pattern}\n")
+    os.utime(path, (mtime, mtime))
+
+
+def test_reload(tmp_path):
+    path = tmp_path / 'ghia.cfg'
+    write_config(path, 'abc', 'alice', 'network', 1000)
+    session = LoginSession('robot')
+    swapped = []
+    manager = ConfigManager(str(path), session, {'strategy': 'set'}, swapped.append)
+    assert manager.load()
+    config = manager.config
+    assert config['login'] == 'robot'
+    assert config['strategy'] == 'set'
+    assert swapped == [config]
+
+    # unchanged files are not reloaded
+    assert not manager.check()
+
+    # changed rules are compiled and swapped in, the login is reused
+    write_config(path, 'abc', 'bob', 'python', 2000)
+    assert manager.check()
+    assert manager.config is not config
+    assert match_users(manager.config['ruleset'], {'title': 'python', 'body': '', 'labels': []}) == {'bob'}
+    assert session.calls == 1
+
+    # a new token resolves the login again
+    write_config(path, 'xyz', 'bob', 'python', 3000)
+    assert manager.check()
+    assert session.calls == 2
+
+
+def test_reload_bad_config(tmp_path):
+    path = tmp_path / 'ghia.cfg'
+    write_config(path, 'abc', 'alice', 'network', 1000)
+    manager = ConfigManager(str(path), LoginSession('robot'), {})
+    assert manager.load()
+    config = manager.config
+
+    # a broken config keeps the old one active
+    path.write_text("[patterns]\nalice=title:(\n")
+    os.utime(path, (2000, 2000))
+    assert not manager.check()
+    assert manager.config is config
+    assert manager.failures == 1
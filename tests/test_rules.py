@@ -0,0 +1,197 @@
+import re
+import pytest
+from ghia.github import check_match
+from ghia.rules import (BudgetExceeded, ContentCache, MatchCache, compile_rules, content_digest,
+                        get_ruleset, match_fields, match_users, rules_digest)
+from helpers import mkissue
+
+
+patterns = {
+    'alice': [
+        ('title', re.compile('network', re.IGNORECASE)),
+        ('label', re.compile('^(network|networking)$', re.IGNORECASE)),
+    ],
+    'bob': [('any', re.compile('python', re.IGNORECASE))],
+    'carol': [('text', re.compile('net', re.IGNORECASE))],
+    'dave': [('text', re.compile(r'(\w+) \1', re.IGNORECASE))],
+    'erin': [('title', re.compile('Py'))],
+    'frank': [('label', re.compile('(?P<kind>bug|fix)', re.IGNORECASE))],
+}
+
+
+@pytest.mark.parametrize("issue", [
+    mkissue(),
+    mkissue('Network down', 'python network stack'),
+    mkissue('Python', 'the the network'),
+    mkissue('python', labels=['Networking', 'bug']),
+    mkissue('unrelated', None, ['networks', 'hotfix']),
+    mkissue('py', 'py py', ['PYTHON']),
+])
+def test_match_users_equivalence(issue):
+    expected = {user for user in patterns if check_match(
+        {**issue, 'body': issue['body'] or ''}, patterns[user])}
+    assert match_users(compile_rules(patterns), issue) == expected
+
+
+def test_overlapping_matches():
+    # both patterns match at the same position, both users must be found
+    pats = {
+        'a': [('title', re.compile('abc'))],
+        'b': [('title', re.compile('ab'))],
+        'c': [('title', re.compile('a'))],
+    }
+    assert match_users(compile_rules(pats), mkissue('xabcx')) == {'a', 'b', 'c'}
+
+
+def test_prefilter():
+    pats = {
+        'a': [('text', re.compile(r'net.?work', re.IGNORECASE))],
+        'b': [('text', re.compile(r'(\w+) \1 end'))],
+        'c': [('text', re.compile(r'[0-9]+|none'))],
+    }
+    ruleset = compile_rules(pats)
+    prefilters = [(uidx, literal, fold) for uidx, rgx, literal, fold in ruleset['fields']['text']['regexes']]
+    assert prefilters == [(0, 'work', True), (1, ' end', False), (2, None, False)]
+    assert match_users(ruleset, mkissue(body='NET-WORK 12')) == {'a', 'c'}
+    assert match_users(ruleset, mkissue(body='net wor so so end')) == {'b'}
+    # non-ASCII texts are not prefiltered when case is ignored, the Kelvin sign matches k
+    assert match_users(ruleset, mkissue(body='net wor\u212a, so so end')) == {'a', 'b'}
+
+
+def test_get_ruleset():
+    config = {'patterns': patterns}
+    ruleset = get_ruleset(config)
+    assert get_ruleset(config) is ruleset
+    config['patterns'] = {'zed': [('title', re.compile('z'))]}
+    assert get_ruleset(config) is not ruleset
+    assert match_users(get_ruleset(config), mkissue('z')) == {'zed'}
+
+
+def test_match_fields():
+    issue = mkissue('Python network', 'the net', ['bug'])
+    result = match_fields(compile_rules(patterns), issue, ['title', 'label'])
+    assert result == {'title': {'alice', 'bob', 'erin'}, 'label': {'frank'}}
+
+
+def test_match_cache():
+    ruleset = compile_rules(patterns)
+    cache = MatchCache()
+    issue = {**mkissue('Python', 'the net'), 'url': 'issue/1', 'updated_at': '1'}
+    assert cache.match(ruleset, issue) == {'bob', 'carol', 'erin'}
+    assert cache.stats() == {'size': 1, 'evaluated': 3, 'reused': 0}
+
+    # only the body changed, the title and label results are reused
+    issue = {**issue, 'body': 'java', 'updated_at': '2'}
+    assert cache.match(ruleset, issue) == {'bob', 'erin'}
+    assert cache.stats() == {'size': 1, 'evaluated': 4, 'reused': 2}
+
+    # an outdated payload is evaluated but not remembered
+    old = {**issue, 'title': 'network', 'updated_at': '1'}
+    assert cache.match(ruleset, old) == {'alice'}
+    assert cache.match(ruleset, issue) == {'bob', 'erin'}
+    assert cache.stats() == {'size': 1, 'evaluated': 5, 'reused': 7}
+
+    # labels added without an event of their own are noticed too
+    labeled = {**issue, 'title': 'Java', 'labels': [{'name': 'hotfix'}], 'updated_at': '3'}
+    assert cache.match(ruleset, labeled) == {'frank'}
+
+
+def test_content_digest():
+    ruleset = compile_rules(patterns)
+    issue = mkissue('Python', 'the net', ['a', 'b'])
+    assert content_digest(ruleset, issue) == content_digest(ruleset, mkissue('Python', 'the net', ['b', 'a']))
+    assert content_digest(ruleset, issue) != content_digest(ruleset, mkissue('Python', 'the net', ['a']))
+    assert content_digest(ruleset, issue) != content_digest(compile_rules({'bob': patterns['bob']}), issue)
+
+
+def test_content_cache(tmp_path):
+    ruleset = compile_rules(patterns)
+    path = str(tmp_path / 'matches.db')
+    cache = ContentCache(maxsize=2, path=path)
+    assert cache.match(ruleset, mkissue('Python', 'the net')) == {'bob', 'carol', 'erin'}
+    # the same content in another issue is not evaluated again
+    assert cache.match(ruleset, {**mkissue('Python', 'the net'), 'url': 'other'}) == {'bob', 'carol', 'erin'}
+    assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+    cache.match(ruleset, mkissue('network'))
+    cache.match(ruleset, mkissue('java'))
+    assert cache.stats()['size'] == 2
+    cache.close()
+
+    # the most recent results are loaded by the next run
+    cache = ContentCache(maxsize=2, path=path)
+    assert cache.match_fields(ruleset, mkissue('java')) == match_fields(ruleset, mkissue('java'))
+    assert cache.match(ruleset, mkissue('network')) == {'alice'}
+    assert cache.stats() == {'size': 2, 'hits': 2, 'misses': 0}
+    cache.close()
+
+
+def test_match_cache_content():
+    ruleset = compile_rules(patterns)
+    cache = MatchCache(content=ContentCache())
+    issue = {**mkissue('Python', 'the net'), 'url': 'issue/1', 'updated_at': '1'}
+    assert cache.match(ruleset, issue) == {'bob', 'carol', 'erin'}
+    # a new issue with known content is not evaluated
+    assert cache.match(ruleset, {**issue, 'url': 'issue/2'}) == {'bob', 'carol', 'erin'}
+    assert cache.stats() == {'size': 2, 'evaluated': 3, 'reused': 3,
+                             'content': {'size': 1, 'hits': 1, 'misses': 1}}
+    # results of partial evaluations are remembered by content too
+    assert cache.match(ruleset, {**issue, 'body': 'java', 'updated_at': '2'}) == {'bob', 'erin'}
+    assert cache.match(ruleset, {**issue, 'url': 'issue/3', 'body': 'java'}) == {'bob', 'erin'}
+    assert cache.stats()['content'] == {'size': 2, 'hits': 2, 'misses': 1}
+
+
+fast_patterns = {
+    'alice': [('label', re.compile('^(network|networking)$', re.IGNORECASE))],
+    'bob': [('any', re.compile('python', re.IGNORECASE))],
+    'carol': [('label', re.compile(r'^(?:bug|fix\.me)$'))],
+    'dave': [('text', re.compile(r'a\+b', re.IGNORECASE))],
+    'erin': [('title', re.compile('kiss', re.IGNORECASE))],
+    'frank': [('label', re.compile('^bug$|^fix$', re.IGNORECASE))],
+}
+
+
+def test_fast_rules():
+    fields = compile_rules(fast_patterns)['fields']
+    assert fields['label']['exact'] == {('network', True): {0}, ('networking', True): {0},
+                                        ('bug', False): {2}, ('fix.me', False): {2}}
+    assert [(uidx, literal) for uidx, literal, fold, rgx in fields['text']['literals']] == [
+        (1, 'python'), (3, 'a+b')]
+    # not an exact match, a regex is used
+    assert len(fields['label']['regexes']) == 1
+
+
+@pytest.mark.parametrize("issue", [
+    mkissue('PYTHON', 'A+B', ['Networking']),
+    mkissue('Kiſs', 'a+ b', ['networks', 'Bug', 'bug\n', 'fix.me']),
+    mkissue('KİSS', 'İpython', ['NETWORK\n', 'hotfix']),
+    mkissue('Kıss', 'pythoN ſ', ['fiX', 'BUG']),
+])
+def test_fast_rules_equivalence(issue):
+    expected = {user for user in fast_patterns if check_match(issue, fast_patterns[user])}
+    ruleset = compile_rules(fast_patterns)
+    assert match_users(ruleset, issue) == expected
+    assert set().union(*match_fields(ruleset, issue).values()) == expected
+
+
+def test_budget():
+    budgeted = {**patterns, 'zed': [('label', re.compile('^bug$', re.IGNORECASE))]}
+    ruleset = compile_rules(budgeted, budget=1e-9)
+    issue = {**mkissue('Python network', 'the net', ['bug']), 'url': 'issue/1', 'updated_at': '1'}
+    with pytest.raises(BudgetExceeded, match='matching https://github.com/o/r/issues/1 took over'):
+        match_users(ruleset, issue)
+    with pytest.raises(BudgetExceeded):
+        match_fields(ruleset, issue)
+    # partial results are not cached
+    cache = MatchCache(content=ContentCache())
+    with pytest.raises(BudgetExceeded):
+        cache.match(ruleset, issue)
+    assert cache.stats() == {'size': 0, 'evaluated': 0, 'reused': 0,
+                             'content': {'size': 0, 'hits': 0, 'misses': 1}}
+    assert ruleset['exceeded'] == 3
+    assert match_users(compile_rules(budgeted, budget=10), issue) == {
+        'alice', 'bob', 'carol', 'erin', 'frank', 'zed'}
+
+
+def test_engine_digest():
+    assert compile_rules(patterns)['digest'] == rules_digest(patterns, 're')
+    assert rules_digest(patterns) != rules_digest(patterns, 're2')
@@ -0,0 +1,30 @@
+from requests.adapters import HTTPAdapter
+from ghia.session import PooledAdapter, make_session, pool_stats
+
+
+def test_make_session():
+    session = make_session(pool_size=7, timeout=3)
+    adapter = session.get_adapter('https://api.github.com/')
+    assert isinstance(adapter, PooledAdapter)
+    assert adapter.timeout == 3
+    assert adapter._pool_maxsize == 7
+    assert pool_stats(session) == {}
+
+
+def test_default_timeout(monkeypatch):
+    sent = []
+    monkeypatch.setattr(HTTPAdapter, 'send', lambda self, request, **kw: sent.append(kw))
+    adapter = PooledAdapter(timeout=5)
+    adapter.send(None)
+    adapter.send(None, timeout=1)
+    assert [kw['timeout'] for kw in sent] == [5, 1]
+
+
+def test_pool_stats():
+    session = make_session()
+    pool = session.get_adapter('https://').poolmanager.connection_from_url('https://api.github.com/')
+    pool.num_connections, pool.num_requests = 2, 10
+    assert pool_stats(session) == {
+        'api.github.com': {'connections': 2, 'requests': 10, 'reused': 8}
+    }
+    assert pool_stats(object()) == {}
@@ -0,0 +1,46 @@
+import re
+from ghia.state import StateStore, config_digest, merge_since
+from helpers import mkissue
+
+
+def mkconfig(pattern='python', strategy='append'):
+    return {
+        'patterns': {'john': [('title', re.compile(pattern, re.IGNORECASE))]},
+        'strategy': strategy,
+        'fallback': {'label': 'AssignMe'},
+    }
+
+
+def test_config_digest():
+    assert config_digest(mkconfig()) == config_digest(mkconfig())
+    assert config_digest(mkconfig()) != config_digest(mkconfig('java'))
+    assert config_digest(mkconfig()) != config_digest(mkconfig(strategy='set'))
+
+
+def test_merge_since():
+    assert merge_since(None, None) is None
+    assert merge_since('2019-11-18T00:00:00Z', None) == '2019-11-18T00:00:00Z'
+    assert merge_since('2019-11-18T00:00:00Z', '2019-12-01T00:00:00Z') == '2019-12-01T00:00:00Z'
+
+
+def test_state_store(tmp_path):
+    path = str(tmp_path / 'state.db')
+    state = StateStore(path, mkconfig())
+    assert state.since('o/r') is None
+    state.record('o/r', mkissue(number=1, updated_at='2019-11-18T10:00:00Z'))
+    state.finish('o/r')
+    state.close()
+
+    state = StateStore(path, mkconfig())
+    assert state.since('o/r') is not None
+    assert state.since('o/other') is None
+    assert state.unchanged('o/r', mkissue(number=1, updated_at='2019-11-18T10:00:00Z'))
+    assert not state.unchanged('o/r', mkissue(number=1, updated_at='2019-11-18T11:00:00Z'))
+    assert not state.unchanged('o/r', mkissue(number=2, updated_at='2019-11-18T10:00:00Z'))
+    state.close()
+
+    # changed rules force full re-evaluation
+    state = StateStore(path, mkconfig('java'))
+    assert state.since('o/r') is None
+    assert not state.unchanged('o/r', mkissue(number=1, updated_at='2019-11-18T10:00:00Z'))
+    state.close()
@@ -1,8 +1,10 @@
 from ghia.web import create_app, webapp_gh_issue_handler, webapp_gh_validate
-from helpers import init_flask_env, mkauth, mkauth_default, auth_default, get_user
+from helpers import init_flask_env, mkauth, mkauth_default, auth_default, get_user, LoginSession
 import pytest
 import betamax
 import os
+import subprocess
+import sys
 
 
 @pytest.fixture
@@ -13,6 +15,15 @@ def app(betamax_session):
     return app
 
 
+@pytest.fixture
+def offline_app():
+    init_flask_env()
+    app = create_app(session=LoginSession())
+    app.config['TESTING'] = True
+    app.config['ghia']['github'].pop('secret', None)
+    return app
+
+
 def test_create_app_default(app):
     assert app is not None
     assert 'ghia' in app.config
@@ -78,3 +89,155 @@ def test_secret_validation(app):
         'X-Hub-Signature': f"sha1={sign}"
     })
     assert pind.status_code == 200
+
+
+def test_post_enqueued(offline_app):
+    app = offline_app
+    app.config['ghia']['dry_run'] = True
+    app.extensions.pop('ghia_debouncer')
+    client = app.test_client()
+
+    pind = client.post('/', headers={
+        'X-GitHub-Event': 'issues',
+    }, json={
+        'action': 'opened',
+        'issue': {
+            'state': 'open',
+            'title': 'Python network',
+            'body': '',
+            'labels': [],
+            'assignees': [],
+        }
+    })
+    assert pind.status_code == 202
+
+    app.extensions['ghia_queue'].join()
+    stats = client.get('/queue').get_json()
+    assert stats['processed'] == 1
+    assert stats['failed'] == 0
+    assert stats['depth'] == 0
+
+
+def test_post_debounced_full(offline_app):
+    debouncer = offline_app.extensions['ghia_debouncer']
+    debouncer.limit = 1
+    client = offline_app.test_client()
+    issue = {'state': 'open', 'title': 'Python network', 'body': '', 'labels': [], 'assignees': []}
+
+    def post(url):
+        return client.post('/', headers={'X-GitHub-Event': 'issues'}, json={
+            'action': 'edited',
+            'issue': {**issue, 'url': url},
+        }).status_code
+
+    assert post('https://api.github.com/repos/o/r/issues/1') == 202
+    assert post('https://api.github.com/repos/o/r/issues/1') == 202
+    # no room for another issue, GitHub is told to redeliver the event later
+    assert post('https://api.github.com/repos/o/r/issues/2') == 503
+    assert debouncer.stats()['pending'] == 1
+
+
+def test_pool(offline_app):
+    pind = offline_app.test_client().get('/pool')
+    assert pind.status_code == 200
+    assert pind.get_json() == {}
+
+
+def test_post_own_event(offline_app):
+    pind = offline_app.test_client().post('/', headers={
+        'X-GitHub-Event': 'issues',
+    }, json={
+        'action': 'assigned',
+        'sender': {'login': offline_app.config['ghia']['login']},
+        'issue': {'url': 'https://api.github.com/repos/o/r/issues/1'},
+    })
+    assert pind.status_code == 200
+    assert offline_app.extensions['ghia_debouncer'].stats()['pending'] == 0
+
+
+def test_post_redelivery(offline_app):
+    client = offline_app.test_client()
+    headers = {'X-GitHub-Event': 'issues', 'X-GitHub-Delivery': '72d3162e'}
+    pind = client.post('/', headers=headers, json={'action': 'UNKNOWN_ACTION'})
+    assert pind.status_code == 200
+    # the redelivery is answered without parsing the payload
+    pind = client.post('/', headers=headers, data='not json')
+    assert pind.status_code == 200
+    assert offline_app.extensions['ghia_deliveries'].stats()['duplicates'] == 1
+
+
+def test_lazy_imports():
+    code = "import sys, ghia.web; print('aiohttp' in sys.modules, 'ghia.cli' in sys.modules)"
+    cp = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                        universal_newlines=True, check=True)
+    assert cp.stdout.strip() == 'False False'
+
+
+def test_profile(offline_app, monkeypatch):
+    assert offline_app.test_client().get('/profile').status_code == 404
+
+    monkeypatch.setenv('GHIA_PROFILE_RULES', '1')
+    monkeypatch.setenv('GHIA_WORKERS', '0')
+    app = create_app(session=LoginSession())
+    app.config['ghia']['github'].pop('secret', None)
+    app.config['ghia']['dry_run'] = True
+    client = app.test_client()
+    pind = client.post('/', headers={'X-GitHub-Event': 'issues'}, json={
+        'action': 'opened',
+        'issue': {
+            'url': 'https://api.github.com/repos/o/r/issues/1',
+            'html_url': 'https://github.com/o/r/issues/1',
+            'number': 1,
+            'state': 'open',
+            'title': 'Python network',
+            'body': '',
+            'labels': [],
+            'assignees': [],
+        },
+    })
+    assert pind.status_code == 200
+    report = client.get('/profile').get_json()
+    assert report['issues'] == 1
+    assert {row['user'] for row in report['patterns'] if row['hits']} == {'Dawnflash', 'hroncok'}
+    table = client.get('/profile?format=table')
+    assert table.content_type.startswith('text/plain')
+    assert 'https://github.com/o/r/issues/1' in table.get_data(as_text=True)
+
+
+def test_metrics(offline_app):
+    app = offline_app
+    app.config['ghia']['dry_run'] = True
+    app.extensions.pop('ghia_debouncer')
+    client = app.test_client()
+    issue = {
+        'url': 'https://api.github.com/repos/o/r/issues/1',
+        'state': 'open',
+        'title': 'Python network',
+        'body': '',
+        'labels': [],
+        'assignees': [],
+    }
+    headers = {'X-GitHub-Event': 'issues', 'X-GitHub-Delivery': 'ab12'}
+    assert client.post('/', headers=headers, json={'action': 'opened', 'issue': issue}).status_code == 202
+    assert client.post('/', headers=headers, json={'action': 'opened', 'issue': issue}).status_code == 200
+    assert client.post('/', headers={'X-GitHub-Event': 'ping'}, json={}).status_code == 200
+    app.extensions['ghia_queue'].join()
+
+    pind = client.get('/metrics')
+    assert pind.status_code == 200
+    assert pind.content_type.startswith('text/plain; version=0.0.4')
+    text = pind.get_data(as_text=True)
+    assert 'ghia_webhook_deliveries_total{event="issues",action="opened"} 1.0' in text
+    assert 'ghia_webhook_deliveries_total{event="ping",action=""} 1.0' in text
+    assert 'ghia_webhook_redeliveries_total 1.0' in text
+    assert 'ghia_rule_evaluation_seconds_count 1' in text
+    # dry runs send nothing
+    assert 'ghia_issue_updates_total{outcome="skipped"} 1.0' in text
+
+
+def test_metrics_signature():
+    init_flask_env()
+    client = create_app(session=LoginSession()).test_client()
+    assert client.post('/', headers={'X-GitHub-Event': 'ping', 'X-Hub-Signature': 'sha1=0'},
+                       json={}).status_code == 403
+    assert 'ghia_webhook_signature_failures_total 1.0' in client.get('/metrics').get_data(as_text=True)
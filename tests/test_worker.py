@@ -0,0 +1,77 @@
+import threading
+from ghia import worker
+from ghia.worker import Debouncer, WorkQueue
+
+
+def test_work_queue(monkeypatch):
+    processed = []
+
+    def fake_process_issue(session, issue, config, matched=None):
+        processed.append(issue['number'])
+        if issue['number'] == 3:
+            raise RuntimeError('boom')
+        return issue['number'] != 2
+
+    monkeypatch.setattr(worker, 'process_issue', fake_process_issue)
+    work_queue = WorkQueue(workers=2)
+    for number in range(1, 6):
+        assert work_queue.submit({'number': number}, {})
+    work_queue.join()
+    stats = work_queue.stats()
+    work_queue.stop()
+
+    assert sorted(processed) == [1, 2, 3, 4, 5]
+    assert stats['processed'] == 5
+    assert stats['failed'] == 2
+    assert stats['depth'] == 0
+    assert stats['workers'] == 2
+    assert stats['wait_max'] >= stats['wait_avg'] >= 0
+
+
+def test_work_queue_full(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_process_issue(session, issue, config, matched=None):
+        started.set()
+        return release.wait()
+
+    monkeypatch.setattr(worker, 'process_issue', blocking_process_issue)
+    work_queue = WorkQueue(workers=1, maxsize=1)
+    assert work_queue.submit({'number': 1}, {})
+    started.wait()
+    # the worker is busy, one issue may wait, the next one does not fit
+    assert work_queue.submit({'number': 2}, {})
+    assert not work_queue.submit({'number': 3}, {})
+    release.set()
+    work_queue.stop()
+    assert work_queue.stats()['processed'] == 2
+
+
+def test_debouncer():
+    submitted = []
+    done = threading.Event()
+
+    def submit(issue, config):
+        submitted.append(issue)
+        # the queue is full at first, the issue is submitted again after another window
+        if len(submitted) == 2:
+            done.set()
+        return len(submitted) > 1
+
+    debouncer = Debouncer(0.1, submit)
+    for edit in range(3):
+        assert debouncer.push('issue/1', {'edit': edit}, {})
+    assert debouncer.stats()['pending'] == 1
+    assert done.wait(5)
+    assert submitted == [{'edit': 2}, {'edit': 2}]
+    assert debouncer.stats() == {'pending': 0, 'coalesced': 2, 'rejected': 1}
+
+
+def test_debouncer_limit():
+    debouncer = Debouncer(60, lambda issue, config: True, limit=2)
+    assert debouncer.push('issue/1', {}, {})
+    assert debouncer.push('issue/2', {}, {})
+    # events of pending issues are coalesced, new issues do not fit
+    assert debouncer.push('issue/1', {'edit': 1}, {})
+    assert not debouncer.push('issue/3', {}, {})
+    assert debouncer.stats() == {'pending': 2, 'coalesced': 1, 'rejected': 0}